@@ -0,0 +1,308 @@
+"""End-to-end benchmark: simulated satellite -> ground_server -> HTTP clients.
+
+Starts tx_satellite.py on the synthetic sensor, ground_server.py pointed
+at it, then N polling clients and M SSE viewers for a fixed duration, and
+reports:
+
+  * ingest throughput (frames/s reaching the ground) and downlink bytes/frame
+  * API request rate and response bytes
+  * capture-to-client latency p50/p99 for polling and streaming clients
+  * CPU seconds and peak RSS per process (Linux /proc)
+
+Results are printed and written as JSON (--output) so runs can be diffed
+between releases; --compare flags metrics that regressed past --tolerance.
+
+    python3 bench/bench_pipeline.py --rate 16 --pollers 8 --viewers 4 --output run.json
+    python3 bench/bench_pipeline.py --compare run.json
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SATELLITE_SCRIPT = os.path.join(REPO_DIR, "satellite", "tx_satellite.py")
+GROUND_SCRIPT = os.path.join(REPO_DIR, "ground", "ground_server.py")
+
+# Timestamp field of the downlink frame header (see common/protocol.py)
+FRAME_TIMESTAMP = struct.Struct("!d")
+FRAME_TIMESTAMP_OFFSET = 12
+
+# metric -> True if bigger is better (used by --compare)
+HIGHER_IS_BETTER = {
+    "ingest_fps": True,
+    "api_requests_per_s": True,
+    "stream_events_per_s": True,
+    "poll_latency_p50_ms": False,
+    "poll_latency_p99_ms": False,
+    "stream_latency_p50_ms": False,
+    "stream_latency_p99_ms": False,
+    "downlink_bytes_per_frame": False,
+    "ground_cpu_s": False,
+    "satellite_cpu_s": False,
+    "ground_rss_mb": False,
+    "satellite_rss_mb": False,
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+def proc_usage(pid):
+    """(cpu seconds, rss MB) for a process, from /proc. (None, None) elsewhere."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        with open(f"/proc/{pid}/status") as f:
+            rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        return cpu, rss / 1024.0
+    except (OSError, StopIteration, IndexError, ValueError):
+        return None, None
+
+
+class ProcessMonitor(threading.Thread):
+    """Samples peak RSS of the benchmarked processes."""
+
+    def __init__(self, procs):
+        super().__init__(daemon=True)
+        self.procs = procs
+        self.peak_rss = {name: 0.0 for name in procs}
+        self.running = True
+
+    def run(self):
+        while self.running:
+            for name, proc in self.procs.items():
+                _, rss = proc_usage(proc.pid)
+                if rss:
+                    self.peak_rss[name] = max(self.peak_rss[name], rss)
+            time.sleep(0.25)
+
+
+def get_json(url, timeout=2):
+    with urllib.request.urlopen(url, timeout=timeout) as r:
+        return json.loads(r.read())
+
+
+def poller(base_url, fmt, deadline, results):
+    """Conditional polling client, as the dashboard fallback does."""
+    last_seq = -1
+    while time.time() < deadline:
+        url = f"{base_url}/api/telemetry?since={last_seq}" + (f"&format={fmt}" if fmt != "json" else "")
+        try:
+            with urllib.request.urlopen(url, timeout=5) as r:
+                body = r.read()
+                now = time.time()
+                results["requests"] += 1
+                results["bytes"] += len(body)
+                if fmt == "json":
+                    data = json.loads(body)
+                    last_seq, ts = data.get("seq", last_seq), data.get("timestamp")
+                else:
+                    ts = FRAME_TIMESTAMP.unpack_from(body, FRAME_TIMESTAMP_OFFSET)[0]
+                    last_seq = int.from_bytes(body[8:12], "big")
+                if ts:
+                    results["latency"].append((now - ts) * 1000.0)
+        except urllib.error.HTTPError as e:
+            results["requests"] += 1
+            if e.code != 304:
+                results["errors"] += 1
+        except (OSError, ValueError):
+            results["errors"] += 1
+        time.sleep(0.01)
+
+
+def viewer(base_url, fmt, deadline, results):
+    """SSE client for /api/stream."""
+    try:
+        stream = urllib.request.urlopen(f"{base_url}/api/stream?format={fmt}", timeout=5)
+    except OSError:
+        results["errors"] += 1
+        return
+    with stream:
+        for line in stream:
+            now = time.time()
+            if now > deadline:
+                break
+            if not line.startswith(b"data: "):
+                continue
+            data = line[6:].strip()
+            results["events"] += 1
+            results["bytes"] += len(line)
+            if fmt == "json":
+                ts = json.loads(data).get("timestamp")
+            else:
+                ts = FRAME_TIMESTAMP.unpack_from(base64.b64decode(data), FRAME_TIMESTAMP_OFFSET)[0]
+            if ts:
+                results["latency"].append((now - ts) * 1000.0)
+
+
+def run(args):
+    work_dir = tempfile.mkdtemp(prefix="flamesat-bench-")
+    sat_port, cmd_port, stats_port, web_port = free_port(), free_port(), free_port(), free_port()
+    base_url = f"http://127.0.0.1:{web_port}"
+    log = open(os.path.join(work_dir, "processes.log"), "w")
+
+    procs = {
+        "satellite": subprocess.Popen(
+            [sys.executable, SATELLITE_SCRIPT, "--sensor", "synthetic", "--seed", "1",
+             "--rate", str(args.rate), "--refresh-policy", "fixed", "--downlink", args.downlink,
+             "--store", os.path.join(work_dir, "store.fss"), "--telem-port", str(sat_port), "--cmd-port", str(cmd_port),
+             "--stats-port", str(stats_port)],
+            cwd=os.path.dirname(SATELLITE_SCRIPT), stdout=log, stderr=subprocess.STDOUT),
+    }
+    time.sleep(0.5)
+    procs["ground"] = subprocess.Popen(
+        [sys.executable, GROUND_SCRIPT, "--satellite", "127.0.0.1", "--satellite-port", str(sat_port),
+         "--web-port", str(web_port), "--archive-dir", os.path.join(work_dir, "archive")],
+        cwd=os.path.dirname(GROUND_SCRIPT), stdout=log, stderr=subprocess.STDOUT)
+
+    try:
+        # Wait for frames to flow end to end
+        start_wait = time.time()
+        while True:
+            try:
+                if get_json(f"{base_url}/api/telemetry").get("seq") is not None:
+                    break
+            except (OSError, ValueError):
+                pass
+            if time.time() - start_wait > 20:
+                raise RuntimeError(f"pipeline did not come up; see {log.name}")
+            time.sleep(0.2)
+        time.sleep(args.warmup)
+
+        monitor = ProcessMonitor(procs)
+        monitor.start()
+        cpu_start = {name: proc_usage(p.pid)[0] for name, p in procs.items()}
+        link_start = get_json(f"{base_url}/api/link")
+
+        poll_results = {"requests": 0, "bytes": 0, "errors": 0, "latency": []}
+        stream_results = {"events": 0, "bytes": 0, "errors": 0, "latency": []}
+        started = time.time()
+        deadline = started + args.duration
+        clients = [threading.Thread(target=poller, args=(base_url, args.format, deadline, poll_results))
+                   for _ in range(args.pollers)]
+        clients += [threading.Thread(target=viewer, args=(base_url, args.format, deadline, stream_results))
+                    for _ in range(args.viewers)]
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join(args.duration + 10)
+        elapsed = time.time() - started
+
+        link_end = get_json(f"{base_url}/api/link")
+        cpu_end = {name: proc_usage(p.pid)[0] for name, p in procs.items()}
+        monitor.running = False
+    finally:
+        for proc in procs.values():
+            proc.terminate()
+        for proc in procs.values():
+            try: proc.wait(5)
+            except subprocess.TimeoutExpired: proc.kill()
+        log.close()
+
+    frames = link_end.get("frames", 0) - link_start.get("frames", 0)
+    link_bytes = link_end.get("bytes_received", 0) - link_start.get("bytes_received", 0)
+
+    def cpu(name):
+        if cpu_start[name] is None or cpu_end[name] is None:
+            return None
+        return round(cpu_end[name] - cpu_start[name], 3)
+
+    metrics = {
+        "ingest_fps": round(frames / elapsed, 2),
+        "downlink_bytes_per_frame": round(link_bytes / frames, 1) if frames else None,
+        "downlink_dropped": link_end.get("dropped", 0) - link_start.get("dropped", 0),
+        "api_requests_per_s": round(poll_results["requests"] / elapsed, 2),
+        "api_bytes": poll_results["bytes"],
+        "api_errors": poll_results["errors"],
+        "poll_latency_p50_ms": percentile(poll_results["latency"], 50),
+        "poll_latency_p99_ms": percentile(poll_results["latency"], 99),
+        "stream_events_per_s": round(stream_results["events"] / elapsed, 2),
+        "stream_bytes": stream_results["bytes"],
+        "stream_errors": stream_results["errors"],
+        "stream_latency_p50_ms": percentile(stream_results["latency"], 50),
+        "stream_latency_p99_ms": percentile(stream_results["latency"], 99),
+        "satellite_cpu_s": cpu("satellite"),
+        "ground_cpu_s": cpu("ground"),
+        "satellite_rss_mb": round(monitor.peak_rss["satellite"], 1),
+        "ground_rss_mb": round(monitor.peak_rss["ground"], 1),
+    }
+    if not args.keep:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "config": {key: getattr(args, key) for key in ("rate", "pollers", "viewers", "format", "downlink", "duration")},
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "timestamp": time.time(),
+        "metrics": metrics,
+    }
+
+
+def compare(result, baseline_path, tolerance):
+    """Print metric changes vs a baseline. Returns the names of regressed metrics."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["metrics"]
+    regressions = []
+    print(f"\n{'metric':28} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, higher_is_better in HIGHER_IS_BETTER.items():
+        old, new = baseline.get(name), result["metrics"].get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / abs(old)
+        worse = -change if higher_is_better else change
+        flag = "  ❌" if worse > tolerance else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:28} {old:>12} {new:>12} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FLAMESAT end-to-end pipeline benchmark")
+    parser.add_argument("--rate", type=float, default=16, help="simulated frames per second")
+    parser.add_argument("--pollers", type=int, default=4, help="HTTP polling clients")
+    parser.add_argument("--viewers", type=int, default=4, help="SSE streaming clients")
+    parser.add_argument("--format", choices=("json", "f32", "i16"), default="json")
+    parser.add_argument("--downlink", choices=("continuous", "event"), default="continuous",
+                        help="satellite downlink mode")
+    parser.add_argument("--duration", type=float, default=10, help="measurement seconds")
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--output", metavar="FILE", help="write JSON results here")
+    parser.add_argument("--compare", metavar="FILE", help="baseline JSON to diff against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed regression (fraction)")
+    parser.add_argument("--keep", action="store_true", help="keep the temp dir with logs and archive")
+    args = parser.parse_args()
+
+    result = run(args)
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare and compare(result, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
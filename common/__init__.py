@@ -0,0 +1 @@
+"""Code shared by the FLAMESAT flight software and the ground station."""
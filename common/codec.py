@@ -0,0 +1,194 @@
+"""Payload encodings for the telemetry downlink.
+
+The sensor is only good to about 0.01 °C, so pixels are quantized to int16
+centi-degrees (half the size of float32). The compressed encodings go
+further:
+
+  * keyframes are delta coded along each row (neighbouring pixels are
+    close in temperature), then compressed
+  * other frames are the int16 difference from the last keyframe, so a
+    quiet scene turns into a block of near-zero values
+
+Before compression the int16 values are split into a low-byte plane and a
+high-byte plane, which lets zlib/LZ4 collapse the mostly-constant high bytes.
+Losing a delta frame never corrupts later ones; losing a keyframe costs
+frames until the next keyframe arrives.
+
+Frames cropped or binned onboard are smaller than the sensor; the encoder
+takes their (rows, cols) from the array shape and the decoder from the
+frame's TRANSFORM block (expand_transform() maps them back to 24x32).
+"""
+import zlib
+
+import numpy as np
+
+from common import protocol
+
+try:
+    import lz4.block
+except ImportError:  # optional, zlib is always available
+    lz4 = None
+
+KEYFRAME_INTERVAL = 16
+ZLIB_LEVEL = 6
+CENTI = np.float32(100.0)
+
+SUPPORTED_ENCODINGS = [protocol.ENC_FLOAT32, protocol.ENC_INT16, protocol.ENC_INT16_DELTA_ZLIB]
+if lz4 is not None:
+    SUPPORTED_ENCODINGS.append(protocol.ENC_INT16_DELTA_LZ4)
+
+# Best first; used by ground stations in their HELLO
+PREFERRED_ENCODINGS = sorted(SUPPORTED_ENCODINGS, reverse=True)
+
+
+class CodecError(Exception):
+    """Raised when a payload cannot be decoded."""
+
+
+def quantize(pixels):
+    """float °C -> int16 centi-degrees (clipped, NaN-safe)."""
+    scaled = np.nan_to_num(np.asarray(pixels, dtype=np.float32)) * CENTI
+    return np.clip(np.rint(scaled), -32768, 32767).astype("<i2")
+
+
+def dequantize(values):
+    return values.astype(np.float32) / CENTI
+
+
+def _shuffle(values):
+    return values.view(np.uint8).reshape(-1, 2).T.tobytes()
+
+
+def _unshuffle(raw):
+    planes = np.frombuffer(raw, dtype=np.uint8).reshape(2, -1)
+    return np.ascontiguousarray(planes.T).view("<i2").ravel()
+
+
+def _compress(encoding, raw):
+    if encoding == protocol.ENC_INT16_DELTA_LZ4:
+        return lz4.block.compress(raw, store_size=True)
+    return zlib.compress(raw, ZLIB_LEVEL)
+
+
+def _decompress(encoding, payload):
+    try:
+        if encoding == protocol.ENC_INT16_DELTA_LZ4:
+            if lz4 is None:
+                raise CodecError("LZ4 frame received but lz4 is not installed")
+            return lz4.block.decompress(payload)
+        return zlib.decompress(payload)
+    except (zlib.error, ValueError, RuntimeError) as e:
+        raise CodecError(f"decompression failed: {e}")
+
+
+SENSOR_SHAPE = (protocol.SENSOR_ROWS, protocol.SENSOR_COLS)
+
+
+def _row_delta(values, shape):
+    rows = values.reshape(shape)
+    out = rows.copy()
+    out[:, 1:] = rows[:, 1:] - rows[:, :-1]  # int16 wraparound is fine, undone below
+    return out.ravel()
+
+
+def _row_undelta(values, shape):
+    rows = values.reshape(shape)
+    return np.cumsum(rows, axis=1, dtype="<i2").ravel()
+
+
+def expand_transform(pixels, transform):
+    """Map a cropped/binned frame back onto the full sensor grid (flat, 768).
+
+    Binned pixels are repeated over the pixels they cover; pixels outside the
+    region are filled with the region's minimum so they render as background.
+    """
+    grid = np.asarray(pixels, dtype=np.float32).reshape(transform.rows, transform.cols)
+    if transform.binning > 1:
+        grid = grid.repeat(transform.binning, axis=0).repeat(transform.binning, axis=1)
+    full = np.full(SENSOR_SHAPE, grid.min(), dtype=np.float32)
+    full[transform.row0:transform.row0 + grid.shape[0], transform.col0:transform.col0 + grid.shape[1]] = grid
+    return full.ravel()
+
+
+class FrameEncoder:
+    """Satellite side: turns a frame into (payload, flags).
+
+    A flat frame is a full 24x32 sensor frame; a 2-D one keeps its shape.
+    """
+
+    def __init__(self, encoding=protocol.ENC_FLOAT32, keyframe_interval=KEYFRAME_INTERVAL):
+        if encoding not in SUPPORTED_ENCODINGS:
+            raise CodecError(f"unsupported encoding {encoding}")
+        self.encoding = encoding
+        self.keyframe_interval = keyframe_interval
+        self.key = None
+        self.key_shape = None
+        self.since_key = 0
+
+    def force_keyframe(self):
+        self.key = None
+
+    def encode(self, frame):
+        if self.encoding == protocol.ENC_FLOAT32:
+            return np.asarray(frame, dtype="<f4").tobytes(), protocol.FLAG_KEYFRAME
+
+        shape = np.shape(frame) if np.ndim(frame) == 2 else SENSOR_SHAPE
+        values = quantize(frame).ravel()
+        if self.encoding == protocol.ENC_INT16:
+            return values.tobytes(), protocol.FLAG_KEYFRAME
+
+        # A new frame geometry needs a new reference
+        if self.key is None or self.key_shape != shape or self.since_key >= self.keyframe_interval:
+            self.key, self.key_shape = values, shape
+            self.since_key = 0
+            body, flags = _row_delta(values, shape), protocol.FLAG_KEYFRAME
+        else:
+            self.since_key += 1
+            body, flags = values - self.key, 0
+        return _compress(self.encoding, _shuffle(body)), flags
+
+
+class FrameDecoder:
+    """Ground side: payload -> flat float32 array of pixels (°C).
+
+    decode() returns None for a delta frame that arrives before any keyframe
+    of the same geometry. `shape` is the frame's (rows, cols), the full
+    sensor unless the frame carries a TRANSFORM block.
+    """
+
+    def __init__(self):
+        self.key = None
+        self.key_shape = None
+
+    def reset(self):
+        self.key = None
+
+    def decode(self, header, payload, shape=SENSOR_SHAPE):
+        encoding = header.encoding
+        pixels = shape[0] * shape[1]
+        if encoding == protocol.ENC_FLOAT32:
+            if len(payload) != pixels * 4:
+                raise CodecError(f"float32 frame has {len(payload)} bytes")
+            return np.frombuffer(payload, dtype="<f4")
+
+        if encoding == protocol.ENC_INT16:
+            if len(payload) != pixels * 2:
+                raise CodecError(f"int16 frame has {len(payload)} bytes")
+            return dequantize(np.frombuffer(payload, dtype="<i2"))
+
+        if encoding not in (protocol.ENC_INT16_DELTA_ZLIB, protocol.ENC_INT16_DELTA_LZ4):
+            raise CodecError(f"unknown encoding {encoding}")
+
+        raw = _decompress(encoding, payload)
+        if len(raw) != pixels * 2:
+            raise CodecError(f"decoded frame has {len(raw)} bytes")
+        body = _unshuffle(raw)
+
+        if header.flags & protocol.FLAG_KEYFRAME:
+            self.key, self.key_shape = _row_undelta(body, shape), tuple(shape)
+            values = self.key
+        elif self.key is None or self.key_shape != tuple(shape):
+            return None
+        else:
+            values = body + self.key
+        return dequantize(values)
@@ -0,0 +1,180 @@
+"""FLAMESAT command uplink framing and client.
+
+A session starts with the client sending MAGIC, then messages in both
+directions, each a fixed header followed by a payload:
+
+    type     B   MSG_*
+    request  I   request id chosen by the client (0 for session messages)
+    length   I   payload length in bytes
+
+    client -> satellite
+      MSG_AUTH    password (UTF-8); must be the first message
+      MSG_EXEC    EXEC header (timeout, s) + command line (UTF-8)
+    satellite -> client
+      MSG_AUTH_OK / MSG_ERROR     answer to MSG_AUTH (an error ends the session)
+      MSG_STDOUT / MSG_STDERR     output chunks, as the command produces them
+      MSG_EXIT    EXIT (return code; negative = killed by that signal)
+      MSG_ERROR   the request could not be run (text)
+
+One authenticated session can carry many commands at once; replies are
+tagged with the request id, so output of a slow command never holds up a
+quick one. Output has no size limit.
+
+Connections that do not start with MAGIC are treated as the original
+"PASSWORD|COMMAND" one-shot format, which still works with nc.
+"""
+import codecs
+import socket
+import struct
+import threading
+
+MAGIC = b"FSC1"
+
+MSG_AUTH = 0x01
+MSG_EXEC = 0x02
+MSG_AUTH_OK = 0x81
+MSG_STDOUT = 0x82
+MSG_STDERR = 0x83
+MSG_EXIT = 0x84
+MSG_ERROR = 0x85
+
+HEADER = struct.Struct("!BII")
+EXEC = struct.Struct("!H")
+EXIT = struct.Struct("!i")
+MAX_MESSAGE = 1024 * 1024
+DEFAULT_TIMEOUT = 10  # s a command may run
+REPLY_GRACE = 15      # s past the timeout before the client gives up on a reply
+
+
+class CommandError(Exception):
+    """Raised for authentication failures and broken sessions."""
+
+
+def pack(msg_type, request_id, payload=b""):
+    return HEADER.pack(msg_type, request_id, len(payload)) + payload
+
+
+def recv_exact(sock, n):
+    """Exactly n bytes, or None if the connection closed first."""
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        received = sock.recv_into(view[got:])
+        if not received:
+            return None
+        got += received
+    return bytes(buf)
+
+
+def read_message(sock):
+    """(type, request id, payload), or None once the peer has closed."""
+    head = recv_exact(sock, HEADER.size)
+    if head is None:
+        return None
+    msg_type, request_id, length = HEADER.unpack(head)
+    if length > MAX_MESSAGE:
+        raise CommandError(f"message too large ({length} bytes)")
+    payload = recv_exact(sock, length) if length else b""
+    if payload is None:
+        return None
+    return msg_type, request_id, payload
+
+
+class _Request:
+    def __init__(self, on_output):
+        self.on_output = on_output
+        # Chunks may split a multi-byte character; decode each stream incrementally
+        self.decoders = {stream: codecs.getincrementaldecoder("utf-8")("replace") for stream in ("stdout", "stderr")}
+        self.done = threading.Event()
+        self.code = None
+        self.error = None
+
+
+class CommandSession:
+    """A persistent, authenticated uplink session; run() is safe from any thread.
+
+        session = CommandSession(host, port, password)
+        code = session.run("uptime", lambda stream, text: print(text, end=""))
+    """
+
+    def __init__(self, host, port, password, connect_timeout=5):
+        self.sock = socket.create_connection((host, port), timeout=connect_timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.send_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.next_id = 1
+        self.closed = False
+
+        self.sock.sendall(MAGIC + pack(MSG_AUTH, 0, password.encode("utf-8")))
+        reply = read_message(self.sock)
+        if reply is None or reply[0] != MSG_AUTH_OK:
+            self.sock.close()
+            raise CommandError(reply[2].decode("utf-8", "replace") if reply else "connection closed")
+        self.sock.settimeout(None)
+        threading.Thread(target=self._reader, daemon=True).start()
+
+    def _reader(self):
+        try:
+            while True:
+                message = read_message(self.sock)
+                if message is None:
+                    break
+                msg_type, request_id, payload = message
+                with self.lock:
+                    request = self.requests.get(request_id)
+                if request is None:
+                    continue
+                if msg_type in (MSG_STDOUT, MSG_STDERR):
+                    stream = "stdout" if msg_type == MSG_STDOUT else "stderr"
+                    text = request.decoders[stream].decode(payload)
+                    if text:
+                        request.on_output(stream, text)
+                elif msg_type in (MSG_EXIT, MSG_ERROR):
+                    if msg_type == MSG_EXIT:
+                        request.code = EXIT.unpack(payload)[0]
+                    else:
+                        request.error = payload.decode("utf-8", "replace")
+                    with self.lock:
+                        self.requests.pop(request_id, None)
+                    request.done.set()
+        except (OSError, CommandError):
+            pass
+        finally:
+            self.close()
+
+    def run(self, command, on_output, timeout=DEFAULT_TIMEOUT):
+        """Run `command`, streaming output to on_output(stream, text). Returns the exit code."""
+        request = _Request(on_output)
+        with self.lock:
+            if self.closed:
+                raise CommandError("session closed")
+            request_id = self.next_id
+            self.next_id = self.next_id % 0xFFFFFFFF + 1
+            self.requests[request_id] = request
+        payload = EXEC.pack(min(timeout, 0xFFFF)) + command.encode("utf-8")
+        try:
+            with self.send_lock:
+                self.sock.sendall(pack(MSG_EXEC, request_id, payload))
+        except OSError as e:
+            self.close()
+            raise CommandError(f"uplink lost: {e}")
+        if not request.done.wait(timeout + REPLY_GRACE):
+            self.close()
+            raise CommandError("no reply from satellite")
+        if request.error is not None:
+            raise CommandError(request.error)
+        return request.code
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            pending, self.requests = list(self.requests.values()), {}
+        try: self.sock.close()
+        except OSError: pass
+        for request in pending:
+            request.error = "uplink lost"
+            request.done.set()
@@ -0,0 +1,183 @@
+"""Vectorized hotspot detection shared by the satellite and the ground station.
+
+A frame is thresholded, hot pixels are grouped into 8-connected regions
+(NumPy label propagation with pointer jumping, no SciPy needed), and each
+region is summarized by area, centroid and peak. Regions are tracked from
+frame to frame by centroid distance; a track only counts as a fire once it
+has been seen in `persistence` consecutive frames, so one noisy pixel or
+one bad frame no longer raises an alert.
+
+Detections pack into 16 bytes each (pack_detections), small enough to
+downlink on their own.
+"""
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+from common import protocol
+
+FIRE_THRESHOLD = 40.0  # °C; 40 is good for testing with a hand or warm coffee, real fire is >100
+MIN_AREA = 2           # pixels; smaller regions are treated as noise
+PERSISTENCE = 3        # consecutive frames before a region is confirmed
+MATCH_RADIUS = 3.0     # pixels a region may move between frames and keep its track
+MAX_MISSES = 1         # frames a track survives without a matching region
+
+Detection = namedtuple("Detection", "track_id area row col peak peak_index frames confirmed")
+
+# track_id, area, centroid row/col (1/100 px), peak (centi-°C), peak pixel, frames seen, flags
+DETECTION = struct.Struct("<HHHHhHHH")
+DETECTION_CONFIRMED = 0x1
+
+
+def label_regions(mask):
+    """8-connected component labels for a boolean 2-D mask.
+
+    Returns an int array where every hot pixel holds the smallest flat index
+    in its region and cold pixels hold mask.size.
+    """
+    size = mask.size
+    labels = np.where(mask, np.arange(size).reshape(mask.shape), size)
+    while True:
+        m = labels.copy()
+        np.minimum(m[1:, :], labels[:-1, :], out=m[1:, :])
+        np.minimum(m[:-1, :], labels[1:, :], out=m[:-1, :])
+        np.minimum(m[:, 1:], labels[:, :-1], out=m[:, 1:])
+        np.minimum(m[:, :-1], labels[:, 1:], out=m[:, :-1])
+        np.minimum(m[1:, 1:], labels[:-1, :-1], out=m[1:, 1:])
+        np.minimum(m[:-1, :-1], labels[1:, 1:], out=m[:-1, :-1])
+        np.minimum(m[1:, :-1], labels[:-1, 1:], out=m[1:, :-1])
+        np.minimum(m[:-1, 1:], labels[1:, :-1], out=m[:-1, 1:])
+        m[~mask] = size
+        # Pointer jumping: adopt the label of the pixel our label points at
+        flat = m.ravel()
+        hot = flat < size
+        flat[hot] = flat[flat[hot]]
+        if np.array_equal(m, labels):
+            return m
+        labels = m
+
+
+def find_regions(temps, threshold=FIRE_THRESHOLD, min_area=MIN_AREA):
+    """Hot regions of one frame as arrays: area, row, col, peak, peak_index."""
+    grid = np.asarray(temps, dtype=np.float32).reshape(protocol.SENSOR_ROWS, protocol.SENSOR_COLS)
+    mask = grid > threshold
+    if not mask.any():
+        empty = np.zeros(0)
+        return empty, empty, empty, empty, empty.astype(np.int64)
+
+    labels = label_regions(mask)
+    hot_index = np.flatnonzero(mask)
+    _, region, area = np.unique(labels.ravel()[hot_index], return_inverse=True, return_counts=True)
+    rows, cols = np.divmod(hot_index, protocol.SENSOR_COLS)
+    hot_temps = grid.ravel()[hot_index]
+    row = np.bincount(region, weights=rows) / area
+    col = np.bincount(region, weights=cols) / area
+
+    # Peak per region: sort by (region, temperature) and take each group's last entry
+    order = np.lexsort((hot_temps, region))
+    last = np.flatnonzero(np.r_[region[order][1:] != region[order][:-1], True])
+    peak = hot_temps[order][last]
+    peak_index = hot_index[order][last]
+
+    keep = area >= min_area
+    return area[keep], row[keep], col[keep], peak[keep], peak_index[keep]
+
+
+class _Track:
+    __slots__ = ("track_id", "row", "col", "frames", "misses")
+
+    def __init__(self, track_id, row, col):
+        self.track_id = track_id
+        self.row, self.col = row, col
+        self.frames = 0
+        self.misses = 0
+
+
+class HotspotDetector:
+    """Per-stream detector: regions per frame plus persistence tracking."""
+
+    def __init__(self, threshold=FIRE_THRESHOLD, min_area=MIN_AREA, persistence=PERSISTENCE,
+                 match_radius=MATCH_RADIUS, max_misses=MAX_MISSES):
+        self.threshold = threshold
+        self.min_area = min_area
+        self.persistence = persistence
+        self.match_radius = match_radius
+        self.max_misses = max_misses
+        self.tracks = []
+        self.next_id = 1
+
+    def reset(self):
+        self.tracks = []
+
+    def update(self, temps):
+        """Process one frame. Returns the list of Detections in it."""
+        area, row, col, peak, peak_index = find_regions(temps, self.threshold, self.min_area)
+
+        # Greedy nearest-centroid matching of regions to existing tracks
+        matched = [None] * len(area)
+        free = list(self.tracks)
+        if free and len(area):
+            track_pos = np.array([(t.row, t.col) for t in free])
+            dist = np.hypot(row[:, None] - track_pos[:, 0], col[:, None] - track_pos[:, 1])
+            for flat in np.argsort(dist, axis=None):
+                r, t = divmod(int(flat), len(free))
+                if dist[r, t] > self.match_radius:
+                    break
+                if matched[r] is None and free[t] is not None:
+                    matched[r] = free[t]
+                    free[t] = None
+
+        for track in free:
+            if track is not None:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        detections = []
+        for i in range(len(area)):
+            track = matched[i]
+            if track is None:
+                track = _Track(self.next_id, row[i], col[i])
+                self.next_id = self.next_id % 0xFFFF + 1
+                self.tracks.append(track)
+            track.row, track.col = row[i], col[i]
+            track.frames += 1
+            track.misses = 0
+            detections.append(Detection(
+                track.track_id, int(area[i]), float(row[i]), float(col[i]), float(peak[i]),
+                int(peak_index[i]), track.frames, track.frames >= self.persistence))
+        return detections
+
+
+def confirmed(detections):
+    return [d for d in detections if d.confirmed]
+
+
+def to_dict(detection):
+    return {
+        "id": detection.track_id,
+        "area": detection.area,
+        "centroid": [round(detection.row, 2), round(detection.col, 2)],
+        "peak": round(detection.peak, 2),
+        "peak_pixel": list(divmod(detection.peak_index, protocol.SENSOR_COLS)),
+        "frames": detection.frames,
+        "confirmed": detection.confirmed,
+    }
+
+
+def pack_detections(detections):
+    out = bytearray()
+    for d in detections:
+        out += DETECTION.pack(
+            d.track_id, d.area, int(round(d.row * 100)), int(round(d.col * 100)),
+            int(np.clip(round(d.peak * 100), -32768, 32767)), d.peak_index,
+            min(d.frames, 0xFFFF), DETECTION_CONFIRMED if d.confirmed else 0)
+    return bytes(out)
+
+
+def unpack_detections(data):
+    detections = []
+    for track_id, area, row, col, peak, peak_index, frames, flags in DETECTION.iter_unpack(data):
+        detections.append(Detection(track_id, area, row / 100.0, col / 100.0, peak / 100.0,
+                                    peak_index, frames, bool(flags & DETECTION_CONFIRMED)))
+    return detections
@@ -0,0 +1,257 @@
+"""Low-overhead counters and latency histograms, exported as Prometheus text.
+
+Metrics are module-level objects created once at import:
+
+    READ_SECONDS = metrics.histogram("flamesat_sensor_read_seconds", "getFrame() duration")
+    READ_ERRORS = metrics.counter("flamesat_sensor_read_errors_total", "Failed sensor reads")
+
+    with READ_SECONDS.time():
+        sensor.getFrame(frame)
+    READ_ERRORS.inc()
+
+A hot-path update is one lock and an add (a bisect as well for
+histograms). Numbers the code already keeps, such as per-link counters or
+queue sizes, are not mirrored: a collector function reads them at scrape
+time instead. render() produces the text exposition format served at
+/metrics; serve() runs a tiny HTTP server for processes without a web
+framework (the satellite).
+"""
+import bisect
+import http.server
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; from sub-millisecond encodes to multi-second stalls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Timer:
+    """Times a `with` block into anything with observe(seconds)."""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.children = {}
+
+    def labels(self, *values):
+        """The child for one label combination; keep it around on hot paths."""
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self.lock:
+                child = self.children.setdefault(values, self._child())
+        return child
+
+    def _child(self):
+        return type(self)(self.name, self.help)
+
+    def collect(self):
+        """[(labels dict, child)] for every series of this metric."""
+        if not self.labelnames:
+            return [({}, self)]
+        return [(dict(zip(self.labelnames, values)), child) for values, child in list(self.children.items())]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def lines(self, labels):
+        return [(self.name, labels, self.value)]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; with `fn` it is read from fn() at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        super().__init__(name, help, labelnames)
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def lines(self, labels):
+        return [(self.name, labels, self.fn() if self.fn else self.value)]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def _child(self):
+        return Histogram(self.name, self.help, buckets=self.buckets)
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the duration of its block, in seconds."""
+        return Timer(self)
+
+    def lines(self, labels):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        result = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            result.append((self.name + "_bucket", dict(labels, le=_format_value(bound)), cumulative))
+        result.append((self.name + "_sum", labels, total))
+        result.append((self.name + "_count", labels, count))
+        return result
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"metric '{metric.name}' already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def collector(self, fn):
+        """fn() -> [(name, kind, help, [(labels dict, value)])], called on every scrape."""
+        with self.lock:
+            self.collectors.append(fn)
+        return fn
+
+    def render(self):
+        with self.lock:
+            metrics, collectors = list(self.metrics.values()), list(self.collectors)
+        out = []
+        for metric in metrics:
+            out.append(f"# HELP {metric.name} {metric.help}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, child in metric.collect():
+                out.extend(_format_sample(*line) for line in child.lines(labels))
+        for fn in collectors:
+            try:
+                families = fn()
+            except Exception as e:
+                out.append(f"# collector {getattr(fn, '__name__', fn)} failed: {e}")
+                continue
+            for name, kind, help, samples in families:
+                out.append(f"# HELP {name} {help}")
+                out.append(f"# TYPE {name} {kind}")
+                out.extend(_format_sample(name, labels, value) for labels, value in samples)
+        return "\n".join(out) + "\n"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name, labels, value):
+    if labels:
+        label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+        return f"{name}{{{label_text}}} {_format_value(value)}"
+    return f"{name} {_format_value(value)}"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help, labelnames=()):
+    return REGISTRY.register(Counter(name, help, labelnames))
+
+
+def gauge(name, help, labelnames=(), fn=None):
+    return REGISTRY.register(Gauge(name, help, labelnames, fn))
+
+
+def histogram(name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+    return REGISTRY.register(Histogram(name, help, labelnames, buckets))
+
+
+def collector(fn):
+    return REGISTRY.collector(fn)
+
+
+def render():
+    return REGISTRY.render()
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scraped every few seconds; keep the console for real events
+
+
+def serve(port, host="0.0.0.0"):
+    """Serve GET /metrics on a background thread. Returns the server."""
+    server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,340 @@
+"""FLAMESAT telemetry wire protocol.
+
+Every frame on the downlink is a fixed header followed by a payload:
+
+    magic     4s   b"FSAT"
+    version   B    protocol version
+    encoding  B    payload encoding (ENC_*)
+    flags     H    bit flags (FLAG_*)
+    seq       I    frame sequence number (wraps at 2**32)
+    timestamp d    capture time, seconds since the epoch
+    length    I    payload length in bytes
+    crc       I    CRC32 over the header (minus this field) and the payload
+
+The receiver hunts for the magic word when anything looks wrong, so one
+short read or a corrupted packet only costs a frame, not the whole link.
+
+Right after connecting, a ground station may send a HELLO listing the
+payload encodings it can decode, most preferred first. The satellite picks
+the first one it supports and every frame header says which one is in use.
+Clients that never send a HELLO get plain float32 frames.
+
+A ground station that also lists ENC_STATS in its HELLO can be served in
+event mode: full frames only when the scene changes, a hotspot is present
+or a refresh is due, and a small stats packet (ENC_STATS, no pixels) in
+between that doubles as the link heartbeat.
+
+A ground station that lists ENC_RATE gets a small rate notice (ENC_RATE)
+on connecting and whenever the satellite retimes its sensor; it repeats
+the seq of the frame sent just before it.
+
+A ground station that lists ENC_STORED accepts frames the satellite
+recorded onboard while no ground station was connected (see
+satellite/store.py). They are backfilled after reconnecting, interleaved
+with live frames, and keep their original seq and capture time, so they
+arrive out of order. Their payload is a STORED block (frames still queued
+onboard) followed by a self-contained int16+delta+zlib keyframe. Readers
+leave them out of loss accounting.
+
+Frames processed onboard (ROI crop, binning, temporal averaging; see
+satellite/processing.py) set FLAG_TRANSFORM and start their payload with a
+TRANSFORM block describing the geometry, so the ground can put the pixels
+back where they belong on the 24x32 sensor grid.
+"""
+import asyncio
+import socket
+import struct
+import zlib
+from collections import namedtuple
+
+MAGIC = b"FSAT"
+VERSION = 1
+
+# Payload encodings (see common/codec.py)
+ENC_FLOAT32 = 0          # 768 little-endian float32 pixels
+ENC_INT16 = 1            # 768 little-endian int16 centi-degrees
+ENC_INT16_DELTA_ZLIB = 2  # int16, delta coded, zlib compressed
+ENC_INT16_DELTA_LZ4 = 3   # int16, delta coded, LZ4 compressed
+ENC_STATS = 16           # no pixels: frame stats + packed detections (event mode)
+ENC_RATE = 17            # no pixels: sensor refresh rate notice
+ENC_STORED = 18          # STORED block + int16+delta+zlib keyframe recorded onboard (backfill)
+
+ENCODING_NAMES = {
+    ENC_FLOAT32: "float32",
+    ENC_INT16: "int16",
+    ENC_INT16_DELTA_ZLIB: "int16+delta+zlib",
+    ENC_INT16_DELTA_LZ4: "int16+delta+lz4",
+    ENC_STATS: "stats",
+    ENC_RATE: "rate",
+    ENC_STORED: "stored",
+}
+
+# Header flags
+FLAG_KEYFRAME = 0x0001  # payload decodes on its own (no reference frame needed)
+FLAG_SPARSE = 0x0002    # frames since the previous packet were skipped on purpose, not lost
+FLAG_TRANSFORM = 0x0004  # payload starts with a TRANSFORM block
+
+HEADER = struct.Struct("!4sBBHIdII")
+HEADER_SIZE = HEADER.size
+MAX_PAYLOAD = 64 * 1024
+
+SENSOR_ROWS = 24
+SENSOR_COLS = 32
+PIXELS = SENSOR_ROWS * SENSOR_COLS
+
+HELLO_MAGIC = b"FSHI"
+HELLO = struct.Struct("!4sBB")  # magic, version, number of encodings that follow
+
+# ENC_STATS payload: max, min, mean (°C), seq of the last full frame sent,
+# pixels changed since that frame; followed by packed detections
+STATS = struct.Struct("<fffIH")
+
+# ENC_RATE payload: sensor refresh rate (Hz), frames per second, reason
+# (RATE_REASONS index), scene change (°C/s) and steepest gradient (°C/px)
+# that the decision was based on
+RATE = struct.Struct("<ffBff")
+RATE_REASONS = ("initial", "activity", "hotspot", "calm", "overload", "command")
+
+# ENC_STORED block: frames still queued onboard after this one
+STORED = struct.Struct("<I")
+
+# FLAG_TRANSFORM block: first sensor row/col of the region, output grid
+# rows/cols, bin factor, decimation factor, number of frames averaged
+TRANSFORM = struct.Struct("<BBBBBBH")
+
+FrameHeader = namedtuple("FrameHeader", "version encoding flags seq timestamp length")
+FrameStats = namedtuple("FrameStats", "max min mean reference_seq changed")
+Transform = namedtuple("Transform", "row0 col0 rows cols binning decimate averaged")
+RateNotice = namedtuple("RateNotice", "refresh_hz frame_rate reason change gradient")
+
+
+class ProtocolError(Exception):
+    """Raised for frames that cannot be built."""
+
+
+def pack_frame(seq, timestamp, payload, encoding=ENC_FLOAT32, flags=0):
+    """Build a complete wire frame (header + payload) ready for sendall()."""
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError(f"payload too large ({len(payload)} bytes)")
+    seq &= 0xFFFFFFFF
+    head = HEADER.pack(MAGIC, VERSION, encoding, flags, seq, timestamp, len(payload), 0)
+    crc = zlib.crc32(payload, zlib.crc32(head[:-4]))
+    return head[:-4] + struct.pack("!I", crc) + payload
+
+
+def pack_stats(max_temp, min_temp, mean_temp, reference_seq, changed, detections=b""):
+    """Build an ENC_STATS payload. `detections` is common.detection.pack_detections() output."""
+    return STATS.pack(max_temp, min_temp, mean_temp, reference_seq & 0xFFFFFFFF, min(changed, 0xFFFF)) + detections
+
+
+def unpack_stats(payload):
+    """ENC_STATS payload -> (FrameStats, packed detections)."""
+    if len(payload) < STATS.size:
+        raise ProtocolError(f"stats packet has {len(payload)} bytes")
+    return FrameStats(*STATS.unpack_from(payload)), bytes(payload[STATS.size:])
+
+
+def pack_rate(refresh_hz, frame_rate, reason, change=0.0, gradient=0.0):
+    """Build an ENC_RATE payload; `reason` is one of RATE_REASONS."""
+    return RATE.pack(refresh_hz, frame_rate, RATE_REASONS.index(reason), change, gradient)
+
+
+def unpack_rate(payload):
+    """ENC_RATE payload -> RateNotice (reason as a name)."""
+    if len(payload) < RATE.size:
+        raise ProtocolError(f"rate notice has {len(payload)} bytes")
+    notice = RateNotice(*RATE.unpack_from(payload))
+    reason = RATE_REASONS[notice.reason] if notice.reason < len(RATE_REASONS) else f"reason {notice.reason}"
+    return notice._replace(reason=reason)
+
+
+def pack_stored(pending):
+    """ENC_STORED block; the stored frame's payload follows it."""
+    return STORED.pack(min(pending, 0xFFFFFFFF))
+
+
+def unpack_stored(payload):
+    """ENC_STORED payload -> (frames still queued onboard, int16+delta+zlib payload)."""
+    if len(payload) < STORED.size:
+        raise ProtocolError(f"stored frame has {len(payload)} bytes")
+    return STORED.unpack_from(payload)[0], payload[STORED.size:]
+
+
+def pack_transform(transform):
+    return TRANSFORM.pack(*transform)
+
+
+def unpack_transform(payload):
+    """Split a FLAG_TRANSFORM payload into (Transform, pixel payload)."""
+    if len(payload) < TRANSFORM.size:
+        raise ProtocolError(f"transform block truncated ({len(payload)} bytes)")
+    transform = Transform(*TRANSFORM.unpack_from(payload))
+    if (not transform.rows or not transform.cols or not transform.binning
+            or transform.row0 + transform.rows * transform.binning > SENSOR_ROWS
+            or transform.col0 + transform.cols * transform.binning > SENSOR_COLS):
+        raise ProtocolError(f"transform outside the sensor: {transform}")
+    return transform, payload[TRANSFORM.size:]
+
+
+def pack_hello(encodings):
+    """Build the HELLO a ground station sends to request payload encodings."""
+    return HELLO.pack(HELLO_MAGIC, VERSION, len(encodings)) + bytes(encodings)
+
+
+def read_hello(sock, timeout=0.5):
+    """Read a client HELLO. Returns the list of encodings, or None if absent."""
+    old_timeout = sock.gettimeout()
+    sock.settimeout(timeout)
+    try:
+        head = sock.recv(HELLO.size, socket.MSG_WAITALL)
+        if len(head) != HELLO.size:
+            return None
+        magic, version, count = HELLO.unpack(head)
+        if magic != HELLO_MAGIC:
+            return None
+        body = sock.recv(count, socket.MSG_WAITALL) if count else b""
+        return list(body)
+    except (socket.timeout, OSError):
+        return None
+    finally:
+        sock.settimeout(old_timeout)
+
+
+def choose_encoding(requested, supported):
+    """First encoding the client asked for that we can produce."""
+    for enc in requested or ():
+        if enc in supported:
+            return enc
+    return ENC_FLOAT32
+
+
+class FrameReader:
+    """Reads framed telemetry off a socket, resyncing on the magic word.
+
+    read_frame() returns (FrameHeader, payload) or None once the link is
+    gone. Frames that fail the CRC or sanity checks are skipped and counted.
+
+    Bytes are received with recv_into() into one preallocated buffer and the
+    payload is returned as a memoryview into it: consume (or copy) it before
+    the next read_frame() call.
+    """
+
+    def __init__(self, sock, buffer_size=4 * (HEADER_SIZE + MAX_PAYLOAD)):
+        self.sock = sock
+        self.buf = bytearray(buffer_size)
+        self.view = memoryview(self.buf)
+        self.start = 0  # first unconsumed byte
+        self.end = 0    # one past the last received byte
+        self.last_seq = None
+        # Link health counters
+        self.frames = 0
+        self.corrupt = 0
+        self.resyncs = 0
+        self.dropped = 0
+        self.bytes_received = 0
+
+    def _make_room(self, n):
+        if self.start + n > len(self.buf):
+            # Slide the unconsumed tail back to the front of the buffer
+            pending = self.end - self.start
+            self.buf[:pending] = self.buf[self.start:self.end]
+            self.start, self.end = 0, pending
+
+    def _received(self, received):
+        self.end += received
+        self.bytes_received += received
+
+    def _fill(self, n):
+        """Make at least n unconsumed bytes available. False if the link closed."""
+        self._make_room(n)
+        while self.end - self.start < n:
+            try:
+                received = self.sock.recv_into(self.view[self.end:])
+            except (socket.timeout, OSError):
+                return False
+            if not received:
+                return False
+            self._received(received)
+        return True
+
+    def _resync(self):
+        """Throw away bytes up to the next candidate magic word."""
+        self.resyncs += 1
+        idx = self.buf.find(MAGIC, self.start + 1, self.end)
+        if idx < 0:
+            # Keep a possible partial magic at the tail
+            self.start = max(self.start + 1, self.end - (len(MAGIC) - 1))
+        else:
+            self.start = idx
+
+    def _parse(self):
+        """Next valid frame in the buffered bytes, or how many bytes are needed first."""
+        while True:
+            start = self.start
+            if self.end - start < HEADER_SIZE:
+                return HEADER_SIZE
+            magic, version, encoding, flags, seq, ts, length, crc = HEADER.unpack_from(self.buf, start)
+            if magic != MAGIC or version != VERSION or length > MAX_PAYLOAD:
+                self._resync()
+                continue
+            if self.end - start < HEADER_SIZE + length:
+                return HEADER_SIZE + length
+
+            body = start + HEADER_SIZE
+            payload = self.view[body:body + length]
+            expected = zlib.crc32(payload, zlib.crc32(self.view[start:body - 4]))
+            if crc != expected:
+                self.corrupt += 1
+                self._resync()
+                continue
+
+            self.start = body + length
+            if encoding != ENC_STORED:  # backfill reuses old sequence numbers
+                self._track_seq(seq, flags & FLAG_SPARSE)
+            self.frames += 1
+            return FrameHeader(version, encoding, flags, seq, ts, length), payload
+
+    def read_frame(self):
+        while True:
+            frame = self._parse()
+            if not isinstance(frame, int):
+                return frame
+            if not self._fill(frame):
+                return None
+
+    def _track_seq(self, seq, sparse=False):
+        if self.last_seq is not None and not sparse:
+            gap = (seq - self.last_seq - 1) & 0xFFFFFFFF
+            # A huge gap means the sender restarted, not that we lost 4 billion frames
+            if gap < 0x80000000:
+                self.dropped += gap
+        self.last_seq = seq
+
+
+class AsyncFrameReader(FrameReader):
+    """FrameReader for asyncio ingest; `sock` must be non-blocking.
+
+    `await read_frame()` has the same results and buffer rules as the
+    blocking version.
+    """
+
+    async def _fill_async(self, n):
+        self._make_room(n)
+        loop = asyncio.get_running_loop()
+        while self.end - self.start < n:
+            try:
+                received = await loop.sock_recv_into(self.sock, self.view[self.end:])
+            except OSError:
+                return False
+            if not received:
+                return False
+            self._received(received)
+        return True
+
+    async def read_frame(self):
+        while True:
+            frame = self._parse()
+            if not isinstance(frame, int):
+                return frame
+            if not await self._fill_async(frame):
+                return None
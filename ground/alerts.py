@@ -0,0 +1,306 @@
+"""Fire alert dispatch, off the ingest event loop.
+
+The ingest event loop only calls AlertDispatcher.raise_alert(), which puts the
+alert on a bounded queue and never blocks. One worker thread drains the
+queue and delivers to every sink:
+
+  * the first alert after a quiet period goes out immediately
+  * alerts raised within `cooldown` of the last delivery are coalesced and
+    sent as one digest when the cooldown ends
+  * a sink that fails keeps its pending alerts and is retried with
+    exponential backoff; the other sinks are not held up
+
+SmtpSink keeps one authenticated connection open between deliveries (no
+TLS handshake and login per alert) and reconnects when the server drops
+it. The host and port are configurable, so a local fake server can stand
+in for Gmail:
+
+    python3 alerts.py --fake-smtp 1025
+    python3 ground_server.py --smtp-host 127.0.0.1 --smtp-port 1025
+"""
+import argparse
+import json
+import queue
+import smtplib
+import socketserver
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from email.mime.text import MIMEText
+
+ALERT_QUEUE_DEPTH = 256
+ALERT_COOLDOWN = 60      # s between deliveries to one sink; alerts in between become a digest
+MAX_DIGEST = 100         # alerts kept per pending digest; older ones are only counted
+BACKOFF_BASE = 2.0       # s; doubles per consecutive failure
+BACKOFF_MAX = 300.0
+SMTP_TIMEOUT = 15
+SMTP_IDLE_CLOSE = 240    # s; servers drop idle sessions after a few minutes anyway
+WEBHOOK_TIMEOUT = 10
+DASHBOARD_URL = "https://flamedata.nillsite.com"
+
+Alert = namedtuple("Alert", "timestamp seq max_temp hotspots message")
+
+
+def digest_subject(alerts, omitted=0):
+    hottest = max(a.max_temp for a in alerts)
+    if len(alerts) + omitted == 1:
+        return f"🔥 FLAMESAT ALERT: {hottest:.1f}°C DETECTED"
+    return f"🔥 FLAMESAT ALERT: {len(alerts) + omitted} events, up to {hottest:.1f}°C"
+
+
+def digest_text(alerts, omitted=0):
+    lines = ["EMERGENCY ALERT", "", "FLAMESAT has detected a thermal anomaly.", ""]
+    for a in alerts:
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(a.timestamp))
+        lines.append(f"{when}  Max Temperature: {a.max_temp:.1f}°C  Hotspots: {a.hotspots}  {a.message}".rstrip())
+    if omitted:
+        lines.append(f"... and {omitted} earlier alerts")
+    lines += ["", f"View Telemetry: {DASHBOARD_URL}", f"Latest Thermal Image: {DASHBOARD_URL}/api/frame.png"]
+    return "\n".join(lines)
+
+
+class SmtpSink:
+    """E-mail via one reused SMTP session (SSL on port 465, STARTTLS if offered elsewhere)."""
+
+    def __init__(self, sender, receivers, password=None, host="smtp.gmail.com", port=465):
+        self.name = f"smtp:{host}:{port}"
+        self.sender = sender
+        self.receivers = receivers
+        self.password = password
+        self.host = host
+        self.port = port
+        self.server = None
+        self.last_used = 0.0
+
+    def _connect(self):
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        try:
+            if self.port != 465:
+                server.ehlo()
+                if server.has_extn("starttls"):
+                    server.starttls()
+                    server.ehlo()
+            if self.password:
+                server.login(self.sender, self.password)
+        except (smtplib.SMTPException, OSError):
+            server.close()
+            raise
+        return server
+
+    def send(self, alerts, omitted=0):
+        msg = MIMEText(digest_text(alerts, omitted))
+        msg['Subject'] = digest_subject(alerts, omitted)
+        msg['From'] = self.sender
+        msg['To'] = ", ".join(self.receivers)
+
+        for attempt in (1, 2):
+            if self.server is None:
+                self.server = self._connect()
+            try:
+                self.server.send_message(msg)
+                self.last_used = time.monotonic()
+                return
+            except OSError as e:
+                if isinstance(e, smtplib.SMTPException) and not isinstance(e, smtplib.SMTPServerDisconnected):
+                    raise  # refused (sender, recipients, message); a new session would be refused too
+                # The pooled session went stale; reconnect once before giving up
+                self.close()
+                if attempt == 2:
+                    raise
+
+    def idle(self, now):
+        if self.server is not None and now - self.last_used > SMTP_IDLE_CLOSE:
+            self.close()
+
+    def close(self):
+        server, self.server = self.server, None
+        if server is not None:
+            try: server.quit()
+            except (smtplib.SMTPException, OSError): pass
+
+
+class WebhookSink:
+    """POSTs each digest as JSON (Slack/Discord-style "text" plus the raw alerts)."""
+
+    def __init__(self, url):
+        # Host only: the path usually carries the hook's token, and the name is shown on /api/link
+        self.name = f"webhook:{urllib.parse.urlsplit(url).hostname}"
+        self.url = url
+
+    def send(self, alerts, omitted=0):
+        body = json.dumps({
+            "text": digest_subject(alerts, omitted),
+            "alerts": [a._asdict() for a in alerts],
+            "omitted": omitted,
+        }).encode()
+        req = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=WEBHOOK_TIMEOUT) as r:
+            r.read()
+
+    def idle(self, now):
+        pass
+
+    def close(self):
+        pass
+
+
+class _SinkState:
+    def __init__(self, sink):
+        self.sink = sink
+        self.pending = []
+        self.omitted = 0
+        self.next_attempt = 0.0
+        self.failures = 0
+        self.sent = 0
+
+
+class AlertDispatcher:
+    def __init__(self, sinks=(), queue_depth=ALERT_QUEUE_DEPTH, cooldown=ALERT_COOLDOWN):
+        self.states = [_SinkState(sink) for sink in sinks]
+        self.queue = queue.Queue(maxsize=queue_depth)
+        self.cooldown = cooldown
+        self.raised = 0
+        self.dropped = 0
+
+    def start(self):
+        threading.Thread(target=self._worker, daemon=True).start()
+        for state in self.states:
+            print(f"[WATCHDOG] Alert sink: {state.sink.name}")
+
+    def raise_alert(self, alert):
+        """Queue an alert for delivery. Never blocks."""
+        self.raised += 1
+        try:
+            self.queue.put_nowait(alert)
+        except queue.Full:
+            self.dropped += 1
+
+    def summary(self):
+        return {
+            "raised": self.raised,
+            "dropped": self.dropped,
+            "sinks": {s.sink.name: {"sent": s.sent, "pending": len(s.pending) + s.omitted, "failures": s.failures}
+                      for s in self.states},
+        }
+
+    def _worker(self):
+        while True:
+            now = time.monotonic()
+            due = [s.next_attempt for s in self.states if s.pending]
+            timeout = min([max(0.0, t - now) for t in due] + [30.0])
+            alerts = []
+            try:
+                alerts.append(self.queue.get(timeout=timeout))
+                while True:
+                    alerts.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            for state in self.states:
+                state.pending += alerts
+                if len(state.pending) > MAX_DIGEST:
+                    state.omitted += len(state.pending) - MAX_DIGEST
+                    del state.pending[:-MAX_DIGEST]
+            self._deliver(time.monotonic())
+
+    def _deliver(self, now):
+        for state in self.states:
+            if not state.pending:
+                state.sink.idle(now)
+                continue
+            if now < state.next_attempt:
+                continue
+            try:
+                state.sink.send(state.pending, state.omitted)
+            except Exception as e:
+                state.failures += 1
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (state.failures - 1))
+                state.next_attempt = now + delay
+                print(f"[WATCHDOG] ❌ {state.sink.name} failed ({e}); retrying in {delay:.0f}s")
+                continue
+            print(f"[WATCHDOG] ✅ Alert sent via {state.sink.name} ({len(state.pending)} alerts)")
+            state.sent += len(state.pending) + state.omitted
+            state.pending, state.omitted = [], 0
+            state.failures = 0
+            state.next_attempt = now + self.cooldown
+
+
+# --- LOCAL TEST STAND-IN ---
+
+class _FakeSmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept messages (no auth, no TLS)."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.sessions += 1
+        self.reply("220 flamesat-fake-smtp ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 flamesat-fake-smtp")
+            elif verb == "RCPT" and any(r in command for r in self.server.refuse):
+                self.reply("550 no such user")
+            elif verb == "DATA":
+                self.reply("354 end with <CRLF>.<CRLF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data.decode(errors="replace").rstrip("\r\n"))
+                self.server.deliver(lines)
+                self.reply("250 queued")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:  # MAIL, RCPT, RSET, NOOP
+                self.reply("250 ok")
+
+
+class FakeSmtpServer(socketserver.ThreadingTCPServer):
+    """Local SMTP stand-in that keeps (and optionally prints) every message it accepts.
+
+    Recipients containing any string in `refuse` get a 550, as a real
+    server answers an unknown mailbox.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port=0, echo=True, refuse=()):
+        super().__init__(("127.0.0.1", port), _FakeSmtpHandler)
+        self.echo = echo
+        self.refuse = refuse
+        self.messages = []  # message lines, headers included
+        self.sessions = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def deliver(self, lines):
+        self.messages.append(lines)
+        if self.echo:
+            print("\n".join(["-" * 60] + lines + ["-" * 60]), flush=True)
+
+
+def run_fake_smtp(port):
+    with FakeSmtpServer(port) as server:
+        print(f"[FAKE SMTP] Listening on 127.0.0.1:{server.port}, printing every message")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FLAMESAT alert tools")
+    parser.add_argument("--fake-smtp", type=int, metavar="PORT", required=True,
+                        help="run a local SMTP server that prints messages instead of sending them")
+    run_fake_smtp(parser.parse_args().fake_smtp)
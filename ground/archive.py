@@ -0,0 +1,322 @@
+"""Append-only on-disk telemetry archive.
+
+Frames are stored as fixed-size records (stats + int16 centi-degree pixels)
+in preallocated segment files that are rotated when full and expired
+oldest-first. The ingest event loop (ingest.IngestCore) only enqueues; a
+writer thread does the disk I/O, so a slow disk never stalls ingest.
+
+Readers mmap the segments and slice them with NumPy, so range queries over
+days of frames touch only the pages they need. Each segment keeps its
+timestamp/sequence bounds in memory to skip segments outside a query.
+Records are not assumed to be in time order within a segment: frames the
+satellite recorded onboard during a link outage arrive later, out of
+order, and are archived with FLAG_STORED like any other frame.
+"""
+import collections
+import glob
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+
+import numpy as np
+
+from common import codec, protocol
+
+SEGMENT_FRAMES = 16384        # ~25 MB per segment, ~2.3 hours at 2 Hz
+MAX_SEGMENTS = 300            # oldest segments are deleted beyond this (~7.5 GB)
+WRITE_QUEUE_DEPTH = 1024
+RECENT_FRAMES = 2 * WRITE_QUEUE_DEPTH  # appended frames remembered for contains(), queued or not
+INDEX_SLACK = 1024            # records appended past a segment's lookup index before it is rebuilt
+QUERY_CHUNK = 4096            # records read at a time when a query reduces buckets (~6 MB)
+
+# Record flags
+FLAG_STORED = 0x0001  # backfilled from the satellite's onboard store
+
+FILE_MAGIC = b"FSARCHV1"
+FILE_HEADER = struct.Struct("<8sII")  # magic, record size, records per segment
+FILE_HEADER_SIZE = 64
+
+RECORD = np.dtype([
+    ("timestamp", "<f8"),   # capture time (satellite clock); 0 marks an empty slot
+    ("received", "<f8"),    # ground receive time
+    ("seq", "<u4"),
+    ("flags", "<u4"),
+    ("max", "<f4"),
+    ("min", "<f4"),
+    ("pixels", "<i2", (protocol.PIXELS,)),
+])
+
+
+class Segment:
+    """One preallocated segment file, written with pwrite and read via mmap."""
+
+    def __init__(self, path, create=False):
+        self.path = path
+        size = FILE_HEADER_SIZE + SEGMENT_FRAMES * RECORD.itemsize
+        if create:
+            with open(path, "wb") as f:
+                f.write(FILE_HEADER.pack(FILE_MAGIC, RECORD.itemsize, SEGMENT_FRAMES))
+                f.truncate(size)
+        self.fd = os.open(path, os.O_RDWR)
+        magic, record_size, frames = FILE_HEADER.unpack(os.pread(self.fd, FILE_HEADER.size, 0))
+        if magic != FILE_MAGIC or record_size != RECORD.itemsize or frames != SEGMENT_FRAMES:
+            os.close(self.fd)
+            raise ValueError(f"{path}: not a compatible archive segment")
+        self.mm = mmap.mmap(self.fd, size, access=mmap.ACCESS_READ)
+        self.records = np.frombuffer(self.mm, dtype=RECORD, count=SEGMENT_FRAMES, offset=FILE_HEADER_SIZE)
+
+        # Recover the fill level and index bounds from what is on disk
+        empty = np.flatnonzero(self.records["timestamp"] == 0)
+        self.count = int(empty[0]) if len(empty) else SEGMENT_FRAMES
+        self.t_min = self.t_max = None
+        self.seq_min = self.seq_max = None
+        if self.count:
+            used = self.records[:self.count]
+            self.t_min, self.t_max = float(used["timestamp"].min()), float(used["timestamp"].max())
+            self.seq_min, self.seq_max = int(used["seq"].min()), int(used["seq"].max())
+        self.readers = 0      # queries using the mmap right now (FrameArchive.lock guards this)
+        self.expired = False  # dropped from the archive; closed by the last reader
+        # Lookup index for find(): record numbers sorted by timestamp, built lazily
+        self.order = self.sorted_ts = None
+        self.indexed = 0
+
+    @property
+    def full(self):
+        return self.count >= SEGMENT_FRAMES
+
+    def append(self, record):
+        os.pwrite(self.fd, record.tobytes(), FILE_HEADER_SIZE + self.count * RECORD.itemsize)
+        ts, seq = float(record["timestamp"]), int(record["seq"])
+        self.t_min = ts if self.t_min is None else min(self.t_min, ts)
+        self.t_max = ts if self.t_max is None else max(self.t_max, ts)
+        self.seq_min = seq if self.seq_min is None else min(self.seq_min, seq)
+        self.seq_max = seq if self.seq_max is None else max(self.seq_max, seq)
+        self.count += 1  # publish only after the bytes are in place
+
+    def find(self, timestamp, seq):
+        """Whether the segment holds frame `seq` captured at `timestamp`.
+
+        Binary search over the indexed records plus a scan of the few
+        appended since; the index is rebuilt every INDEX_SLACK appends.
+        Not thread-safe: call from the ingest event loop only.
+        """
+        count = self.count
+        if self.order is None or count - self.indexed > INDEX_SLACK:
+            ts = self.records["timestamp"][:count]
+            self.order = np.argsort(ts, kind="stable")
+            self.sorted_ts = ts[self.order]
+            self.indexed = count
+        lo = np.searchsorted(self.sorted_ts, timestamp, side="left")
+        hi = np.searchsorted(self.sorted_ts, timestamp, side="right")
+        if seq in self.records["seq"][self.order[lo:hi]]:
+            return True
+        tail = self.records[self.indexed:count]
+        return bool(np.any((tail["timestamp"] == timestamp) & (tail["seq"] == seq)))
+
+    def overlaps(self, t_from, t_to):
+        return self.count and self.t_min <= t_to and self.t_max >= t_from
+
+    def close(self):
+        self.records = None
+        try: self.mm.close()
+        except BufferError: pass  # a reader still holds a view; the GC will unmap it
+        os.close(self.fd)
+
+    def summary(self):
+        return {
+            "file": os.path.basename(self.path),
+            "frames": self.count,
+            "from": self.t_min,
+            "to": self.t_max,
+            "seq_from": self.seq_min,
+            "seq_to": self.seq_max,
+        }
+
+
+class FrameArchive:
+    def __init__(self, directory, max_segments=MAX_SEGMENTS):
+        self.directory = directory
+        self.max_segments = max_segments
+        self.queue = queue.Queue(maxsize=WRITE_QUEUE_DEPTH)
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+        self.segments = []
+        self.recent = collections.deque(maxlen=RECENT_FRAMES)  # (timestamp, seq), oldest first
+        self.recent_keys = set()
+
+    def start(self):
+        """Open the existing segments and start the writer thread."""
+        os.makedirs(self.directory, exist_ok=True)
+        for path in sorted(glob.glob(os.path.join(self.directory, "seg-*.fsa"))):
+            try:
+                self.segments.append(Segment(path))
+            except (OSError, ValueError) as e:
+                print(f"[ARCHIVE] ⚠️ Skipping {path}: {e}")
+        threading.Thread(target=self._writer, daemon=True).start()
+        frames = sum(seg.count for seg in self.segments)
+        print(f"[ARCHIVE] {len(self.segments)} segments, {frames} frames in {self.directory}")
+
+    def append(self, timestamp, received, seq, pixels, flags=0):
+        """Queue one frame for the writer thread. Never blocks."""
+        record = np.zeros((), dtype=RECORD)
+        record["timestamp"] = timestamp
+        record["received"] = received
+        record["seq"] = seq
+        record["flags"] = flags
+        record["max"] = pixels.max()
+        record["min"] = pixels.min()
+        record["pixels"] = codec.quantize(pixels)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if len(self.recent) == self.recent.maxlen:
+            self.recent_keys.discard(self.recent[0])
+        key = (timestamp, seq)
+        self.recent.append(key)
+        self.recent_keys.add(key)
+
+    def contains(self, timestamp, seq):
+        """Whether frame `seq` captured at `timestamp` is archived or queued (call from the ingest event loop)."""
+        if (timestamp, seq) in self.recent_keys:
+            return True
+        segments = self._acquire(timestamp, timestamp)
+        try:
+            return any(seg.find(timestamp, seq) for seg in segments)
+        finally:
+            self._release(segments)
+
+    def _acquire(self, t_from, t_to):
+        """Segments overlapping the range, kept open until _release()."""
+        with self.lock:
+            segments = [seg for seg in self.segments if seg.overlaps(t_from, t_to)]
+            for seg in segments:
+                seg.readers += 1
+        return segments
+
+    def _release(self, segments):
+        with self.lock:
+            for seg in segments:
+                seg.readers -= 1
+                if seg.expired and not seg.readers:
+                    seg.close()
+
+    def _writer(self):
+        while True:
+            record = self.queue.get()
+            try:
+                with self.lock:
+                    segment = self.segments[-1] if self.segments else None
+                    if segment is None or segment.full:
+                        segment = self._rotate()
+                segment.append(record)
+                self.written += 1
+            except OSError as e:
+                print(f"[ARCHIVE] ❌ Write Failed: {e}")
+                time.sleep(1)
+
+    def _rotate(self):
+        """Start a new segment and expire the oldest ones (caller holds the lock)."""
+        name = f"seg-{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}.fsa"
+        segment = Segment(os.path.join(self.directory, name), create=True)
+        self.segments.append(segment)
+        while len(self.segments) > self.max_segments:
+            old = self.segments.pop(0)
+            old.expired = True
+            os.remove(old.path)  # the mapping stays valid until it is closed
+            if not old.readers:
+                old.close()
+        return segment
+
+    def summary(self):
+        with self.lock:
+            segments = list(self.segments)
+        return {
+            "segments": [seg.summary() for seg in segments],
+            "frames": sum(seg.count for seg in segments),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+    def query(self, t_from, t_to, step=0, agg="first", limit=2000):
+        """Frames with t_from <= timestamp <= t_to, in time order.
+
+        With step > 0 the range is cut into step-second buckets and each
+        bucket yields its first frame (agg="first") or the per-pixel
+        maximum of its frames (agg="max", handy for spotting brief
+        hotspots). Returns a RECORD array of at most `limit` rows.
+
+        The rows to return are chosen from the timestamp column alone, and
+        only those are copied out of the mmaps; agg="max" reads its buckets
+        QUERY_CHUNK records at a time. A query over the whole archive never
+        holds more than that in memory.
+        """
+        segments = self._acquire(t_from, t_to)
+        try:
+            # (segment, record) of every frame in range, sorted by timestamp
+            seg_ids, rec_ids, times = [], [], []
+            for i, seg in enumerate(segments):
+                ts = seg.records["timestamp"][:seg.count]
+                hits = np.flatnonzero((ts >= t_from) & (ts <= t_to))
+                seg_ids.append(np.full(len(hits), i, dtype=np.int32))
+                rec_ids.append(hits)
+                times.append(ts[hits])
+            if not segments:
+                return np.zeros(0, dtype=RECORD)
+            times = np.concatenate(times)
+            order = np.argsort(times, kind="stable")
+            seg_ids, rec_ids, times = np.concatenate(seg_ids)[order], np.concatenate(rec_ids)[order], times[order]
+
+            if step > 0 and len(times):
+                buckets = np.floor((times - t_from) / step).astype(np.int64)
+                starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+                ends = np.r_[starts[1:], len(times)]
+                keep = _thin(len(starts), limit)
+                starts, ends = starts[keep], ends[keep]
+                if agg == "max":
+                    return self._bucket_max(segments, seg_ids, rec_ids, starts, ends)
+                picks = starts
+            else:
+                picks = _thin(len(times), limit)
+            return _copy_rows(segments, seg_ids[picks], rec_ids[picks])
+        finally:
+            self._release(segments)
+
+    @staticmethod
+    def _bucket_max(segments, seg_ids, rec_ids, starts, ends):
+        """Per-pixel maximum over positions starts[i]:ends[i] of the sorted selection, one row per bucket."""
+        frames = _copy_rows(segments, seg_ids[starts], rec_ids[starts])  # timestamp, seq, etc. of the first frame
+        lengths = ends - starts
+        labels = np.repeat(np.arange(len(starts)), lengths)
+        positions = np.arange(len(labels)) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        for chunk in range(0, len(positions), QUERY_CHUNK):
+            picked = positions[chunk:chunk + QUERY_CHUNK]
+            rows = _copy_rows(segments, seg_ids[picked], rec_ids[picked])
+            label = labels[chunk:chunk + QUERY_CHUNK]
+            first = np.flatnonzero(np.r_[True, label[1:] != label[:-1]])
+            out = label[first]
+            frames["pixels"][out] = np.maximum(frames["pixels"][out], np.maximum.reduceat(rows["pixels"], first, axis=0))
+            frames["max"][out] = np.maximum(frames["max"][out], np.maximum.reduceat(rows["max"], first))
+            frames["min"][out] = np.minimum(frames["min"][out], np.minimum.reduceat(rows["min"], first))
+        return frames
+
+
+def _thin(count, limit):
+    """Indices of at most `limit` of `count` items, spread evenly so the range stays covered."""
+    if count > limit:
+        return np.linspace(0, count - 1, limit).astype(np.int64)
+    return np.arange(count)
+
+
+def _copy_rows(segments, seg_ids, rec_ids):
+    """RECORD array of segments[seg_ids[i]].records[rec_ids[i]], copied out of the mmaps."""
+    frames = np.empty(len(seg_ids), dtype=RECORD)
+    for i in np.unique(seg_ids):
+        mask = seg_ids == i
+        frames[mask] = segments[i].records[rec_ids[mask]]
+    return frames
@@ -0,0 +1,173 @@
+"""Finding the satellite on the network, fast.
+
+SatelliteLocator.connect() returns a connected downlink socket:
+
+  * the last address that worked gets a short head start, so reconnecting
+    after a link blip costs about one round trip
+  * otherwise every candidate (known IPs, the resolved hostname) is dialled
+    at once and the first successful connection wins; the others are closed
+  * the hostname is resolved on a background thread and cached with a TTL,
+    so a slow mDNS lookup never holds up the probes
+
+The winning socket is handed over as is (no probe-then-reconnect), and
+each attempt is timed and kept in `attempts` for /api/link.
+"""
+import collections
+import socket
+import threading
+import time
+
+PROBE_TIMEOUT = 1.0      # s per connection attempt
+DISCOVERY_TIMEOUT = 3.0  # s for a whole discovery round
+LAST_GOOD_HEAD_START = 0.25  # s the last-good address races alone
+DNS_TTL = 300            # s a resolved address is trusted
+DNS_NEGATIVE_TTL = 30    # s before retrying a hostname that did not resolve
+ATTEMPT_HISTORY = 32
+
+
+class _Race:
+    """Concurrent connection attempts; the first success wins."""
+
+    def __init__(self, locator):
+        self.locator = locator
+        self.cond = threading.Condition()
+        self.winner = None
+        self.pending = 0
+        self.started = set()
+
+    def start(self, address, source):
+        with self.cond:
+            if self.winner is not None or address in self.started:
+                return
+            self.started.add(address)
+            self.pending += 1
+        threading.Thread(target=self._probe, args=(address, source), daemon=True).start()
+
+    def hold(self):
+        """Keep the race open for a candidate that is still being looked up."""
+        with self.cond:
+            self.pending += 1
+
+    def release(self):
+        with self.cond:
+            self.pending -= 1
+            self.cond.notify_all()
+
+    def _probe(self, address, source):
+        t0 = time.perf_counter()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(self.locator.probe_timeout)
+        error = None
+        try:
+            sock.connect((address, self.locator.port))
+        except OSError as e:
+            error = str(e) or type(e).__name__
+            sock.close()
+            sock = None
+        self.locator._record(address, source, error, (time.perf_counter() - t0) * 1000.0)
+
+        with self.cond:
+            if sock is not None:
+                if self.winner is None:
+                    self.winner = (address, source, sock)
+                else:
+                    sock.close()  # lost the race
+            self.pending -= 1
+            self.cond.notify_all()
+
+    def wait(self, timeout):
+        """Block until someone connected, every attempt failed, or timeout. Returns the winner."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.winner is not None or self.pending == 0, timeout)
+            return self.winner
+
+    def abandon(self):
+        """Give up; a connection that still comes in late is closed."""
+        with self.cond:
+            if self.winner is None:
+                self.winner = (None, None, None)
+
+
+class SatelliteLocator:
+    def __init__(self, hostname, known_ips, port, probe_timeout=PROBE_TIMEOUT, timeout=DISCOVERY_TIMEOUT):
+        self.hostname = hostname
+        self.known_ips = list(known_ips)
+        self.port = port
+        self.probe_timeout = probe_timeout
+        self.timeout = timeout
+        self.last_good = None
+        self.last_connect_ms = None
+        self.attempts = collections.deque(maxlen=ATTEMPT_HISTORY)
+        self.lock = threading.Lock()
+        self.dns_address = None
+        self.dns_expires = 0.0
+        self.dns_busy = False
+
+    def _record(self, address, source, error, elapsed_ms):
+        with self.lock:
+            self.attempts.append({
+                "address": address, "source": source, "ok": error is None,
+                "ms": round(elapsed_ms, 2), "error": error, "time": time.time(),
+            })
+
+    def _resolve(self, race):
+        t0 = time.perf_counter()
+        address, error = None, None
+        try:
+            address = socket.gethostbyname(self.hostname)
+        except OSError as e:
+            error = str(e) or type(e).__name__
+        self._record(self.hostname, "dns", error, (time.perf_counter() - t0) * 1000.0)
+        with self.lock:
+            self.dns_address = address
+            self.dns_expires = time.monotonic() + (DNS_TTL if address else DNS_NEGATIVE_TTL)
+            self.dns_busy = False
+        if race is not None:
+            if address:
+                race.start(address, "dns")
+            race.release()
+
+    def _hostname_candidate(self, race):
+        """The cached address if still fresh; otherwise start a lookup that joins the race."""
+        with self.lock:
+            if time.monotonic() < self.dns_expires:
+                return self.dns_address
+            if self.dns_busy:
+                return self.dns_address  # a slow lookup from an earlier round is still running
+            self.dns_busy = True
+        race.hold()
+        threading.Thread(target=self._resolve, args=(race,), daemon=True).start()
+        return None
+
+    def connect(self):
+        """Connected socket to the satellite, or None if nothing answered in time."""
+        t0 = time.perf_counter()
+        race = _Race(self)
+        if self.last_good:
+            race.start(self.last_good, "last-good")
+            race.wait(LAST_GOOD_HEAD_START)
+        if race.winner is None:
+            for address in self.known_ips:
+                race.start(address, "known")
+            cached = self._hostname_candidate(race)
+            if cached:
+                race.start(cached, "dns-cache")
+            race.wait(max(0.0, self.timeout - (time.perf_counter() - t0)))
+        race.abandon()
+
+        address, source, sock = race.winner
+        if sock is None:
+            return None
+        self.last_good = address
+        self.last_connect_ms = round((time.perf_counter() - t0) * 1000.0, 2)
+        return sock
+
+    def summary(self):
+        with self.lock:
+            attempts = list(self.attempts)
+        return {
+            "last_good": self.last_good,
+            "last_connect_ms": self.last_connect_ms,
+            "dns_cached": self.dns_address,
+            "attempts": attempts[-8:],
+        }
@@ -1,24 +1,44 @@
-import socket
 import json
 import threading
 import time
 import logging
-import smtplib
 import struct
 import os
-from email.mime.text import MIMEText
-from flask import Flask, jsonify, render_template_string, request
+import sys
+import base64
+import argparse
+import numpy as np
+from flask import Flask, Response, g, jsonify, render_template, request
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Shared wire protocol lives in ../common
+sys.path.insert(0, os.path.join(BASE_DIR, ".."))
+from common import protocol, codec, detection, metrics
+import alerts
+import archive
+import heatmap
+import ingest
+import streaming
+import webcache
 
 # --- LOAD SECRETS ---
 SECRETS_FILE = "secrets.json"
 EMAIL_SENDER = None
+EMAIL_PASSWORD = None
 EMAIL_RECEIVERS = []
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 465
+WEBHOOK_URL = None
 
 try:
     with open(SECRETS_FILE) as f:
         secrets = json.load(f)
         EMAIL_SENDER = secrets.get("email_sender")
         EMAIL_PASSWORD = secrets.get("email_password")
+        SMTP_HOST = secrets.get("smtp_host", SMTP_HOST)
+        SMTP_PORT = int(secrets.get("smtp_port", SMTP_PORT))
+        WEBHOOK_URL = secrets.get("webhook_url")
         
         # Logic to handle single string OR list of emails
         raw_receivers = secrets.get("email_receiver")
@@ -39,304 +59,640 @@ SATELLITE_HOSTNAME = "flamesat.local"
 KNOWN_IPS = ["192.168.40.20", "10.54.254.151", "10.42.0.159"]
 SATELLITE_PORT = 5000
 WEB_PORT = 9876
-ALERT_COOLDOWN = 60 
+ARCHIVE_DIR = os.path.join(BASE_DIR, "archive")
+HISTORY_MAX_FRAMES = 2000
+ALERT_COOLDOWN = 60  # s; alerts raised within this of the last delivery go out as one digest
 
-# Frame Size: 768 pixels * 4 bytes (float) = 3072 bytes
-FRAME_SIZE = 3072 
+# Downlink encodings to request, best first (int16 + delta + zlib/LZ4 is ~5x smaller than float32).
+# ENC_STATS lets a satellite in event mode send stats packets between full frames;
+# ENC_RATE asks for a notice whenever it retimes its sensor; ENC_STORED for the
+# frames it recorded onboard while the link was down.
+PREFERRED_ENCODINGS = codec.PREFERRED_ENCODINGS + [protocol.ENC_STATS, protocol.ENC_RATE, protocol.ENC_STORED]
 
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
-latest_telemetry = {"status": "SEARCHING...", "max": 0, "data": [0] * 768}
-last_alert_time = 0 
+FIRE_THRESHOLD = 40.0  # °C; a hot region must also persist (see common/detection.py)
 
+# /api/telemetry representations: ?format= name -> (wire encoding, content type)
+# Binary bodies are a standard downlink frame (header + payload), see common/protocol.py
+JSON_MIME = "application/json"
+BINARY_FORMATS = {
+    "f32": (protocol.ENC_FLOAT32, "application/vnd.flamesat.f32"),
+    "i16": (protocol.ENC_INT16, "application/vnd.flamesat.i16"),
+}
+
+PRIMARY_ID = "flamesat"  # id of the satellite set by SATELLITE_HOSTNAME / --satellite
+
+links = {}               # satellite id -> GroundLink, see build_links()
+alert_dispatcher = None  # AlertDispatcher, see build_alert_dispatcher()
 app = Flask(__name__)
 
 # --- HELPERS ---
 
-def recvall(sock, n):
-    """Ensure we receive exactly n bytes before proceeding."""
-    data = bytearray()
-    while len(data) < n:
-        try:
-            packet = sock.recv(n - len(data))
-            if not packet:
-                return None
-            data.extend(packet)
-        except socket.timeout:
-            return None
-        except OSError:
-            return None
-    return data
-
-def send_email_thread(temp):
-    """Runs in background to send email to MULTIPLE recipients"""
-    if not EMAIL_SENDER or not EMAIL_RECEIVERS: return
-    
-    try:
-        # Create the comma-separated string for the header
-        receivers_str = ", ".join(EMAIL_RECEIVERS)
-        
-        msg = MIMEText(f"EMERGENCY ALERT\n\nFLAMESAT has detected a thermal anomaly.\nMax Temperature: {temp:.1f}°C\n\nView Telemetry: https://flamedata.nillsite.com")
-        msg['Subject'] = f"🔥 FLAMESAT ALERT: {temp:.1f}°C DETECTED"
-        msg['From'] = EMAIL_SENDER
-        msg['To'] = receivers_str
+class FrameSnapshot:
+    """One received frame plus its vectorized stats.
 
-        server = smtplib.SMTP_SSL('smtp.gmail.com', 465)
-        server.login(EMAIL_SENDER, EMAIL_PASSWORD)
-        
-        # send_message automatically handles the list of recipients in the header
-        server.send_message(msg)
-        server.quit()
-        
-        print(f"[WATCHDOG] ✅ Alert Email Sent to {len(EMAIL_RECEIVERS)} recipients.")
-    except Exception as e:
-        print(f"[WATCHDOG] ❌ Email Failed: {e}")
-
-def find_satellite():
-    """Scans for the satellite IP."""
-    try: 
-        return socket.gethostbyname(SATELLITE_HOSTNAME)
-    except: 
-        pass
-    
-    for ip in KNOWN_IPS:
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            s.settimeout(0.1)
-            result = s.connect_ex((ip, SATELLITE_PORT))
-            s.close()
-            if result == 0:
-                return ip
-        except: 
-            pass
-    return None
-
-def telemetry_receiver():
-    """Main loop that connects to Sat and processes binary data."""
-    global latest_telemetry, last_alert_time
-    
-    while True:
-        target_ip = find_satellite()
-        if not target_ip:
-            latest_telemetry["status"] = "OFFLINE - SCANNING..."
-            time.sleep(2)
-            continue
+    Built on the ingest event loop with NumPy only; the JSON-friendly dict with
+    768 formatted strings is produced lazily, once, the first time an API
+    client asks for it.
+    """
 
+    def __init__(self, header, pixels, link, detections=(), transform=None):
+        self.pixels = pixels
+        self.pixels.flags.writeable = False
+        self.seq = header.seq
+        self.timestamp = header.timestamp
+        self.received = time.time()
+        self.encoding = header.encoding
+        self.nbytes = header.length
+        self.dropped = link.dropped
+        self.corrupt = link.corrupt
+
+        self.max_temp = float(pixels.max())
+        self.min_temp = float(pixels.min())
+        self.mean_temp = float(pixels.mean())
+        self.hotspot = int(pixels.argmax())
+        self.detections = detections
+        self.transform = transform  # onboard ROI/binning/averaging, None for raw frames
+        self.status = "FIRE" if detection.confirmed(detections) else "NOMINAL"
+        self._dict = None
+        self._bodies = {}
+        self._lock = threading.RLock()
+
+    @property
+    def latency_ms(self):
+        return (self.received - self.timestamp) * 1000.0
+
+    def to_dict(self):
+        if self._dict is None:
+            self._dict = {
+                "data": [f"{x:.2f}" for x in self.pixels.tolist()],
+                "status": self.status,
+                "max": f"{self.max_temp:.1f}",
+                "min": f"{self.min_temp:.1f}",
+                "mean": f"{self.mean_temp:.2f}",
+                "hotspot": divmod(self.hotspot, protocol.SENSOR_COLS),
+                "seq": self.seq,
+                "timestamp": self.timestamp,
+                "latency_ms": round(self.latency_ms, 1),
+                "encoding": protocol.ENCODING_NAMES.get(self.encoding),
+                "bytes": self.nbytes,
+                "dropped": self.dropped,
+                "corrupt": self.corrupt,
+                "detections": [detection.to_dict(d) for d in self.detections],
+                "transform": self.transform._asdict() if self.transform else None
+            }
+        return self._dict
+
+    def etag(self, fmt):
+        return f"{self.seq}-{int(self.timestamp * 1000)}-{fmt}"
+
+    def body(self, fmt):
+        """Serialized representation, built once per frame and shared by all clients."""
+        cached = self._bodies.get(fmt)
+        if cached is not None:
+            return cached
+        with self._lock:
+            cached = self._bodies.get(fmt)
+            if cached is not None:
+                return cached
+            if fmt.startswith("sse-"):
+                # Server-sent event; binary formats travel base64 encoded
+                data = self.body(fmt[4:])
+                if fmt != "sse-json":
+                    data = base64.b64encode(data)
+                cached = b"id: %d\nevent: frame\ndata: %s\n\n" % (self.seq, data)
+            elif fmt == "json":
+                cached = json.dumps(self.to_dict(), separators=(',', ':')).encode()
+            else:
+                encoding = BINARY_FORMATS[fmt][0]
+                payload, flags = codec.FrameEncoder(encoding).encode(self.pixels)
+                cached = protocol.pack_frame(self.seq, self.timestamp, payload, encoding, flags)
+            self._bodies[fmt] = cached
+            return cached
+
+def build_alert_dispatcher():
+    """Alert sinks from secrets.json / command line: e-mail, webhook, or both (None if neither)."""
+    sinks = []
+    if EMAIL_SENDER and EMAIL_RECEIVERS:
+        sinks.append(alerts.SmtpSink(EMAIL_SENDER, EMAIL_RECEIVERS, EMAIL_PASSWORD, SMTP_HOST, SMTP_PORT))
+    if WEBHOOK_URL:
+        sinks.append(alerts.WebhookSink(WEBHOOK_URL))
+    if not sinks:
+        print("[WATCHDOG] No e-mail or webhook configured. Alerts disabled.")
+        return None
+    return alerts.AlertDispatcher(sinks, cooldown=ALERT_COOLDOWN)
+
+class GroundLink(ingest.SatelliteLink):
+    """One satellite: decodes and analyzes its frames and serves them to the web side."""
+
+    def __init__(self, sat_id, hostname, known_ips, port, archive_dir):
+        super().__init__(sat_id, hostname, known_ips, port, PREFERRED_ENCODINGS)
+        self.latest_frame = None  # FrameSnapshot; replaced (never mutated) on every full frame
+        self.last_stats = None    # latest event-mode stats packet; latest_frame stays current meanwhile
+        self.stats_packets = 0
+        self.sensor_rate = None   # latest ENC_RATE notice, as a dict
+        self.rate_packets = 0
+        # Frames recorded onboard during outages; they go to the archive only
+        self.backfill = {"received": 0, "duplicates": 0, "pending": 0, "from": None, "to": None}
+        self.stored_packets = 0
+        self.last_alert_time = 0  # when the watchdog last raised an alert
+        self.stream_hub = streaming.StreamHub()
+        self.archive = archive.FrameArchive(archive_dir)
+        self.on_connect()
+
+    def on_connect(self):
+        self.decoder = codec.FrameDecoder()
+        self.detector = detection.HotspotDetector(threshold=FIRE_THRESHOLD)
+        self.alerted_tracks = set()
+        self.last_stats, self.stats_packets = None, 0
+        self.rate_packets = 0
+        self.stored_packets = 0
+        # Backfill arrives in capture order, so it gets its own detector
+        self.backfill_decoder = codec.FrameDecoder()
+        self.backfill_detector = detection.HotspotDetector(threshold=FIRE_THRESHOLD)
+        self.backfill_alerted = set()
+
+    def on_status(self, status):
+        """Tell live viewers when the link goes up or down."""
+        snapshot = self.latest_frame
+        if status or snapshot is not None:
+            self.stream_hub.publish(status or snapshot.status)
+
+    def on_frame(self, header, payload):
+        # Event-mode stats packet: no pixels, the last full frame is still current
+        if header.encoding == protocol.ENC_STATS:
+            try:
+                stats, packed = protocol.unpack_stats(payload)
+            except protocol.ProtocolError as e:
+                self.log(f"⚠️ Packet Corrupt ({e}). Skipping...")
+                return
+            self.last_stats = {
+                "seq": header.seq, "timestamp": header.timestamp, "received": time.time(),
+                "max": round(stats.max, 2), "min": round(stats.min, 2), "mean": round(stats.mean, 2),
+                "reference_seq": stats.reference_seq, "changed": stats.changed,
+                "hotspots": len(detection.unpack_detections(packed)),
+            }
+            self.stats_packets += 1
+            return
+        if header.encoding == protocol.ENC_RATE:
+            try:
+                notice = protocol.unpack_rate(payload)
+            except protocol.ProtocolError as e:
+                self.log(f"⚠️ Packet Corrupt ({e}). Skipping...")
+                return
+            previous = self.sensor_rate
+            self.sensor_rate = {
+                "refresh_hz": notice.refresh_hz, "frame_rate": notice.frame_rate, "reason": notice.reason,
+                "change": round(notice.change, 2), "gradient": round(notice.gradient, 2), "since": header.timestamp,
+            }
+            self.rate_packets += 1
+            if previous is None or previous["refresh_hz"] != notice.refresh_hz:
+                self.log(f"Sensor refresh rate {notice.refresh_hz:g} Hz ({notice.frame_rate:g} frames/s, {notice.reason})")
+            return
+        if header.encoding == protocol.ENC_STORED:
+            self.on_stored(header, payload)
+            return
+
+        # 1. Decode Payload straight to a float32 array (vectorized)
+        transform = None
+        try:
+            if header.flags & protocol.FLAG_TRANSFORM:
+                # Cropped/binned/averaged onboard; the block says how
+                transform, payload = protocol.unpack_transform(payload)
+                pixels = self.decoder.decode(header, payload, (transform.rows, transform.cols))
+            else:
+                pixels = self.decoder.decode(header, payload)
+        except (codec.CodecError, protocol.ProtocolError) as e:
+            self.log(f"⚠️ Packet Corrupt ({e}). Skipping...")
+            return
+        if pixels is None:
+            return # Delta frame before first keyframe
+
+        # 2. Analyze Data (copy: float32 frames are views into the receive buffer)
+        if transform is not None:
+            pixels = codec.expand_transform(pixels, transform)
+        else:
+            pixels = np.array(pixels, dtype=np.float32)
+        snapshot = FrameSnapshot(header, pixels, self.reader, self.detector.update(pixels), transform)
+        max_temp = snapshot.max_temp
+        status = snapshot.status
+
+        # 3. Publish for the Web Server (a single reference swap)
+        previous = self.latest_frame
+        self.latest_frame = snapshot
+        if previous is None or previous.status != status:
+            self.stream_hub.publish(status)
+        self.stream_hub.publish(snapshot)
+        self.archive.append(header.timestamp, snapshot.received, header.seq, snapshot.pixels)
+
+        # 4. Watchdog: new hotspots alert at once, a lasting fire every ALERT_COOLDOWN.
+        # The dispatcher queues and coalesces; ingest never waits on SMTP.
+        if status == "FIRE" and alert_dispatcher is not None:
+            fires = detection.confirmed(snapshot.detections)
+            new = [d for d in fires if d.track_id not in self.alerted_tracks]
+            current_time = time.time()
+            if new or (current_time - self.last_alert_time) > ALERT_COOLDOWN:
+                self.last_alert_time = current_time
+                message = (f"new hotspot at ({new[0].row:.0f}, {new[0].col:.0f}), {new[0].area} px"
+                           if new else "fire persists")
+                if len(links) > 1:
+                    message = f"{self.sat_id}: {message}"
+                print(f"\n[WATCHDOG] ⚠️ Fire Detected ({max_temp:.1f}°C, {message}). Alerting...")
+                alert_dispatcher.raise_alert(alerts.Alert(header.timestamp, header.seq, max_temp, len(fires), message))
+            self.alerted_tracks = {d.track_id for d in fires}
+
+    def on_stored(self, header, payload):
+        """A frame recorded onboard while the link was down: archive it, alert on what it shows."""
         try:
-            client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            client_socket.settimeout(5) # 5 second timeout if stream hangs
-            client_socket.connect((target_ip, SATELLITE_PORT))
-            print(f"[GROUND] Connected to {target_ip}. Stream Active.")
-            
-            while True:
-                # 1. Receive Binary Frame using helper
-                raw_bytes = recvall(client_socket, FRAME_SIZE)
-                if not raw_bytes: 
-                    print("[GROUND] Stream ended.")
-                    break
-                
-                # 2. Unpack Binary to Float List (Heavy Compute happens here)
-                try:
-                    frame_data = struct.unpack('768f', raw_bytes)
-                except struct.error:
-                    print("[GROUND] ⚠️ Packet Corrupt (Size Mismatch). Retrying...")
-                    continue
-                
-                # 3. Analyze Data
-                max_temp = max(frame_data)
-                status = "FIRE" if max_temp > 40 else "NOMINAL"
-
-                # 4. Update Global State for Web Server
-                latest_telemetry = {
-                    "data": ["{:.2f}".format(x) for x in frame_data],
-                    "status": status,
-                    "max": f"{max_temp:.1f}"
-                }
-                
-                # 5. Watchdog Alert System
-                if status == "FIRE" and EMAIL_SENDER:
-                    current_time = time.time()
-                    if (current_time - last_alert_time) > ALERT_COOLDOWN:
-                        last_alert_time = current_time
-                        print(f"\n[WATCHDOG] ⚠️ Fire Detected ({max_temp:.1f}°C). Alerting...")
-                        threading.Thread(target=send_email_thread, args=(max_temp,)).start()
-
-        except Exception as e:
-            print(f"[GROUND] Link Error: {e}")
-        finally:
-            try: client_socket.close()
-            except: pass
-            time.sleep(1)
+            pending, payload = protocol.unpack_stored(payload)
+            pixels = self.backfill_decoder.decode(header._replace(encoding=protocol.ENC_INT16_DELTA_ZLIB), payload)
+        except (codec.CodecError, protocol.ProtocolError) as e:
+            self.log(f"⚠️ Packet Corrupt ({e}). Skipping...")
+            return
+        if pixels is None:
+            return
+        backfill = self.backfill
+        if not self.stored_packets:
+            self.log(f"Backfill: {pending + 1} frames recorded onboard while the link was down")
+        self.stored_packets += 1
+        backfill["pending"] = pending
+
+        # The satellite resends what it cannot be sure arrived
+        if self.archive.contains(header.timestamp, header.seq):
+            backfill["duplicates"] += 1
+        else:
+            self.archive.append(header.timestamp, time.time(), header.seq, pixels, archive.FLAG_STORED)
+            backfill["received"] += 1
+            backfill["from"] = min(backfill["from"] or header.timestamp, header.timestamp)
+            backfill["to"] = max(backfill["to"] or header.timestamp, header.timestamp)
+
+            # A fire during the outage still needs reporting, late as it is
+            fires = detection.confirmed(self.backfill_detector.update(pixels))
+            new = [d for d in fires if d.track_id not in self.backfill_alerted]
+            if new and alert_dispatcher is not None:
+                when = time.strftime("%H:%M:%S", time.localtime(header.timestamp))
+                message = f"hotspot at ({new[0].row:.0f}, {new[0].col:.0f}), {new[0].area} px, recorded onboard at {when}"
+                if len(links) > 1:
+                    message = f"{self.sat_id}: {message}"
+                max_temp = float(pixels.max())
+                print(f"\n[WATCHDOG] ⚠️ Fire in backfill ({max_temp:.1f}°C, {message}). Alerting...")
+                alert_dispatcher.raise_alert(alerts.Alert(header.timestamp, header.seq, max_temp, len(fires), message))
+            self.backfill_alerted = {d.track_id for d in fires}
+        if not pending:
+            self.log(f"Backfill complete ({backfill['received']} archived, {backfill['duplicates']} duplicates so far)")
+
+    def link_stats(self):
+        stats = super().link_stats()
+        stats.update(archive_written=self.archive.written, archive_dropped=self.archive.dropped,
+                     stream_viewers=len(self.stream_hub.clients), stats_packets=self.stats_packets)
+        if "frames" in stats:
+            stats["full_frames"] = stats["frames"] - self.stats_packets - self.rate_packets - self.stored_packets
+        if self.last_stats is not None:
+            stats["last_stats"] = self.last_stats
+        if self.sensor_rate is not None:
+            stats["sensor_rate"] = self.sensor_rate
+            stats["refresh_hz"] = self.sensor_rate["refresh_hz"]
+        stats["backfill"] = dict(self.backfill)
+        stats["backfill_received"], stats["backfill_pending"] = self.backfill["received"], self.backfill["pending"]
+        return stats
+
+def build_links(satellites, archive_dir):
+    """satellites: [(id, hostname, known_ips, port)]. A lone satellite archives to
+    archive_dir itself, a constellation to one subdirectory per satellite."""
+    return {
+        sat_id: GroundLink(sat_id, hostname, known_ips, port,
+                           archive_dir if len(satellites) == 1 else os.path.join(archive_dir, sat_id))
+        for sat_id, hostname, known_ips, port in satellites
+    }
+
+def parse_sat_arg(value):
+    """--sat ID=HOST[:PORT]"""
+    sat_id, sep, address = value.partition("=")
+    host, _, port = address.partition(":")
+    if not sep or not sat_id or not host or (port and not port.isdigit()):
+        raise argparse.ArgumentTypeError(f"expected ID=HOST[:PORT], got '{value}'")
+    return sat_id, host, [], int(port or SATELLITE_PORT)
+
+links = build_links([(PRIMARY_ID, SATELLITE_HOSTNAME, KNOWN_IPS, SATELLITE_PORT)], ARCHIVE_DIR)
+
+# --- METRICS ---
+# Hot paths (ingest, HTTP) update histograms directly; everything the links
+# and the alert dispatcher already count is read when /metrics is scraped.
+
+HTTP_REQUESTS = metrics.counter("flamesat_ground_http_requests_total", "API requests", ("route", "status"))
+HTTP_SECONDS = metrics.histogram("flamesat_ground_http_request_seconds",
+                                 "Time to build a response (streams: until headers)", ("route",))
+
+# /api/link key -> (metric name, type, help)
+LINK_METRICS = {
+    "connects": ("flamesat_ground_link_connects_total", "counter", "Downlink connections made"),
+    "frames": ("flamesat_ground_link_packets_total", "counter", "Valid packets on the current connection"),
+    "bytes_received": ("flamesat_ground_link_bytes_total", "counter", "Bytes received on the current connection"),
+    "corrupt": ("flamesat_ground_link_corrupt_total", "counter", "Packets that failed the checksum"),
+    "resyncs": ("flamesat_ground_link_resyncs_total", "counter", "Times the reader had to hunt for the magic"),
+    "dropped": ("flamesat_ground_link_dropped_total", "counter", "Sequence numbers missed (link loss or queue drops)"),
+    "stats_packets": ("flamesat_ground_link_stats_packets_total", "counter", "Event-mode stats packets"),
+    "refresh_hz": ("flamesat_ground_sensor_refresh_hz", "gauge", "Sensor refresh rate the satellite last reported"),
+    "backfill_received": ("flamesat_ground_backfill_frames_total", "counter", "Frames recorded onboard during outages and archived"),
+    "backfill_pending": ("flamesat_ground_backfill_pending_frames", "gauge", "Frames the satellite still has to backfill"),
+    "archive_written": ("flamesat_ground_archive_written_total", "counter", "Frames written to the archive"),
+    "archive_dropped": ("flamesat_ground_archive_dropped_total", "counter", "Frames the archive writer could not keep up with"),
+    "stream_viewers": ("flamesat_ground_stream_viewers", "gauge", "Connected SSE viewers"),
+}
+
+@metrics.collector
+def link_metrics():
+    families = {key: [] for key in LINK_METRICS}
+    up = []
+    for link in list(links.values()):
+        stats = link.link_stats()
+        labels = {"sat": link.sat_id}
+        up.append((labels, link.status is None))
+        for key, samples in families.items():
+            if key in stats:
+                samples.append((labels, stats[key]))
+    result = [("flamesat_ground_link_up", "gauge", "1 while frames are flowing", up)]
+    result += [(*LINK_METRICS[key], samples) for key, samples in families.items()]
+    return result
+
+@metrics.collector
+def alert_metrics():
+    if alert_dispatcher is None:
+        return []
+    summary = alert_dispatcher.summary()
+    sinks = summary["sinks"].items()
+    return [
+        ("flamesat_ground_alerts_raised_total", "counter", "Alerts raised by the watchdog", [({}, summary["raised"])]),
+        ("flamesat_ground_alerts_dropped_total", "counter", "Alerts lost to a full queue", [({}, summary["dropped"])]),
+        ("flamesat_ground_alerts_sent_total", "counter", "Alerts delivered, per sink",
+         [({"sink": name}, s["sent"]) for name, s in sinks]),
+        ("flamesat_ground_alert_sink_failures", "gauge", "Consecutive delivery failures, per sink",
+         [({"sink": name}, s["failures"]) for name, s in sinks]),
+    ]
 
 # --- FLASK WEB SERVER ---
+# Every /api/<x> route also exists as /api/sat/<id>/<x>; the unprefixed one
+# serves the first configured satellite, so single-satellite clients keep working.
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def count_request(response):
+    # The route pattern, not the path, so per-satellite URLs share one series
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_SECONDS.labels(route).observe(time.perf_counter() - g.request_start)
+    HTTP_REQUESTS.labels(route, str(response.status_code)).inc()
+    return response
+
+def find_link(sat_id):
+    if sat_id is None:
+        return next(iter(links.values()), None)
+    return links.get(sat_id)
+
+def unknown_satellite(sat_id):
+    return jsonify({"error": f"unknown satellite '{sat_id}'", "satellites": list(links)}), 404
+
+def telemetry_format():
+    """Pick the representation from ?format= or the Accept header (JSON by default)."""
+    fmt = request.args.get("format")
+    if fmt in BINARY_FORMATS or fmt == "json":
+        return fmt
+    offered = [JSON_MIME] + [mime for _, mime in BINARY_FORMATS.values()] + ["application/octet-stream"]
+    best = request.accept_mimetypes.best_match(offered, default=JSON_MIME)
+    if best == "application/octet-stream":
+        return "f32"
+    for name, (_, mime) in BINARY_FORMATS.items():
+        if best == mime:
+            return name
+    return "json"
 
 @app.route('/api/telemetry')
-def get_telemetry():
-    return jsonify(latest_telemetry)
+@app.route('/api/sat/<sat_id>/telemetry')
+def get_telemetry(sat_id=None):
+    """Latest frame as JSON or binary. Supports If-None-Match and ?since=<last seq seen>."""
+    link = find_link(sat_id)
+    if link is None:
+        return unknown_satellite(sat_id)
+    snapshot, link_status = link.latest_frame, link.status
+    if snapshot is None:
+        return jsonify({"status": link_status, "max": 0, "data": [0] * 768})
+
+    fmt = telemetry_format()
+    etag = snapshot.etag(fmt) + ("-offline" if link_status else "")
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache", "Vary": "Accept"}
+
+    since = request.args.get("since", type=int)
+    if (since == snapshot.seq and not link_status) or request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    if fmt == "json":
+        if link_status:
+            return jsonify(dict(snapshot.to_dict(), status=link_status)), headers
+        return Response(snapshot.body("json"), mimetype=JSON_MIME, headers=headers)
+
+    headers["X-Flamesat-Status"] = link_status or snapshot.status
+    headers["X-Flamesat-Max"] = f"{snapshot.max_temp:.1f}"
+    return Response(snapshot.body(fmt), mimetype=BINARY_FORMATS[fmt][1], headers=headers)
+
+png_cache = heatmap.RenderCache()
+
+@app.route('/api/frame.png')
+@app.route('/api/sat/<sat_id>/frame.png')
+def get_frame_png(sat_id=None):
+    """Latest frame as a heatmap image: ?scale=1..32 (default 10 = 320x240), &cmap=flame|inferno|gray."""
+    scale = request.args.get("scale", default=heatmap.DEFAULT_SCALE, type=int)
+    cmap = request.args.get("cmap", heatmap.DEFAULT_CMAP)
+    if not 1 <= scale <= heatmap.MAX_SCALE or cmap not in heatmap.COLORMAPS:
+        return jsonify({"error": "invalid scale or cmap", "max_scale": heatmap.MAX_SCALE,
+                        "cmaps": list(heatmap.COLORMAPS)}), 400
+    link = find_link(sat_id)
+    if link is None:
+        return unknown_satellite(sat_id)
+    snapshot, link_status = link.latest_frame, link.status
+    if snapshot is None:
+        return jsonify({"error": "no frame received yet", "status": link_status}), 503
+
+    etag = snapshot.etag(f"png-{scale}-{cmap}")
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache",
+               "X-Flamesat-Status": link_status or snapshot.status, "X-Flamesat-Max": f"{snapshot.max_temp:.1f}"}
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers=headers)
+
+    # One render per frame and parameter set, however many clients ask at once
+    key = (link.sat_id, snapshot.seq, snapshot.timestamp, scale, cmap)
+    body = png_cache.get(key, lambda: heatmap.render_png(snapshot.pixels, scale, cmap, top=snapshot.max_temp))
+    return Response(body, mimetype="image/png", headers=headers)
+
+def sse_event(item, fmt):
+    if isinstance(item, FrameSnapshot):
+        return item.body("sse-" + fmt)
+    return b"event: status\ndata: %s\n\n" % json.dumps({"status": item}).encode()
+
+@app.route('/api/stream')
+@app.route('/api/sat/<sat_id>/stream')
+def stream_telemetry(sat_id=None):
+    """Server-sent events: every new frame, once, as JSON or base64 ?format=f32|i16."""
+    link = find_link(sat_id)
+    if link is None:
+        return unknown_satellite(sat_id)
+    stream_hub = link.stream_hub
+    fmt = request.args.get("format", "json")
+    if fmt != "json" and fmt not in BINARY_FORMATS:
+        return jsonify({"error": f"unknown format '{fmt}'"}), 400
+
+    client = stream_hub.subscribe()
+    if client is None:
+        return jsonify({"error": "too many live viewers, poll /api/telemetry instead"}), 503
+    snapshot, link_status = link.latest_frame, link.status
+    if link_status or snapshot is not None:
+        client.offer(link_status or snapshot.status)
+    if snapshot is not None:
+        client.offer(snapshot)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    events = stream_hub.events(client, lambda item: sse_event(item, fmt))
+    return Response(events, mimetype="text/event-stream", headers=headers)
+
+@app.route('/api/link')
+@app.route('/api/sat/<sat_id>/link')
+def get_link(sat_id=None):
+    """Downlink health counters for the current connection."""
+    link = find_link(sat_id)
+    if link is None:
+        return unknown_satellite(sat_id)
+    stats = link.link_stats()
+    if alert_dispatcher is not None:
+        stats["alerts"] = alert_dispatcher.summary()
+    return jsonify(stats)
+
+@app.route('/api/sats')
+def get_satellites():
+    """Every configured satellite with its link state and latest frame stats."""
+    result = []
+    for link in links.values():
+        snapshot = link.latest_frame
+        item = {"id": link.sat_id, "status": link.status or "LIVE", "connects": link.connects,
+                "address": link.locator.last_good}
+        if snapshot is not None:
+            item.update(fire=snapshot.status == "FIRE", seq=snapshot.seq, timestamp=snapshot.timestamp,
+                        max=round(snapshot.max_temp, 2), latency_ms=round(snapshot.latency_ms, 1))
+        if link.sensor_rate is not None:
+            item["refresh_hz"] = link.sensor_rate["refresh_hz"]
+        result.append(item)
+    return jsonify({"count": len(result), "satellites": result})
+
+@app.route('/api/history')
+@app.route('/api/sat/<sat_id>/history')
+def get_history(sat_id=None):
+    """Archived frames: ?from=&to= (epoch seconds), &step= (s), &agg=first|max, &format=json|i16, &fields=stats|full."""
+    now = time.time()
+    t_to = request.args.get("to", default=now, type=float)
+    t_from = request.args.get("from", default=t_to - 3600, type=float)
+    step = request.args.get("step", default=0.0, type=float)
+    agg = request.args.get("agg", "first")
+    limit = min(request.args.get("limit", default=HISTORY_MAX_FRAMES, type=int), HISTORY_MAX_FRAMES)
+    if t_from > t_to or step < 0 or agg not in ("first", "max") or limit < 1:
+        return jsonify({"error": "invalid range, step or agg"}), 400
+    link = find_link(sat_id)
+    if link is None:
+        return unknown_satellite(sat_id)
+
+    frames = link.archive.query(t_from, t_to, step=step, agg=agg, limit=limit)
+
+    if request.args.get("format") == "i16":
+        # Concatenated downlink frames; read them back with common.protocol.FrameReader
+        body = b"".join(
+            protocol.pack_frame(int(f["seq"]), float(f["timestamp"]), f["pixels"].tobytes(),
+                                protocol.ENC_INT16, protocol.FLAG_KEYFRAME)
+            for f in frames)
+        return Response(body, mimetype=BINARY_FORMATS["i16"][1])
+
+    full = request.args.get("fields", "full") == "full"
+    result = []
+    for f in frames:
+        item = {
+            "seq": int(f["seq"]),
+            "timestamp": float(f["timestamp"]),
+            "max": round(float(f["max"]), 2),
+            "min": round(float(f["min"]), 2),
+            "stored": bool(f["flags"] & archive.FLAG_STORED),
+        }
+        if full:
+            item["data"] = (f["pixels"] / 100.0).round(2).tolist()
+        result.append(item)
+    return jsonify({"from": t_from, "to": t_to, "step": step, "agg": agg, "count": len(result), "frames": result})
+
+@app.route('/api/history/segments')
+@app.route('/api/sat/<sat_id>/history/segments')
+def get_history_segments(sat_id=None):
+    link = find_link(sat_id)
+    if link is None:
+        return unknown_satellite(sat_id)
+    return jsonify(link.archive.summary())
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus text exposition of ingest, link, alert and API metrics."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+def render_dashboard(host_url):
+    return render_template(
+        "dashboard.html",
+        host_url=host_url,
+        css_url=assets.url("dashboard.css"),
+        js_url=assets.url("dashboard.js"),
+    )
+
+assets = webcache.AssetStore(os.path.join(BASE_DIR, "static"))
+pages = webcache.PageCache(render_dashboard)
+
+@app.route('/assets/<name>')
+def dashboard_asset(name):
+    asset = assets.get(name)
+    if asset is None:
+        return jsonify({"error": "not found"}), 404
+    return asset.respond(request, immutable="v" in request.args)
 
 @app.route('/')
 def dashboard():
+    # Rendered and compressed once per host; only the API link differs
     host_url = request.host_url.rstrip('/')
-    
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>FLAMESAT CMD</title>
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <link href="https://fonts.googleapis.com/css2?family=Share+Tech+Mono&display=swap" rel="stylesheet">
-        <style>
-            :root {{ --primary: #0f0; --alert: #f00; --bg: #050505; --panel: #111; }}
-            body {{ 
-                font-family: 'Share Tech Mono', monospace; 
-                background-color: var(--bg); 
-                color: var(--primary); 
-                margin: 0; padding: 20px;
-                display: flex; flex-direction: column; align-items: center;
-            }}
-            
-            /* CRT Scanline Effect */
-            body::before {{
-                content: " ";
-                display: block;
-                position: absolute; top: 0; left: 0; bottom: 0; right: 0;
-                background: linear-gradient(rgba(18, 16, 16, 0) 50%, rgba(0, 0, 0, 0.25) 50%), linear-gradient(90deg, rgba(255, 0, 0, 0.06), rgba(0, 255, 0, 0.02), rgba(0, 0, 255, 0.06));
-                z-index: 2; background-size: 100% 2px, 3px 100%; pointer-events: none;
-            }}
-
-            .container {{
-                width: 100%; max-width: 800px;
-                border: 1px solid #333; padding: 20px;
-                box-shadow: 0 0 20px rgba(0, 255, 0, 0.1);
-                background: var(--panel); z-index: 1;
-            }}
-
-            header {{ display: flex; justify-content: space-between; border-bottom: 1px solid #333; padding-bottom: 10px; margin-bottom: 20px; }}
-            h1 {{ margin: 0; font-size: 24px; letter-spacing: 2px; }}
-            
-            .status-box {{ font-size: 18px; }}
-            .nominal {{ color: var(--primary); }}
-            .fire {{ color: var(--alert); animation: blink 0.5s infinite; text-shadow: 0 0 10px red; }}
-            @keyframes blink {{ 50% {{ opacity: 0; }} }}
-
-            .telemetry-grid {{ display: grid; grid-template-columns: 1fr 1fr; gap: 20px; margin-bottom: 20px; }}
-            .metric {{ background: #000; padding: 10px; border: 1px solid #333; text-align: center; }}
-            .metric-label {{ font-size: 12px; color: #666; display: block; margin-bottom: 5px; }}
-            .metric-value {{ font-size: 32px; }}
-
-            /* Heatmap Container */
-            #heatmap-container {{ 
-                position: relative; 
-                width: 100%; 
-                aspect-ratio: 4/3; 
-                background: #000; 
-                border: 1px solid #333; 
-            }}
-            #heatmap {{ 
-                display: grid; 
-                grid-template-columns: repeat(32, 1fr); 
-                width: 100%; height: 100%; 
-            }}
-            .pixel {{ width: 100%; height: 100%; }}
-
-            /* API Terminal */
-            .terminal {{ 
-                margin-top: 30px; text-align: left; 
-                border: 1px solid #444; background: #000; padding: 10px; 
-            }}
-            .terminal-header {{ color: #666; font-size: 12px; border-bottom: 1px solid #333; padding-bottom: 5px; margin-bottom: 10px; }}
-            code {{ color: #aaa; display: block; word-break: break-all; }}
-            .cmd-prompt {{ color: #0f0; margin-right: 10px; }} user@ground:~$
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <header>
-                <h1>FLAMESAT_01</h1>
-                <div id="clock">--:--:-- UTC</div>
-            </header>
-
-            <div class="telemetry-grid">
-                <div class="metric">
-                    <span class="metric-label">SYSTEM STATUS</span>
-                    <div id="status" class="nominal">WAITING</div>
-                </div>
-                <div class="metric">
-                    <span class="metric-label">MAX TEMP</span>
-                    <div id="max_temp" class="metric-value">0.0°C</div>
-                </div>
-            </div>
-
-            <div id="heatmap-container">
-                <div id="heatmap"></div>
-            </div>
-
-            <div class="terminal">
-                <div class="terminal-header">/// API ACCESS LINK ///</div>
-                <code><span class="cmd-prompt">user@ground:~$</span> curl -s {host_url}/api/telemetry | jq</code>
-            </div>
-        </div>
-
-        <script>
-            // Clock
-            setInterval(() => {{
-                document.getElementById('clock').innerText = new Date().toISOString().split('T')[1].split('.')[0] + ' UTC';
-            }}, 1000);
-
-            // Init Grid
-            const grid = document.getElementById('heatmap');
-            for(let i=0; i<768; i++) {{
-                let div = document.createElement('div');
-                div.className = 'pixel';
-                div.id = 'p'+i;
-                grid.appendChild(div);
-            }}
-
-            function update() {{
-                fetch('/api/telemetry')
-                .then(r => r.json())
-                .then(data => {{
-                    const stat = document.getElementById('status');
-                    stat.innerText = data.status;
-                    
-                    if(data.status.includes("FIRE")) {{
-                        stat.className = "fire";
-                        document.documentElement.style.setProperty('--primary', '#f00');
-                    }} else {{
-                        stat.className = "nominal";
-                        document.documentElement.style.setProperty('--primary', '#0f0');
-                    }}
-                    
-                    document.getElementById('max_temp').innerText = data.max + "°C";
-
-                    const pixels = data.data;
-                    const max = parseFloat(data.max) || 40;
-                    const min = 20; 
-                    
-                    for(let i=0; i<768; i++) {{
-                        let val = parseFloat(pixels[i]);
-                        let intensity = (val - min) / (max - min);
-                        intensity = Math.max(0, Math.min(1, intensity));
-                        
-                        // Smooth Interpolation (Black -> Blue -> Purple -> Red -> Yellow)
-                        let r = Math.floor(intensity * 255);
-                        let g = intensity > 0.8 ? Math.floor((intensity-0.8)*5 * 255) : 0;
-                        let b = Math.floor((1-intensity) * 100);
-                        
-                        document.getElementById('p'+i).style.backgroundColor = `rgb(${{r}}, ${{g}}, ${{b}})`;
-                    }}
-                }});
-            }}
-            setInterval(update, 500);
-        </script>
-    </body>
-    </html>
-    """
-    return render_template_string(html)
+    return pages.get(host_url).respond(request)
 
 if __name__ == '__main__':
-    t = threading.Thread(target=telemetry_receiver)
-    t.daemon = True
-    t.start()
-    app.run(host='0.0.0.0', port=WEB_PORT)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="FLAMESAT ground station")
+    parser.add_argument("--satellite", metavar="HOST", help="satellite address (skips the KNOWN_IPS scan)")
+    parser.add_argument("--satellite-port", type=int, default=SATELLITE_PORT)
+    parser.add_argument("--sat", type=parse_sat_arg, action="append", default=[], metavar="ID=HOST[:PORT]",
+                        help="add a satellite to the constellation (repeatable); served at /api/sat/<ID>/...")
+    parser.add_argument("--web-port", type=int, default=WEB_PORT)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--smtp-host", default=SMTP_HOST, help="alert mail server (e.g. a local fake, see alerts.py)")
+    parser.add_argument("--smtp-port", type=int, default=SMTP_PORT, help="465 = SSL, others use STARTTLS if offered")
+    parser.add_argument("--webhook", default=WEBHOOK_URL, metavar="URL", help="also POST alerts as JSON here")
+    args = parser.parse_args()
+    if args.satellite:
+        SATELLITE_HOSTNAME, KNOWN_IPS = args.satellite, []
+    SATELLITE_PORT, WEB_PORT = args.satellite_port, args.web_port
+    SMTP_HOST, SMTP_PORT, WEBHOOK_URL = args.smtp_host, args.smtp_port, args.webhook
+
+    # The default satellite, unless only --sat entries were given
+    satellites = list(args.sat)
+    if args.satellite or not satellites:
+        satellites.insert(0, (PRIMARY_ID, SATELLITE_HOSTNAME, KNOWN_IPS, SATELLITE_PORT))
+    ids = [sat[0] for sat in satellites]
+    if len(set(ids)) != len(ids):
+        parser.error(f"duplicate satellite ids: {', '.join(ids)}")
+    links = build_links(satellites, args.archive_dir)
+    alert_dispatcher = build_alert_dispatcher()
+
+    for link in links.values():
+        link.archive.start()
+    if alert_dispatcher is not None:
+        alert_dispatcher.start()
+    ingest.IngestCore(list(links.values())).start()
+    app.run(host='0.0.0.0', port=WEB_PORT)
@@ -0,0 +1,152 @@
+"""Server-rendered heatmap PNGs for clients that cannot run the dashboard.
+
+/api/frame.png renders the latest frame the way the dashboard draws it:
+temperatures from MIN_TEMP up to the frame maximum go through a 256-entry
+colormap, and the image is upscaled with bilinear interpolation.
+Everything is vectorized:
+
+  - The frame is normalized to colormap positions once, on its 768 pixels.
+  - Upscaling interpolates those positions with precomputed per-scale
+    index and weight arrays (two gathers and a blend per axis).
+  - The colormap LUT becomes the PNG palette, so the image is one byte per
+    pixel and never expanded to RGB.
+
+Rendered images go into an LRU cache keyed by frame and parameters. A
+burst of requests for the same frame costs one render; the other requests
+wait for that render instead of repeating it.
+"""
+import collections
+import functools
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+from common import metrics, protocol
+
+MIN_TEMP = 20.0        # °C at the bottom of the colormap, as on the dashboard
+DEFAULT_TOP = 40.0     # °C at the top when the frame has no maximum yet
+DEFAULT_SCALE = 10     # 320x240
+MAX_SCALE = 32         # 1024x768
+DEFAULT_CMAP = "flame"
+PNG_CACHE_ENTRIES = 64
+PNG_COMPRESSION = 6
+
+PNG_RENDERS = metrics.counter("flamesat_ground_png_renders_total", "Heatmap PNGs rendered")
+PNG_CACHE_HITS = metrics.counter("flamesat_ground_png_cache_hits_total",
+                                 "Heatmap PNG requests served from the cache (or a render already running)")
+
+
+def _flame():
+    """The dashboard's colormap (black -> blue -> purple -> red -> yellow), see static/dashboard.js."""
+    intensity = np.arange(256) / 255.0
+    lut = np.empty((256, 3), dtype=np.uint8)
+    lut[:, 0] = np.floor(intensity * 255)
+    lut[:, 1] = np.where(intensity > 0.8, np.floor((intensity - 0.8) * 5 * 255), 0)
+    lut[:, 2] = np.floor((1 - intensity) * 100)
+    return lut
+
+
+def _gradient(*anchors):
+    """256-entry LUT through evenly spaced RGB anchors."""
+    anchors = np.array(anchors, dtype=np.float64)
+    stops = np.linspace(0, 255, len(anchors))
+    return np.stack([np.interp(np.arange(256), stops, anchors[:, c]) for c in range(3)], axis=1).round().astype(np.uint8)
+
+
+COLORMAPS = {
+    "flame": _flame(),
+    # matplotlib's inferno (rx_ground.py), through eight of its colours
+    "inferno": _gradient((0, 0, 4), (40, 11, 84), (101, 21, 110), (159, 42, 99),
+                         (212, 72, 66), (245, 125, 21), (250, 193, 39), (252, 255, 164)),
+    "gray": _gradient((0, 0, 0), (255, 255, 255)),
+}
+
+
+@functools.lru_cache(maxsize=MAX_SCALE)
+def _axis(size, scale):
+    """Source indices and weights for `size` pixels upscaled `scale` times, sampling at pixel centres."""
+    src = np.clip((np.arange(size * scale) + 0.5) / scale - 0.5, 0, size - 1)
+    low = src.astype(np.intp)
+    high = np.minimum(low + 1, size - 1)
+    return low, high, (src - low).astype(np.float32)
+
+
+def upscale(grid, scale):
+    """Bilinear upscaling of a 2-D float32 array by an integer factor."""
+    if scale == 1:
+        return grid
+    rows, cols = grid.shape
+    y0, y1, wy = _axis(rows, scale)
+    x0, x1, wx = _axis(cols, scale)
+    wy = wy[:, None]
+    tall = grid[y0] * (1 - wy) + grid[y1] * wy
+    return tall[:, x0] * (1 - wx) + tall[:, x1] * wx
+
+
+def _chunk(kind, data):
+    return struct.pack("!I", len(data)) + kind + data + struct.pack("!I", zlib.crc32(data, zlib.crc32(kind)))
+
+
+def encode_png(indices, palette):
+    """8-bit palette PNG from a 2-D uint8 array of palette indices."""
+    height, width = indices.shape
+    rows = np.zeros((height, width + 1), dtype=np.uint8)  # filter byte 0 (none) per row
+    rows[:, 1:] = indices
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        _chunk(b"IHDR", struct.pack("!IIBBBBB", width, height, 8, 3, 0, 0, 0)),
+        _chunk(b"PLTE", palette.tobytes()),
+        _chunk(b"IDAT", zlib.compress(rows.tobytes(), PNG_COMPRESSION)),
+        _chunk(b"IEND", b""),
+    ))
+
+
+def render_png(pixels, scale=DEFAULT_SCALE, cmap=DEFAULT_CMAP, top=None):
+    """PNG of one frame (768 temperatures), MIN_TEMP..top mapped through `cmap`."""
+    pixels = np.asarray(pixels, dtype=np.float32)
+    if top is None:
+        top = float(pixels.max())
+    span = 255.0 / max(0.01, (top or DEFAULT_TOP) - MIN_TEMP)
+    # Normalize before upscaling: 768 pixels instead of 768 * scale²
+    position = ((pixels - MIN_TEMP) * span).reshape(protocol.SENSOR_ROWS, protocol.SENSOR_COLS)
+    position = upscale(np.clip(position, 0, 255), scale)
+    PNG_RENDERS.inc()
+    return encode_png(position.astype(np.uint8), COLORMAPS[cmap])
+
+
+class RenderCache:
+    """LRU of rendered images. Concurrent misses for one key share a single render."""
+
+    def __init__(self, max_entries=PNG_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.pending = {}  # key -> Event set when its render finishes
+        self.lock = threading.Lock()
+
+    def get(self, key, render):
+        """The cached value for `key`, calling render() to build it if needed."""
+        while True:
+            with self.lock:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    PNG_CACHE_HITS.inc()
+                    return self.entries[key]
+                done = self.pending.get(key)
+                if done is None:
+                    done = self.pending[key] = threading.Event()
+                    break
+            # Someone else is rendering it; if that render fails, try ourselves
+            done.wait()
+        try:
+            value = render()
+            with self.lock:
+                self.entries[key] = value
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            return value
+        finally:
+            with self.lock:
+                del self.pending[key]
+            done.set()
@@ -0,0 +1,138 @@
+"""asyncio ingest core: one ground process, many satellites.
+
+Every SatelliteLink is a coroutine on a single event loop (running on its
+own thread next to the web server). A link finds its satellite (discovery
+runs in a thread pool, see discovery.py), sends the HELLO, then awaits
+frames with protocol.AsyncFrameReader and hands each one to
+on_frame(). Reconnect back-off, status and counters are kept per link,
+so dozens of payloads cost one thread instead of one process each.
+
+Subclasses decide what a frame means (ground_server.GroundLink decodes,
+analyzes and publishes it); on_frame() runs on the event loop and must
+not block.
+"""
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+from common import metrics, protocol
+import discovery
+
+RECEIVE_TIMEOUT = 5.0       # s without a packet before the link counts as hung
+RECONNECT_DELAY_MAX = 2.0   # s; back-off between reconnects that deliver nothing
+OFFLINE_RETRY = 2.0         # s between discovery rounds while nothing answers
+DISCOVERY_WORKERS = 64
+
+CONNECT_SECONDS = metrics.histogram("flamesat_ground_connect_seconds", "Discovery + TCP connect time per link (re)connect")
+FRAME_SECONDS = metrics.histogram("flamesat_ground_frame_process_seconds",
+                                  "Decode, analysis and publish time per received packet", ("sat",))
+FRAME_AGE_SECONDS = metrics.histogram("flamesat_ground_frame_age_seconds",
+                                      "Capture-to-receive latency (includes clock offset)", ("sat",))
+
+
+class SatelliteLink:
+    """Connection, reconnect logic and link counters for one satellite."""
+
+    def __init__(self, sat_id, hostname, known_ips, port, encodings):
+        self.sat_id = sat_id
+        self.locator = discovery.SatelliteLocator(hostname, known_ips, port)
+        self.encodings = encodings
+        self.status = "SEARCHING..."  # None while frames are flowing
+        self.reader = None            # AsyncFrameReader of the current connection
+        self.connects = 0
+        self.connected_since = None
+        self.last_packet = None
+        self.frame_seconds = FRAME_SECONDS.labels(sat_id)
+        self.frame_age = FRAME_AGE_SECONDS.labels(sat_id)
+
+    # --- hooks ---
+
+    def on_connect(self):
+        """A new connection is up; reset per-connection decoding state."""
+
+    def on_frame(self, header, payload):
+        """One valid frame; `payload` is only valid until this returns."""
+
+    def on_status(self, status):
+        """Link status changed (None means live)."""
+
+    # --- connection loop ---
+
+    def set_status(self, status):
+        if status != self.status:
+            self.status = status
+            self.on_status(status)
+
+    def log(self, message):
+        print(f"[GROUND:{self.sat_id}] {message}")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        retry_delay = 0.0
+        while True:
+            # Races all candidate addresses; the last good one usually answers in one RTT
+            sock = await loop.run_in_executor(None, self.locator.connect)
+            if sock is None:
+                self.set_status("OFFLINE - SCANNING...")
+                await asyncio.sleep(OFFLINE_RETRY)
+                continue
+
+            reader = None
+            try:
+                sock.setblocking(False)
+                await loop.sock_sendall(sock, protocol.pack_hello(self.encodings))
+                self.log(f"Connected to {self.locator.last_good} in {self.locator.last_connect_ms} ms. Stream Active.")
+                CONNECT_SECONDS.observe(self.locator.last_connect_ms / 1000.0)
+                reader = self.reader = protocol.AsyncFrameReader(sock)
+                self.connects += 1
+                self.connected_since = time.time()
+                self.on_connect()
+                self.set_status(None)
+
+                while True:
+                    frame = await asyncio.wait_for(reader.read_frame(), RECEIVE_TIMEOUT)
+                    if frame is None:
+                        self.log("Stream ended.")
+                        break
+                    self.last_packet = time.time()
+                    if frame[0].encoding != protocol.ENC_STORED:  # backfill is old on purpose
+                        self.frame_age.observe(self.last_packet - frame[0].timestamp)
+                    with self.frame_seconds.time():
+                        self.on_frame(*frame)
+            except asyncio.TimeoutError:
+                self.log(f"No data for {RECEIVE_TIMEOUT:.0f}s, reconnecting.")
+            except Exception as e:
+                self.log(f"Link Error: {e}")
+            finally:
+                sock.close()
+                self.connected_since = None
+                # Reconnect at once after a working session; back off if the link keeps failing
+                retry_delay = 0.0 if reader is not None and reader.frames else min(RECONNECT_DELAY_MAX, retry_delay * 2 or 0.25)
+                await asyncio.sleep(retry_delay)
+
+    def link_stats(self):
+        stats = {"id": self.sat_id, "status": self.status or "LIVE", "connects": self.connects,
+                 "connected_since": self.connected_since, "last_packet": self.last_packet,
+                 "discovery": self.locator.summary()}
+        reader = self.reader
+        if reader is not None:
+            stats.update(frames=reader.frames, bytes_received=reader.bytes_received,
+                         corrupt=reader.corrupt, resyncs=reader.resyncs, dropped=reader.dropped)
+        return stats
+
+
+class IngestCore:
+    """Runs every link on one asyncio event loop in a background thread."""
+
+    def __init__(self, links):
+        self.links = {link.sat_id: link for link in links}
+        self.loop = None
+
+    def start(self):
+        threading.Thread(target=asyncio.run, args=(self._main(),), daemon=True).start()
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(DISCOVERY_WORKERS))
+        await asyncio.gather(*(link.run() for link in self.links.values()))
@@ -5,9 +5,12 @@ import os
 import time
 import threading
 import queue 
-import socket
+import sys
 import json
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import command
+
 # --- CONFIGURATION ---
 THEME = {
     "bg": "#050505",
@@ -39,6 +42,8 @@ class MissionControlApp:
         self.root.geometry("700x800") 
         self.root.configure(bg=THEME["bg"])
         self.log_queue = queue.Queue()
+        self.session = None  # command.CommandSession, shared by all commands
+        self.session_lock = threading.Lock()
 
         # Load Password
         self.auth_token = None
@@ -92,6 +97,15 @@ class MissionControlApp:
         tk.Button(self.quick_frame, text="REBOOT SAT", command=lambda: self.send_command("sudo reboot"), 
                   bg="#444", fg="white", font=("DejaVu Sans Mono", 9), relief="flat").pack(side="left", padx=5)
 
+        # Onboard processing: trade resolution for bandwidth and noise (see satellite/processing.py),
+        # and the adaptive sensor refresh rate (satellite/rate_policy.py)
+        self.proc_frame = tk.Frame(root, bg=THEME["bg"])
+        self.proc_frame.pack()
+        for label, cmd in (("FULL RES", "proc off"), ("2x2 BIN", "proc bin 2"), ("AVG x4", "proc avg 4"), ("PROC?", "proc"),
+                           ("RATE AUTO", "rate auto"), ("RATE?", "rate")):
+            tk.Button(self.proc_frame, text=label, command=lambda c=cmd: self.send_command(c),
+                      bg=THEME["btn_cmd"], fg="white", font=("DejaVu Sans Mono", 9), relief="flat").pack(side="left", padx=5)
+
         self.console_frame = tk.Frame(root, bg=THEME["panel"], padx=2, pady=2)
         self.console_frame.pack(fill="both", expand=True, padx=20, pady=20)
         self.console = tk.Text(self.console_frame, bg="black", fg="#0f0", font=THEME["font_console"], height=10, state="disabled", bd=0)
@@ -130,25 +144,35 @@ class MissionControlApp:
             return
 
         self.log(f"root@ground:~# {cmd_code}")
-        
+
         def run():
+            # Commands run concurrently over one session; output streams in line by line
+            pending = {"stdout": "", "stderr": ""}
+            output = []
+            def on_output(stream, text):
+                output.append(stream)
+                *lines, pending[stream] = (pending[stream] + text).split("\n")
+                for line in lines:
+                    self.log(line)
             try:
-                s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                s.settimeout(10)
-                s.connect((SAT_HOST, CMD_PORT))
-                
-                # AUTHENTICATION: Prepend the password
-                secure_payload = f"{self.auth_token}|{cmd_code}"
-                s.sendall(secure_payload.encode())
-                
-                response = s.recv(4096).decode().strip()
-                if response: self.log(response)
-                else: self.log("[No Output]")
-                s.close()
-            except Exception as e:
+                code = self.command_session().run(cmd_code, on_output)
+            except (OSError, command.CommandError) as e:
                 self.log(f"!!! UPLINK FAILED: {e}")
+                return
+            for rest in pending.values():
+                if rest: self.log(rest)
+            if not output: self.log("[No Output]")
+            if code:
+                self.log(f"[exit {code}]")
         threading.Thread(target=run, daemon=True).start()
 
+    def command_session(self):
+        """The shared uplink session, (re)connected on demand."""
+        with self.session_lock:
+            if self.session is None or self.session.closed:
+                self.session = command.CommandSession(SAT_HOST, CMD_PORT, self.auth_token)
+            return self.session
+
     def update_status(self):
         if os.path.exists(PID_FILE):
             self.status_lbl.config(text="● UPLINK ACTIVE", fg=THEME["fg"])
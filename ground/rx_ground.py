@@ -1,8 +1,13 @@
+import os
+import sys
 import socket
-import json
 import numpy as np
 import matplotlib.pyplot as plt
 
+# Shared wire protocol lives in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import protocol
+
 # --- CONFIGURATION ---
 # REPLACE THIS WITH YOUR PI'S IP ADDRESS
 SATELLITE_IP = "10.54.254.151"
@@ -25,29 +30,28 @@ try:
     client_socket.connect((SATELLITE_IP, SATELLITE_PORT))
     print("[GROUND] Link Established! Receiving Telemetry...")
     
-    # Create a file-like object to read lines easily
-    socket_file = client_socket.makefile()
+    # Frame reader handles headers, checksums and resync
+    reader = protocol.FrameReader(client_socket)
 
     while True:
-        # 1. Listen for the next packet (ends with \n)
-        line = socket_file.readline()
-        if not line: break # Connection closed
+        # 1. Listen for the next frame
+        frame = reader.read_frame()
+        if frame is None: break # Connection closed
 
-        # 2. Decode JSON
-        packet = json.loads(line)
+        header, payload = frame
+        if header.encoding != protocol.ENC_FLOAT32: continue
         
-        # 3. Reconstruct Image
-        # Convert list of strings back to floats
-        temp_list = [float(x) for x in packet['data']]
-        data_array = np.array(temp_list).reshape((24, 32))
+        # 2. Reconstruct Image
+        data_array = np.frombuffer(payload, dtype='<f4').reshape((24, 32))
+        max_temp = float(np.max(data_array))
         
-        # 4. Update Display
+        # 3. Update Display
         img.set_data(data_array)
-        img.set_clim(vmin=np.min(data_array), vmax=float(packet['max']))
+        img.set_clim(vmin=np.min(data_array), vmax=max_temp)
         
         # Update Title with Telemetry
-        status = packet['status']
-        max_t = packet['max']
+        status = "FIRE" if max_temp > 40 else "NOMINAL"
+        max_t = f"{max_temp:.1f}"
         
         if status == "FIRE":
             plt.title(f"⚠️ ALERT: FIRE DETECTED ({max_t}°C) ⚠️", color='red', fontweight='bold')
@@ -0,0 +1,133 @@
+// Clock
+setInterval(() => {
+    document.getElementById('clock').innerText = new Date().toISOString().split('T')[1].split('.')[0] + ' UTC';
+}, 1000);
+
+// --- Heatmap: 32x24 ImageData through a colormap LUT, upscaled by drawImage ---
+const COLS = 32, ROWS = 24, PIXELS = COLS * ROWS;
+const MIN_TEMP = 20;
+const HEADER_SIZE = 28; // Downlink frame header (see common/protocol.py)
+
+// 256-entry colormap (Black -> Blue -> Purple -> Red -> Yellow), packed as little-endian RGBA
+const LUT = new Uint32Array(256);
+for(let i=0; i<256; i++) {
+    const intensity = i / 255;
+    const r = Math.floor(intensity * 255);
+    const g = intensity > 0.8 ? Math.floor((intensity-0.8)*5 * 255) : 0;
+    const b = Math.floor((1-intensity) * 100);
+    LUT[i] = (255 << 24) | (b << 16) | (g << 8) | r;
+}
+
+const canvas = document.getElementById('heatmap');
+const ctx = canvas.getContext('2d');
+const frameCanvas = document.createElement('canvas');
+frameCanvas.width = COLS; frameCanvas.height = ROWS;
+const frameCtx = frameCanvas.getContext('2d');
+const image = frameCtx.createImageData(COLS, ROWS);
+const rgba = new Uint32Array(image.data.buffer);
+const temps = new Float32Array(PIXELS);
+let smooth = true; // bilinear upscaling; click the heatmap to toggle
+
+function draw() {
+    ctx.imageSmoothingEnabled = smooth;
+    ctx.imageSmoothingQuality = 'high';
+    ctx.drawImage(frameCanvas, 0, 0, canvas.width, canvas.height);
+}
+
+function resize() {
+    const rect = canvas.getBoundingClientRect();
+    const dpr = window.devicePixelRatio || 1;
+    canvas.width = Math.max(COLS, Math.round(rect.width * dpr));
+    canvas.height = Math.max(ROWS, Math.round(rect.height * dpr));
+    draw();
+}
+window.addEventListener('resize', resize);
+canvas.addEventListener('click', () => { smooth = !smooth; draw(); });
+resize();
+
+let lastStatus = null;
+function showStatus(status) {
+    if(status === lastStatus) return;
+    lastStatus = status;
+    const stat = document.getElementById('status');
+    stat.innerText = status;
+
+    if(status.includes("FIRE")) {
+        stat.className = "fire";
+        document.documentElement.style.setProperty('--primary', '#f00');
+    } else {
+        stat.className = "nominal";
+        document.documentElement.style.setProperty('--primary', '#0f0');
+    }
+}
+
+// Paint at most once per animation frame, always the newest data
+// (FIRE/NOMINAL comes from the server's persistent hotspot detector, not from max)
+let dirty = false;
+function paint() {
+    dirty = false;
+    let max = -Infinity;
+    for(let i=0; i<PIXELS; i++) if(temps[i] > max) max = temps[i];
+    document.getElementById('max_temp').innerText = max.toFixed(1) + "°C";
+
+    const top = max || 40;
+    const span = 255 / Math.max(0.01, top - MIN_TEMP);
+    for(let i=0; i<PIXELS; i++) {
+        const idx = (temps[i] - MIN_TEMP) * span;
+        rgba[i] = LUT[idx <= 0 ? 0 : (idx >= 255 ? 255 : idx | 0)];
+    }
+    frameCtx.putImageData(image, 0, 0);
+    draw();
+}
+
+// Accepts a binary downlink frame (float32 or int16 centi-degrees)
+let lastSeq = -1;
+function showFrame(buffer) {
+    const view = new DataView(buffer);
+    const encoding = view.getUint8(5);
+    const length = view.getUint32(20);
+    if(encoding === 0 && length === PIXELS * 4) {
+        for(let i=0; i<PIXELS; i++) temps[i] = view.getFloat32(HEADER_SIZE + i*4, true);
+    } else if(encoding === 1 && length === PIXELS * 2) {
+        for(let i=0; i<PIXELS; i++) temps[i] = view.getInt16(HEADER_SIZE + i*2, true) / 100;
+    } else {
+        return;
+    }
+    lastSeq = view.getUint32(8);
+    if(!dirty) {
+        dirty = true;
+        requestAnimationFrame(paint);
+    }
+}
+
+let eventBytes = new Uint8Array(HEADER_SIZE + PIXELS * 4);
+function showEvent(b64) {
+    const raw = atob(b64);
+    if(raw.length > eventBytes.length) eventBytes = new Uint8Array(raw.length);
+    for(let i=0; i<raw.length; i++) eventBytes[i] = raw.charCodeAt(i);
+    showFrame(eventBytes.buffer);
+}
+
+// Fallback: conditional polling (304 when nothing changed)
+function poll() {
+    fetch('/api/telemetry?format=i16&since=' + lastSeq)
+    .then(r => {
+        const status = r.headers.get('X-Flamesat-Status');
+        if(status) showStatus(status);
+        return r.status === 200 ? r.arrayBuffer() : null;
+    })
+    .then(buffer => { if(buffer) showFrame(buffer); });
+}
+
+// Live push: one int16 frame per event
+if(window.EventSource) {
+    const stream = new EventSource('/api/stream?format=i16');
+    stream.addEventListener('frame', e => showEvent(e.data));
+    stream.addEventListener('status', e => showStatus(JSON.parse(e.data).status));
+    stream.onerror = () => {
+        // Server full or unreachable: EventSource retries on its own, poll meanwhile
+        if(stream.readyState === EventSource.CLOSED) setInterval(poll, 500);
+    };
+} else {
+    setInterval(poll, 500);
+}
@@ -0,0 +1,76 @@
+"""Server-sent events fan-out for live frames.
+
+The ingest event loop publishes each FrameSnapshot once. Every viewer has a
+small drop-oldest queue of snapshot references; the actual event text is
+built once per frame and format (cached on the snapshot) and shared by all
+viewers, so adding viewers does not add encode work. A viewer that cannot
+keep up simply skips to the newest frame.
+"""
+import collections
+import threading
+
+STREAM_MAX_CLIENTS = 64
+STREAM_QUEUE_DEPTH = 2
+KEEPALIVE_SECONDS = 15
+
+
+class StreamClient:
+    def __init__(self, queue_depth):
+        self.queue = collections.deque(maxlen=queue_depth)
+        self.cond = threading.Condition()
+        self.dropped = 0
+
+    def offer(self, item):
+        with self.cond:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(item)
+            self.cond.notify()
+
+    def get(self, timeout):
+        with self.cond:
+            if not self.queue:
+                self.cond.wait(timeout)
+            return self.queue.popleft() if self.queue else None
+
+
+class StreamHub:
+    """Tracks connected viewers and hands every new frame to each of them."""
+
+    def __init__(self, max_clients=STREAM_MAX_CLIENTS, queue_depth=STREAM_QUEUE_DEPTH):
+        self.max_clients = max_clients
+        self.queue_depth = queue_depth
+        self.clients = set()
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        """Register a viewer. Returns None when the hub is full."""
+        with self.lock:
+            if len(self.clients) >= self.max_clients:
+                return None
+            client = StreamClient(self.queue_depth)
+            self.clients.add(client)
+            return client
+
+    def unsubscribe(self, client):
+        with self.lock:
+            self.clients.discard(client)
+
+    def publish(self, item):
+        """Offer a snapshot (or status event) to every viewer without blocking."""
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.offer(item)
+
+    def events(self, client, render):
+        """SSE generator for one viewer. `render(item)` returns the encoded event bytes."""
+        try:
+            while True:
+                item = client.get(KEEPALIVE_SECONDS)
+                if item is None:
+                    yield b": keepalive\n\n"
+                else:
+                    yield render(item)
+        finally:
+            self.unsubscribe(client)
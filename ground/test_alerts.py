@@ -0,0 +1,117 @@
+"""Alert sinks against local stand-ins: alerts.FakeSmtpServer and a tiny HTTP hook.
+
+    cd ground && python3 -m unittest test_alerts
+"""
+import email
+import email.policy
+import http.server
+import json
+import smtplib
+import socket
+import threading
+import time
+import unittest
+
+import alerts
+
+ALERT = alerts.Alert(1700000000.0, 42, 61.5, 2, "2 hotspots")
+
+
+def serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class _HookHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.posts.append((self.path, json.loads(body)))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class SmtpSinkTest(unittest.TestCase):
+    def setUp(self):
+        self.smtp = serve(alerts.FakeSmtpServer(echo=False, refuse=("nobody@",)))
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+
+    def sink(self, receivers=("ops@example.com",)):
+        sink = alerts.SmtpSink("sat@example.com", list(receivers), host="127.0.0.1", port=self.smtp.port)
+        self.addCleanup(sink.close)
+        return sink
+
+    def test_digest_delivered_over_one_session(self):
+        sink = self.sink()
+        sink.send([ALERT])
+        sink.send([ALERT, ALERT._replace(max_temp=70.0)], omitted=3)
+        self.assertEqual(self.smtp.sessions, 1)
+        self.assertEqual(len(self.smtp.messages), 2)
+        digest = email.message_from_string("\n".join(self.smtp.messages[1]), policy=email.policy.default)
+        self.assertIn("5 events, up to 70.0", digest["Subject"])
+        self.assertIn("... and 3 earlier alerts", digest.get_content())
+
+    def test_reconnects_after_dropped_session(self):
+        sink = self.sink()
+        sink.send([ALERT])
+        sink.server.sock.shutdown(socket.SHUT_RDWR)  # as if the server had timed the session out
+        sink.send([ALERT])
+        self.assertEqual(self.smtp.sessions, 2)
+        self.assertEqual(len(self.smtp.messages), 2)
+
+    def test_refusal_is_not_retried(self):
+        sink = self.sink(["nobody@example.com"])
+        with self.assertRaises(smtplib.SMTPRecipientsRefused):
+            sink.send([ALERT])
+        self.assertEqual(self.smtp.sessions, 1)
+        self.assertEqual(self.smtp.messages, [])
+
+
+class WebhookSinkTest(unittest.TestCase):
+    def setUp(self):
+        self.hook = serve(http.server.ThreadingHTTPServer(("127.0.0.1", 0), _HookHandler))
+        self.hook.posts = []
+        self.addCleanup(self.hook.server_close)
+        self.addCleanup(self.hook.shutdown)
+        self.url = f"http://127.0.0.1:{self.hook.server_address[1]}/services/T000/B000/s3cr3t?token=abc"
+
+    def test_posts_digest_as_json(self):
+        alerts.WebhookSink(self.url).send([ALERT], omitted=1)
+        [(path, body)] = self.hook.posts
+        self.assertEqual(path, "/services/T000/B000/s3cr3t?token=abc")
+        self.assertEqual(body["omitted"], 1)
+        self.assertEqual(body["alerts"][0]["seq"], 42)
+
+    def test_name_hides_path_and_query(self):
+        self.assertEqual(alerts.WebhookSink(self.url).name, "webhook:127.0.0.1")
+
+
+class AlertDispatcherTest(unittest.TestCase):
+    def test_delivers_to_every_sink(self):
+        smtp = serve(alerts.FakeSmtpServer(echo=False))
+        self.addCleanup(smtp.server_close)
+        self.addCleanup(smtp.shutdown)
+        hook = serve(http.server.ThreadingHTTPServer(("127.0.0.1", 0), _HookHandler))
+        hook.posts = []
+        self.addCleanup(hook.server_close)
+        self.addCleanup(hook.shutdown)
+        dispatcher = alerts.AlertDispatcher([
+            alerts.SmtpSink("sat@example.com", ["ops@example.com"], host="127.0.0.1", port=smtp.port),
+            alerts.WebhookSink(f"http://127.0.0.1:{hook.server_address[1]}/hook"),
+        ])
+        dispatcher.start()
+        dispatcher.raise_alert(ALERT)
+        sent = lambda: {s["sent"] for s in dispatcher.summary()["sinks"].values()}
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and sent() != {1}:
+            time.sleep(0.05)
+        self.assertEqual(sent(), {1})
+        self.assertEqual(len(smtp.messages), 1)
+        self.assertEqual(len(hook.posts), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+"""Precompressed, ETagged HTTP bodies for the dashboard page and its assets.
+
+Everything here is compressed once when it is built, never per request;
+a burst of viewers only costs a dict lookup and a socket write each.
+"""
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+ASSET_MAX_AGE = 365 * 24 * 3600  # assets are fingerprinted, so they never change
+PAGE_MAX_AGE = 60
+MIN_COMPRESS_SIZE = 512
+ETAG_SUFFIXES = {None: "", "gzip": "-gz", "br": "-br"}  # per content coding: strong tags must differ
+
+
+class CachedBody:
+    """One response body plus its gzip/brotli variants, each with its own strong ETag."""
+
+    def __init__(self, data, mimetype, max_age):
+        self.data = data
+        self.mimetype = mimetype
+        self.max_age = max_age
+        self.digest = hashlib.sha256(data).hexdigest()[:16]
+        self.variants = {}
+        if len(data) >= MIN_COMPRESS_SIZE:
+            self.variants["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(data)
+
+    def respond(self, request, immutable=False):
+        cache_control = f"public, max-age={self.max_age}"
+        if immutable:
+            cache_control += ", immutable"
+        accepted = request.accept_encodings
+        encoding = next((e for e in ("br", "gzip") if e in self.variants and accepted[e]), None)
+        headers = {"ETag": f'"{self.digest}{ETAG_SUFFIXES[encoding]}"', "Cache-Control": cache_control,
+                   "Vary": "Accept-Encoding"}
+
+        # Any coding of the same content validates: the client's copy is current
+        if any(request.if_none_match.contains_weak(self.digest + suffix) for suffix in ETAG_SUFFIXES.values()):
+            return Response(status=304, headers=headers)
+
+        if encoding is None:
+            return Response(self.data, mimetype=self.mimetype, headers=headers)
+        headers["Content-Encoding"] = encoding
+        return Response(self.variants[encoding], mimetype=self.mimetype, headers=headers)
+
+
+class AssetStore:
+    """Static files loaded and compressed once, served under fingerprinted URLs."""
+
+    MIMETYPES = {".css": "text/css", ".js": "application/javascript"}
+
+    def __init__(self, directory):
+        self.assets = {}
+        for name in sorted(os.listdir(directory)):
+            mimetype = self.MIMETYPES.get(os.path.splitext(name)[1])
+            if mimetype is None:
+                continue
+            with open(os.path.join(directory, name), "rb") as f:
+                self.assets[name] = CachedBody(f.read(), mimetype, ASSET_MAX_AGE)
+
+    def get(self, name):
+        return self.assets.get(name)
+
+    def url(self, name):
+        return f"/assets/{name}?v={self.assets[name].digest}"
+
+
+class PageCache:
+    """Rendered pages keyed by host URL. Bounded, since the Host header is client supplied."""
+
+    def __init__(self, render, max_entries=16):
+        self.render = render
+        self.max_entries = max_entries
+        self.pages = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        page = self.pages.get(key)
+        if page is None:
+            page = CachedBody(self.render(key).encode("utf-8"), "text/html", PAGE_MAX_AGE)
+            with self.lock:
+                if len(self.pages) >= self.max_entries:
+                    self.pages.pop(next(iter(self.pages)))
+                self.pages[key] = page
+        return page
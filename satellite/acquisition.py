@@ -0,0 +1,191 @@
+"""Sensor acquisition decoupled from the downlink.
+
+A dedicated thread reads the MLX90640 at the sensor's own cadence and
+writes straight into a preallocated ring of frames. Downlink senders read
+from the ring at their own pace, so a slow TCP send never delays the next
+I2C read and nothing is allocated per frame on the acquisition side.
+
+With a RatePolicy (rate_policy.py) the loop also retimes itself: after each
+frame the policy may pick a new sensor refresh rate. The loop writes it to
+the sensor from this thread, so it never races a frame read over I2C.
+"""
+import threading
+import time
+
+import numpy as np
+
+from common import detection, metrics, protocol
+from profiling import PROFILER
+import rate_policy
+import sensors
+
+RING_SIZE = 32
+
+FRAMES_ACQUIRED = metrics.counter("flamesat_frames_acquired_total", "Frames written to the ring")
+READ_ERRORS = metrics.counter("flamesat_sensor_read_errors_total", "Sensor reads that failed (I2C errors)")
+OVERRUNS = metrics.counter("flamesat_acquisition_overruns_total", "Frames that took longer than the frame period")
+
+
+class FrameRing:
+    """Fixed-size ring of float32 frames indexed by sequence number.
+
+    The writer fills the slot for `head` in place, then commits it. A slot
+    being written is marked invalid first, so readers can never copy a
+    half-written frame.
+    """
+
+    def __init__(self, size=RING_SIZE):
+        self.size = size
+        self.frames = np.zeros((size, protocol.PIXELS), dtype=np.float32)
+        self.seqs = np.full(size, -1, dtype=np.int64)
+        self.times = np.zeros(size, dtype=np.float64)
+        self.hotspots = [()] * size  # detections per slot, when a detector runs
+        self.head = 0  # sequence number of the next frame to be written
+        self.cond = threading.Condition()
+
+    def begin_write(self):
+        """Claim the next slot; returns its frame buffer to fill in place."""
+        slot = self.head % self.size
+        with self.cond:
+            self.seqs[slot] = -1
+        return self.frames[slot]
+
+    def commit(self, capture_time, detections=()):
+        """Publish the slot claimed by begin_write(). Returns its sequence."""
+        seq = self.head
+        slot = seq % self.size
+        with self.cond:
+            self.times[slot] = capture_time
+            self.hotspots[slot] = detections
+            self.seqs[slot] = seq
+            self.head = seq + 1
+            self.cond.notify_all()
+        return seq
+
+    def latest(self):
+        return self.head - 1
+
+    def wait_for(self, seq, timeout=None):
+        """Block until frame `seq` (or anything newer) exists. Returns latest seq."""
+        with self.cond:
+            if self.head <= seq:
+                self.cond.wait_for(lambda: self.head > seq, timeout)
+            return self.head - 1
+
+    def first_since(self, capture_time):
+        """Oldest frame still in the ring captured at or after `capture_time` (head if none)."""
+        with self.cond:
+            for seq in range(max(0, self.head - self.size), self.head):
+                slot = seq % self.size
+                if self.seqs[slot] == seq and self.times[slot] >= capture_time:
+                    return seq
+            return self.head
+
+    def read(self, seq, out):
+        """Copy frame `seq` into `out`. Returns its capture time, or None if overwritten."""
+        slot = seq % self.size
+        with self.cond:
+            if self.seqs[slot] != seq:
+                return None
+            out[:] = self.frames[slot]
+            return self.times[slot]
+
+    def detections(self, seq):
+        """Detections committed with frame `seq` (empty if none or overwritten)."""
+        slot = seq % self.size
+        with self.cond:
+            return self.hotspots[slot] if self.seqs[slot] == seq else ()
+
+
+class Acquisition:
+    """Reads the sensor into a FrameRing on its own thread, paced to the sensor."""
+
+    def __init__(self, sensor, ring, frame_rate_hz, fallback_temp=20.0, detector=None,
+                 policy=None, on_rate_change=None):
+        self.sensor = sensor
+        self.ring = ring
+        self.period = 1.0 / frame_rate_hz
+        self.fallback_temp = fallback_temp
+        self.detector = detector
+        self.detections = []  # hotspots in the latest frame (common.detection.Detection)
+        self.read_errors = 0
+        self.policy = policy
+        self.on_rate_change = on_rate_change  # called with a rate_policy.RateChange
+        self.overran = False
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self):
+        next_deadline = time.monotonic()
+        while True:
+            PROFILER.checkpoint()
+            try:
+                frame = self.ring.begin_write()
+                if self.sensor:
+                    try:
+                        with PROFILER.time("sensor"):
+                            self.sensor.getFrame(frame)
+                    except RuntimeError:
+                        self.read_errors += 1
+                        READ_ERRORS.inc()
+                        continue
+                else:
+                    frame.fill(self.fallback_temp)
+                capture_time = time.time()
+                if self.detector:
+                    with PROFILER.time("detect"):
+                        detections = self._detect(frame)
+                else:
+                    detections = ()
+                self.ring.commit(capture_time, detections)
+                FRAMES_ACQUIRED.inc()
+                if self.policy:
+                    self._adapt(frame, detections, capture_time)
+            except Exception as e:
+                print(f"[SAT] Acquisition Error: {e}")
+                time.sleep(1)
+                next_deadline = time.monotonic()
+                continue
+
+            # Fixed-rate schedule: no drift, and no burst catch-up after a stall
+            next_deadline += self.period
+            delay = next_deadline - time.monotonic()
+            self.overran = delay <= 0
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                OVERRUNS.inc()
+                next_deadline = time.monotonic()
+
+    def _adapt(self, frame, detections, capture_time):
+        """Let the policy pick the refresh rate, and retime the sensor and this loop to it."""
+        previous = self.policy.refresh_hz
+        change = self.policy.update(frame, detection.confirmed(detections), time.monotonic(), self.overran)
+        if change is None:
+            return
+        refresh_hz, reason = change
+        try:
+            sensors.set_refresh_rate(self.sensor, refresh_hz)
+        except Exception as e:
+            print(f"[SAT] ❌ Refresh rate change to {refresh_hz:g} Hz failed: {e}")
+            self.policy.revert(previous)
+            return
+        self.period = rate_policy.SUBPAGES_PER_FRAME / refresh_hz
+        notice = self.policy.notice(reason, capture_time)
+        print(f"[SAT] Refresh rate {previous:g} -> {refresh_hz:g} Hz ({reason}; change {notice.change:.2f} °C/s, "
+              f"gradient {notice.gradient:.2f} °C/px)")
+        if self.on_rate_change:
+            self.on_rate_change(notice)
+
+    def _detect(self, frame):
+        detections = self.detector.update(frame)
+        before = {d.track_id for d in detection.confirmed(self.detections)}
+        after = detection.confirmed(detections)
+        for d in after:
+            if d.track_id not in before:
+                print(f"[SAT] 🔥 Hotspot #{d.track_id} confirmed: {d.area} px, peak {d.peak:.1f}°C at ({d.row:.1f}, {d.col:.1f})")
+        if before and not after:
+            print("[SAT] Hotspots cleared.")
+        self.detections = detections
+        return detections
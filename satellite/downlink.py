@@ -0,0 +1,385 @@
+"""Telemetry fan-out: one acquisition loop, many ground stations.
+
+The acquisition thread writes each frame once into a shared FrameRing.
+Every connected subscriber has its own sender thread and read cursor into
+that ring; a subscriber that falls more than its queue depth behind
+skips its oldest frames, so a slow client never stalls the sensor or the
+other clients.
+
+In event mode (for ground stations that advertise ENC_STATS) a subscriber
+sends a full frame only when the scene changed, a hotspot is present or
+FULL_FRAME_INTERVAL has passed, and otherwise a ~46 byte stats packet at
+most every STATS_INTERVAL. A quiet scene then costs about a twentieth of
+the continuous downlink.
+
+Onboard processing (ROI crop, binning, averaging; see processing.py) is
+applied per subscriber just before encoding, so it can change at runtime.
+
+When the sensor is retimed (rate_policy.py) the queue depth follows. A
+lagging subscriber then stays at most about QUEUE_SECONDS behind at any
+frame rate. Ground stations that advertise ENC_RATE also get a rate notice.
+
+With an onboard store (store.py) the hub records frames to the SD card
+while no ground station that advertises ENC_STORED is connected. After a
+link loss, recording begins with the last LOSS_WINDOW seconds still in the
+ring, since those may never have arrived. A returning station gets the
+backlog whenever no live frame is waiting, with at most
+BACKFILL_QUEUE_BYTES of it queued in the socket, so a live frame never
+waits behind more than that.
+"""
+import collections
+import fcntl
+import socket
+import struct
+import termios
+import threading
+import time
+
+import numpy as np
+
+from common import protocol, codec, detection, metrics
+import processing
+from profiling import PROFILER
+
+MAX_SUBSCRIBERS = 8
+QUEUE_DEPTH = 4        # frames, until the acquisition reports its frame rate
+QUEUE_SECONDS = 2.0    # then this much time's worth of frames
+MIN_QUEUE_DEPTH = 2
+# Small kernel send buffer so a slow link backs up into our drop-oldest queue
+# instead of piling seconds of stale frames into the socket
+SEND_BUFFER = 32 * 1024
+# A client that accepts nothing for this long is considered dead
+SEND_TIMEOUT = 10
+
+DOWNLINK_MODES = ("continuous", "event")
+# Event mode: a frame is "changed" when CHANGE_PIXELS pixels moved by more
+# than CHANGE_DELTA °C since the last full frame sent
+CHANGE_DELTA = 1.0
+CHANGE_PIXELS = 4
+FULL_FRAME_INTERVAL = 30.0  # s; refresh the ground's copy even if nothing changed
+STATS_INTERVAL = 1.0        # s; keep well under the ground's 5 s receive timeout
+
+# Store-and-forward
+LOSS_WINDOW = SEND_TIMEOUT  # s of frames before a link loss that may never have reached the ground
+BACKFILL_QUEUE_BYTES = 16 * 1024  # unsent backlog allowed in the socket ahead of the next live frame
+BACKFILL_POLL = 0.02        # s between checks while the socket drains
+BACKFILL_CONFIRM = 30.0     # s the link must stay up after a block before it counts as delivered
+
+PACKETS_SENT = metrics.counter("flamesat_downlink_packets_total", "Packets sent to ground stations", ("kind",))
+BYTES_SENT = metrics.counter("flamesat_downlink_bytes_total", "Bytes sent to ground stations")
+FRAMES_SKIPPED = metrics.counter("flamesat_downlink_dropped_frames_total", "Frames a slow subscriber fell behind on")
+CONNECTIONS = metrics.counter("flamesat_downlink_connections_total", "Ground station connections accepted")
+SUBSCRIBERS = metrics.gauge("flamesat_downlink_subscribers", "Connected ground stations")
+
+
+class ChangeFilter:
+    """Event-mode policy: which frames go down in full, which as stats, which not at all."""
+
+    FULL, STATS = "full", "stats"
+
+    def __init__(self, change_delta=CHANGE_DELTA, change_pixels=CHANGE_PIXELS,
+                 full_interval=FULL_FRAME_INTERVAL, stats_interval=STATS_INTERVAL):
+        self.change_delta = change_delta
+        self.change_pixels = change_pixels
+        self.full_interval = full_interval
+        self.stats_interval = stats_interval
+        self.reference = np.zeros(protocol.PIXELS, dtype=np.float32)  # last full frame sent
+        self.reference_seq = None
+        self.scratch = np.zeros(protocol.PIXELS, dtype=np.float32)
+        self.last_full = 0.0
+        self.last_stats = 0.0
+        self.changed = 0
+
+    def classify(self, seq, frame, detections, now):
+        """FULL, STATS or None (send nothing) for frame `seq`."""
+        if self.reference_seq is None or self.reference.shape != frame.shape:
+            # First frame, or onboard processing changed the geometry
+            self.reference = np.empty_like(frame)
+            self.scratch = np.empty_like(frame)
+            self.reference_seq = None
+            self.changed = frame.size
+        else:
+            np.subtract(frame, self.reference, out=self.scratch)
+            np.abs(self.scratch, out=self.scratch)
+            self.changed = int(np.count_nonzero(self.scratch > self.change_delta))
+
+        if (self.reference_seq is None or detections or self.changed >= self.change_pixels
+                or now - self.last_full >= self.full_interval):
+            self.reference[:] = frame
+            self.reference_seq = seq
+            self.last_full = self.last_stats = now
+            return self.FULL
+        if now - self.last_stats >= self.stats_interval:
+            self.last_stats = now
+            return self.STATS
+        return None
+
+    def stats_payload(self, frame, detections):
+        return protocol.pack_stats(
+            float(frame.max()), float(frame.min()), float(frame.mean()),
+            self.reference_seq, self.changed, detection.pack_detections(detections))
+
+
+def unsent_bytes(sock):
+    """Bytes still in the socket's send queue (0 where the kernel cannot tell)."""
+    try:
+        return struct.unpack("i", fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, b"\0\0\0\0"))[0]
+    except OSError:
+        return 0
+
+
+class Subscriber:
+    """One downlink client: handshake, per-client encoder, ring cursor."""
+
+    def __init__(self, hub, sock, addr, queue_depth=None):
+        self.hub = hub
+        self.ring = hub.ring
+        self.sock = sock
+        self.addr = addr
+        self.queue_depth = queue_depth and min(queue_depth, hub.ring.size)  # None: follow the hub
+        self.frame = np.zeros(protocol.PIXELS, dtype=np.float32)
+        self.alive = True
+        self.encoder = None
+        self.processor = processing.FrameProcessor()
+        self.change_filter = None
+        self.rate_notices = False
+        self.sent_rate = None  # last RateChange this client was told about
+        self.store = None      # store.FrameStore, if this client takes backfill
+        self.stored = collections.deque()  # records of the block being forwarded
+        self.stored_block = -1
+        self.stored_pending = 0  # frames in later blocks
+        self.unconfirmed = collections.deque()  # (block seq, time sent)
+        self.backfilled = 0
+        self.sent = 0
+        self.sent_stats = 0
+        self.dropped = 0
+
+    def close(self):
+        self.alive = False
+        try: self.sock.close()
+        except OSError: pass
+
+    def next_frame(self, cursor):
+        """Wait for the next frame at or after `cursor`. Returns (seq, capture_time)."""
+        while self.alive:
+            timeout = 1.0
+            if self.store is not None and self.ring.latest() < cursor:
+                # No live frame waiting: the link is free for the backlog
+                if self.send_stored():
+                    continue
+                if self.stored:
+                    timeout = BACKFILL_POLL  # the socket is still draining
+            latest = self.ring.wait_for(cursor, timeout=timeout)
+            if latest < cursor:
+                continue
+            # Too far behind: drop the oldest frames
+            queue_depth = self.queue_depth or self.hub.queue_depth
+            if latest - cursor >= queue_depth:
+                skip = latest - queue_depth + 1
+                self.dropped += skip - cursor
+                FRAMES_SKIPPED.inc(skip - cursor)
+                cursor = skip
+            capture_time = self.ring.read(cursor, self.frame)
+            if capture_time is not None:
+                return cursor, capture_time
+            # Overwritten while we looked; move on to the newest frame
+            self.dropped += latest - cursor
+            FRAMES_SKIPPED.inc(latest - cursor)
+            cursor = latest
+        return None, None
+
+    def run(self):
+        # Negotiate payload encoding (clients without a HELLO get float32)
+        requested = protocol.read_hello(self.sock)
+        encoding = protocol.choose_encoding(requested, codec.SUPPORTED_ENCODINGS)
+        self.encoder = codec.FrameEncoder(encoding)
+        mode = "continuous"
+        if self.hub.mode == "event" and protocol.ENC_STATS in (requested or ()):
+            self.change_filter = ChangeFilter()
+            mode = "event"
+        self.rate_notices = protocol.ENC_RATE in (requested or ())
+        if self.hub.store is not None and protocol.ENC_STORED in (requested or ()):
+            self.store = self.hub.store
+        print(f"[SAT] Telemetry Connected: {self.addr} ({protocol.ENCODING_NAMES[encoding]}, {mode})")
+        self.hub.register(self)
+
+        try:
+            cursor = self.ring.latest() + 1
+            skipped = False  # frames left out on purpose since the last packet
+            full_packets, stats_packets = PACKETS_SENT.labels("full"), PACKETS_SENT.labels("stats")
+            # sendall() blocks while the link backs up, so "send" is mostly link time
+            encode_stage, send_stage = PROFILER.timers.stage("encode"), PROFILER.timers.stage("send")
+            while True:
+                PROFILER.checkpoint()
+                seq, capture_time = self.next_frame(cursor)
+                if seq is None:
+                    break
+                cursor = seq + 1
+
+                encode_start = time.perf_counter()
+                frame, transform = self.processor.process(self.frame, self.hub.processing)
+                if frame is None:
+                    skipped = True  # averaging or decimating
+                    continue
+
+                kind = ChangeFilter.FULL
+                if self.change_filter:
+                    detections = self.ring.detections(seq)
+                    kind = self.change_filter.classify(seq, frame, detections, time.monotonic())
+                    if kind is None:
+                        skipped = True
+                        continue
+                # Tell the ground that the gap before this packet is not loss
+                sparse = protocol.FLAG_SPARSE if skipped else 0
+                skipped = False
+
+                if kind == ChangeFilter.STATS:
+                    payload = self.change_filter.stats_payload(frame, detections)
+                    packet = protocol.pack_frame(seq, capture_time, payload, protocol.ENC_STATS, sparse)
+                    self.sent_stats += 1
+                    stats_packets.inc()
+                else:
+                    payload, flags = self.encoder.encode(frame)
+                    if transform is not None:
+                        payload = protocol.pack_transform(transform) + payload
+                        flags |= protocol.FLAG_TRANSFORM
+                    packet = protocol.pack_frame(seq, capture_time, payload, encoding, flags | sparse)
+                    self.sent += 1
+                    full_packets.inc()
+                send_start = time.perf_counter()
+                encode_stage.observe(send_start - encode_start)
+                self.sock.sendall(packet)
+                send_stage.observe(time.perf_counter() - send_start)
+                BYTES_SENT.inc(len(packet))
+                if self.rate_notices and self.hub.rate is not self.sent_rate:
+                    self.send_rate(seq)
+        except (BrokenPipeError, ConnectionResetError, socket.timeout):
+            print(f"[SAT] Telemetry Link Lost: {self.addr}")
+        except Exception as e:
+            print(f"[SAT] Subscriber Error ({self.addr}): {e}")
+        finally:
+            if self.store is not None:
+                self.store.release(self)
+            self.hub.unregister(self)
+            self.close()
+
+
+    def send_rate(self, seq):
+        """Tell the ground the current refresh rate, after the packet for frame `seq`."""
+        rate = self.sent_rate = self.hub.rate
+        payload = protocol.pack_rate(rate.refresh_hz, rate.frame_rate, rate.reason, rate.change, rate.gradient)
+        packet = protocol.pack_frame(seq, rate.time, payload, protocol.ENC_RATE)
+        self.sock.sendall(packet)
+        PACKETS_SENT.labels("rate").inc()
+        BYTES_SENT.inc(len(packet))
+
+    def send_stored(self):
+        """Send the next frame of the onboard backlog. Returns False if none was sent."""
+        now = time.monotonic()
+        while self.unconfirmed and now - self.unconfirmed[0][1] >= BACKFILL_CONFIRM:
+            self.store.confirm(self, self.unconfirmed.popleft()[0])
+        if not self.stored:
+            block = self.store.next_block(self, self.stored_block)
+            if block is None:
+                return False
+            if self.stored_block < 0:
+                print(f"[SAT] Backfilling {len(block[1]) + block[2]} stored frames to {self.addr}")
+            self.stored_block, records, self.stored_pending = block
+            self.stored.extend(records)
+        if unsent_bytes(self.sock) > BACKFILL_QUEUE_BYTES:
+            return False
+
+        seq, capture_time, payload = self.stored.popleft()
+        pending = self.stored_pending + len(self.stored)
+        packet = protocol.pack_frame(seq, capture_time, protocol.pack_stored(pending) + payload,
+                                     protocol.ENC_STORED, protocol.FLAG_KEYFRAME)
+        self.sock.sendall(packet)
+        self.backfilled += 1
+        PACKETS_SENT.labels("stored").inc()
+        BYTES_SENT.inc(len(packet))
+        if not self.stored:
+            # Delivered only if the link is still up a while later; until then it goes out again after a loss
+            self.unconfirmed.append((self.stored_block, now))
+            if not pending:
+                print(f"[SAT] Backfill to {self.addr} complete ({self.backfilled} frames)")
+        return True
+
+
+class TelemetryHub:
+    """Accepts downlink clients; each one streams from the shared FrameRing."""
+
+    def __init__(self, ring, port, max_subscribers=MAX_SUBSCRIBERS, mode="continuous", recorder=None):
+        if mode not in DOWNLINK_MODES:
+            raise ValueError(f"unknown downlink mode '{mode}'")
+        self.ring = ring
+        self.port = port
+        self.mode = mode
+        self.processing = processing.FULL_FRAME  # replaced (never mutated) by set_processing()
+        self.rate = None  # rate_policy.RateChange; replaced by set_rate()
+        self.queue_depth = min(QUEUE_DEPTH, ring.size)
+        self.recorder = recorder  # store.Recorder, runs while no backfill client is connected
+        self.store = recorder.store if recorder else None
+        self.max_subscribers = max_subscribers
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server_socket.bind(('0.0.0.0', self.port))
+        server_socket.listen(self.max_subscribers)
+        print(f"[SAT] Telemetry Downlink Active on Port {self.port} ({self.mode})")
+        threading.Thread(target=self._accept_loop, args=(server_socket,), daemon=True).start()
+
+    def _accept_loop(self, server_socket):
+        while True:
+            try:
+                client_socket, addr = server_socket.accept()
+            except OSError as e:
+                print(f"[SAT] Accept Error: {e}")
+                continue
+
+            with self.lock:
+                full = len(self.subscribers) >= self.max_subscribers
+            if full:
+                print(f"[SAT] 🛑 Downlink full, rejecting {addr}")
+                client_socket.close()
+                continue
+
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+            client_socket.settimeout(SEND_TIMEOUT)
+            sub = Subscriber(self, client_socket, addr)
+            threading.Thread(target=sub.run, daemon=True).start()
+
+    def set_processing(self, config):
+        self.processing = config
+        print(f"[SAT] Onboard processing: {config.describe()}")
+
+    def set_rate(self, rate):
+        """The sensor was retimed: resize the queues and notify the ground."""
+        depth = round(QUEUE_SECONDS * rate.frame_rate)
+        self.queue_depth = max(MIN_QUEUE_DEPTH, min(depth, self.ring.size))
+        self.rate = rate
+
+    def register(self, sub):
+        with self.lock:
+            self.subscribers.append(sub)
+            if sub.store is not None and self._backfill_clients() == 1:
+                self.recorder.stop_recording()
+                print(f"[SAT] Ground station back; onboard store paused ({self.store.pending()} frames to forward)")
+        CONNECTIONS.inc()
+        SUBSCRIBERS.inc()
+
+    def unregister(self, sub):
+        with self.lock:
+            if sub not in self.subscribers:
+                return
+            self.subscribers.remove(sub)
+            if sub.store is not None and not self._backfill_clients():
+                self.recorder.start_recording(time.time() - LOSS_WINDOW)
+                print("[SAT] No ground station; recording to the onboard store")
+        SUBSCRIBERS.dec()
+
+    def _backfill_clients(self):
+        return sum(1 for s in self.subscribers if s.store is not None)
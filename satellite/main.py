@@ -1,27 +1,44 @@
+import os
+import sys
 import time
-import board
-import busio
-import adafruit_mlx90640
+import argparse
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import detection
+import profiling
+import sensors
+
 # --- CONFIGURATION ---
 # 40°C is good for testing with a hand or warm coffee.
 # Real fire would be >100°C.
 FIRE_THRESHOLD = 40.0 
+# A hot region must cover 2+ pixels for 3 frames in a row (see common/detection.py)
+detector = detection.HotspotDetector(threshold=FIRE_THRESHOLD)
+
+parser = argparse.ArgumentParser(description="FLAMESAT local thermal viewer")
+parser.add_argument("--sensor", choices=sensors.BACKENDS, default="mlx")
+parser.add_argument("--replay", metavar="FILE", help="recording for --sensor replay")
+parser.add_argument("--profile", choices=("cprofile", "sample"), help="capture a profile at startup (see profiling.py)")
+parser.add_argument("--profile-seconds", type=float, default=profiling.DEFAULT_CAPTURE_SECONDS)
+args = parser.parse_args()
+if args.sensor == "replay" and not args.replay:
+    parser.error("--sensor replay needs --replay FILE")
+profiler = profiling.PROFILER
 
 # --- HARDWARE SETUP ---
 print("Initializing Satellite Systems...")
-# Setup I2C at 800kHz for faster video
-i2c = busio.I2C(board.SCL, board.SDA, frequency=800000)
-
+# The MLX90640 runs on I2C at 800kHz for faster video
 try:
-    mlx = adafruit_mlx90640.MLX90640(i2c)
-    print("Thermal Camera: ONLINE (Address 0x33)")
-    mlx.refresh_rate = adafruit_mlx90640.RefreshRate.REFRESH_4_HZ
+    mlx = sensors.open_sensor(args.sensor, 4, replay_path=args.replay)
 except Exception as e:
-    print(f"Camera Init Failed: {e}")
+    print(f"Sensor Error: {e}")
+    mlx = None
+if mlx is None:
+    print("Camera Init Failed")
     exit()
+print(f"Thermal Camera: ONLINE ({args.sensor})")
 
 # --- VISUALIZATION SETUP ---
 plt.ion() # Interactive mode ON
@@ -38,31 +55,46 @@ frame = [0] * 768
 
 print("-" * 40)
 print("MISSION START: Scanning for Heat Signatures...")
+if args.profile:
+    print(f"Profiling ({args.profile}) -> {profiler.start(args.profile, args.profile_seconds)}.*")
+next_summary = time.monotonic() + profiling.SUMMARY_INTERVAL
 
 while True:
     try:
+        profiler.checkpoint()
         # 1. Get Data from Camera
-        mlx.getFrame(frame)
+        with profiler.time("sensor"):
+            mlx.getFrame(frame)
         
         # 2. Process Data
-        data_array = np.array(frame).reshape((24, 32))
-        max_temp = np.max(data_array)
+        with profiler.time("detect"):
+            data_array = np.array(frame).reshape((24, 32))
+            max_temp = np.max(data_array)
+            fires = detection.confirmed(detector.update(data_array))
         
         # 3. Update Heatmap
-        img.set_data(data_array)
-        # Adjust the color scale dynamically so you can see contrast
-        img.set_clim(vmin=np.min(data_array), vmax=max_temp) 
-        plt.pause(0.001) # Brief pause to let the window redraw
+        with profiler.time("display"):
+            img.set_data(data_array)
+            # Adjust the color scale dynamically so you can see contrast
+            img.set_clim(vmin=np.min(data_array), vmax=max_temp) 
+            plt.pause(0.001) # Brief pause to let the window redraw
 
         # 4. FIRE LOGIC
-        if max_temp > FIRE_THRESHOLD:
-            print(f"⚠️ FIRE DETECTED! Max Temp: {max_temp:.1f}°C")
+        if fires:
+            hottest = max(fires, key=lambda d: d.peak)
+            print(f"⚠️ FIRE DETECTED! Max Temp: {max_temp:.1f}°C | {len(fires)} region(s), "
+                  f"largest {max(d.area for d in fires)} px at ({hottest.row:.0f}, {hottest.col:.0f})")
         else:
             # \r overwrites the line so your terminal stays clean
             print(f"Status: Nominal | Max Temp: {max_temp:.1f}°C", end='\r')
 
-    except ValueError:
+        if time.monotonic() >= next_summary:
+            next_summary += profiling.SUMMARY_INTERVAL
+            print(f"\n{profiler.timers.report()}")
+
+    except (ValueError, RuntimeError):
         continue # Sensor read error, skip frame
     except KeyboardInterrupt:
         print("\nMission Aborted by User.")
+        print(profiler.timers.report())
         break
@@ -0,0 +1,476 @@
+"""MLX90640 raw reads with vectorized temperature calibration.
+
+adafruit_mlx90640 computes the EEPROM constants in Python loops at
+startup. Every subpage then runs the To equation once per pixel in pure
+Python, which keeps a Pi well below the sensor's 16-64 Hz modes. This
+module splits the work differently:
+
+  Calibration   extracts every EEPROM-derived constant once into NumPy arrays
+                (the same quantized values the reference keeps). calculate_to()
+                then converts a raw 834-word subpage with a few dozen array
+                operations over the ~384 pixels it updates.
+  RawMLX90640   reads raw subpages over I2C straight into a uint16 array and
+                has the getFrame() interface the flight software expects
+                (sensor backend "mlx-fast").
+
+The maths follows adafruit_mlx90640 (the Melexis reference driver)
+operation for operation in float64. Results match it to rounding error,
+and deviating pixels get the same -273.15. Only getFrame() fills those
+from their neighbours. Raw dumps make the match checkable offline:
+
+    python3 mlx90640.py record dump.npz --frames 200   # on the Pi
+    python3 mlx90640.py verify dump.npz                # anywhere; the reference is pip-installable
+    python3 mlx90640.py bench dump.npz
+
+A dump is an .npz with `eeprom` (832 words) and `subpages` (N x 834 raw
+words: RAM 0x0400.., control register, subpage number), and optionally
+`reference` (N x 768, the reference's frame buffer after each subpage).
+`--sensor replay --replay dump.npz` plays one through the calibration.
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+SCALEALPHA = 0.000001
+OPENAIR_TA_SHIFT = 8   # °C; reflected temperature = Ta - shift, for a sensor in open air
+EMISSIVITY = 0.95
+BAD_PIXEL = -273.15    # what the reference reports for broken/outlier pixels
+
+EEPROM_WORDS = 832
+SUBPAGE_WORDS = 834    # 832 RAM words + control register + subpage number
+ROWS, COLS = 24, 32
+PIXELS = ROWS * COLS
+
+I2C_ADDRESS = 0x33
+I2C_FREQUENCY = 800000
+REG_STATUS = 0x8000
+REG_CONTROL = 0x800D
+RAM_START = 0x0400
+EEPROM_START = 0x2400
+STATUS_DATA_READY = 0x0008
+READ_RETRIES = 5
+POLL_INTERVAL = 0.002  # s between data-ready polls (the reference spins on the bus)
+READY_TIMEOUT = 3.0    # s to wait for data ready, at least; slow refresh rates get longer
+
+# Refresh rate (Hz) -> control register bits 7..9
+REFRESH_CODES = {0.5: 0, 1: 1, 2: 2, 4: 3, 8: 4, 16: 5, 32: 6, 64: 7}
+
+
+def _signed(value, bits):
+    """Two's complement of an unsigned bit field (int or int64 array)."""
+    half = 1 << (bits - 1)
+    if isinstance(value, np.ndarray):
+        return np.where(value >= half, value - (1 << bits), value)
+    return value - (1 << bits) if value >= half else value
+
+
+def _nibbles(words, count):
+    """Signed 4-bit fields, least significant first, of consecutive words."""
+    words = np.asarray(words, dtype=np.int64)
+    fields = np.stack([(words >> shift) & 0xF for shift in (0, 4, 8, 12)], axis=1).ravel()[:count]
+    return _signed(fields, 4)
+
+
+def _quantize(values, limit):
+    """Scale by 2**n until the largest magnitude reaches `limit`, round half away from zero.
+
+    Returns (integers, n), like the reference's storage of kta and kv.
+    """
+    largest = float(np.abs(values).max())
+    scale = 0
+    while 0 < largest < limit:
+        largest *= 2
+        scale += 1
+    scaled = values * math.pow(2, scale)
+    return np.where(scaled < 0, np.trunc(scaled - 0.5), np.trunc(scaled + 0.5)), scale
+
+
+class Calibration:
+    """All EEPROM-derived constants of one sensor, as NumPy arrays."""
+
+    def __init__(self, eeprom):
+        ee = np.asarray(eeprom, dtype=np.int64)
+        if ee.shape != (EEPROM_WORDS,):
+            raise ValueError(f"expected {EEPROM_WORDS} EEPROM words, got {ee.shape}")
+        self.eeprom = ee.astype(np.uint16)
+        e = [int(w) for w in ee[:64]]  # scalar parameters, in plain ints like the reference
+        pix = ee[64:]
+        rows = np.arange(ROWS)[:, None]
+        cols = np.arange(COLS)[None, :]
+
+        # --- scalar parameters ---
+        self.kVdd = _signed((e[51] & 0xFF00) >> 8, 8) * 32
+        self.vdd25 = (((e[51] & 0x00FF) - 256) << 5) - 8192
+        self.KvPTAT = _signed((e[50] & 0xFC00) >> 10, 6) / 4096
+        self.KtPTAT = _signed(e[50] & 0x03FF, 10) / 8
+        self.vPTAT25 = e[49]
+        self.alphaPTAT = (e[16] & 0xF000) / math.pow(2, 14) + 8
+        self.gainEE = _signed(e[48], 16)
+        self.tgc = _signed(e[60] & 0x00FF, 8) / 32
+        self.resolutionEE = (e[56] & 0x3000) >> 12
+        self.KsTa = _signed((e[60] & 0xFF00) >> 8, 8) / 8192
+
+        step = ((e[63] & 0x3000) >> 12) * 10
+        ct2 = ((e[63] & 0x00F0) >> 4) * step
+        self.ct = [-40, 0, ct2, ct2 + ((e[63] & 0x0F00) >> 8) * step]
+        ks_to_scale = 1 << ((e[63] & 0x000F) + 8)
+        raw_ks_to = [e[61] & 0x00FF, (e[61] & 0xFF00) >> 8, e[62] & 0x00FF, (e[62] & 0xFF00) >> 8]
+        self.ksTo = [_signed(k, 8) / ks_to_scale for k in raw_ks_to] + [-0.0002]
+        self.alphaCorrR = [1 / (1 + self.ksTo[0] * 40), 1, 1 + self.ksTo[1] * self.ct[2]]
+        self.alphaCorrR.append(self.alphaCorrR[2] * (1 + self.ksTo[2] * (self.ct[3] - self.ct[2])))
+
+        # Compensation pixel
+        cp_alpha0 = _signed(e[57] & 0x03FF, 10) / math.pow(2, ((e[32] & 0xF000) >> 12) + 27)
+        self.cpAlpha = [cp_alpha0, (1 + _signed((e[57] & 0xFC00) >> 10, 6) / 128) * cp_alpha0]
+        cp_offset0 = _signed(e[58] & 0x03FF, 10)
+        self.cpOffset = [cp_offset0, _signed((e[58] & 0xFC00) >> 10, 6) + cp_offset0]
+        self.cpKta = _signed(e[59] & 0x00FF, 8) / math.pow(2, ((e[56] & 0x00F0) >> 4) + 8)
+        self.cpKv = _signed((e[59] & 0xFF00) >> 8, 8) / math.pow(2, (e[56] & 0x0F00) >> 8)
+
+        # --- per-pixel parameters (24 x 32, flattened row-major like the RAM) ---
+        acc_row, acc_col = _nibbles(ee[34:40], ROWS)[:, None], _nibbles(ee[40:48], COLS)[None, :]
+        alpha = _signed((pix.reshape(ROWS, COLS) & 0x03F0) >> 4, 6) * (1 << (e[32] & 0x000F))
+        alpha = alpha + (e[33] + (acc_row << ((e[32] & 0x0F00) >> 8)) + (acc_col << ((e[32] & 0x00F0) >> 4)))
+        alpha = alpha.ravel() / math.pow(2, ((e[32] & 0xF000) >> 12) + 30)
+        alpha = SCALEALPHA / (alpha - self.tgc * (self.cpAlpha[0] + self.cpAlpha[1]) / 2)
+        largest, self.alphaScale = float(alpha.max()), 0
+        while 0 < largest < 32768:
+            largest *= 2
+            self.alphaScale += 1
+        self.alpha = np.trunc(alpha * math.pow(2, self.alphaScale) + 0.5)
+
+        occ_row, occ_col = _nibbles(ee[18:24], ROWS)[:, None], _nibbles(ee[24:32], COLS)[None, :]
+        offset = _signed((pix.reshape(ROWS, COLS) & 0xFC00) >> 10, 6) * (1 << (e[16] & 0x000F))
+        offset = offset + (_signed(e[17], 16) + (occ_row << ((e[16] & 0x0F00) >> 8))
+                           + (occ_col << ((e[16] & 0x00F0) >> 4)))
+        self.offset = offset.ravel().astype(np.float64)
+
+        # Row/column parity selects one of four kta/kv groups
+        split = (2 * (rows % 2) + cols % 2).ravel()
+        kta_rc = np.array([_signed((e[54] & 0xFF00) >> 8, 8), _signed((e[55] & 0xFF00) >> 8, 8),
+                           _signed(e[54] & 0x00FF, 8), _signed(e[55] & 0x00FF, 8)])
+        kta = _signed((pix & 0x000E) >> 1, 3) * (1 << (e[56] & 0x000F)) + kta_rc[split]
+        self.kta, self.ktaScale = _quantize(kta / math.pow(2, ((e[56] & 0x00F0) >> 4) + 8), 64)
+        kv_t = np.array([_signed((e[52] & 0xF000) >> 12, 4), _signed((e[52] & 0x00F0) >> 4, 4),
+                         _signed((e[52] & 0x0F00) >> 8, 4), _signed(e[52] & 0x000F, 4)])
+        self.kv, self.kvScale = _quantize(kv_t[split] / math.pow(2, (e[56] & 0x0F00) >> 8), 64)
+
+        self.calibrationModeEE = ((e[10] & 0x0800) >> 4) ^ 0x80
+        self.ilChessC = [_signed(e[53] & 0x003F, 6) / 16.0, _signed((e[53] & 0x07C0) >> 6, 5) / 2.0,
+                         _signed((e[53] & 0xF800) >> 11, 5) / 8.0]
+
+        self.bad_pixels = self._deviating_pixels(pix)
+
+        # --- precomputed for calculate_to() ---
+        p = np.arange(PIXELS)
+        il_pattern = p // 32 - (p // 64) * 2
+        chess_pattern = il_pattern ^ (p - (p // 2) * 2)
+        conversion = ((p + 2) // 4 - (p + 3) // 4 + (p + 1) // 4 - p // 4) * (1 - 2 * il_pattern)
+        good = np.ones(PIXELS, dtype=bool)
+        good[self.bad_pixels] = False
+        # [chess mode][subpage] -> pixels that subpage updates
+        self.pixels = [[np.flatnonzero((pattern == subpage) & good) for subpage in (0, 1)]
+                       for pattern in (il_pattern, chess_pattern)]
+        # Interleave/chess correction, for frames read in the other mode than calibrated
+        self.il_chess_correction = self.ilChessC[2] * (2 * il_pattern - 1) - self.ilChessC[1] * conversion
+        self.kta_pixel = self.kta / math.pow(2, self.ktaScale)
+        self.kv_pixel = self.kv / math.pow(2, self.kvScale)
+        self.alpha_pixel = SCALEALPHA * math.pow(2, self.alphaScale) / self.alpha
+        self.neighbours = [self._neighbours(pixel) for pixel in self.bad_pixels]
+
+    @staticmethod
+    def _deviating_pixels(pix):
+        """Broken (word 0) and outlier (bit 0) pixels, with the reference's sanity checks."""
+        broken = [int(i) for i in np.flatnonzero(pix == 0)[:5]]
+        outliers = [int(i) for i in np.flatnonzero((pix != 0) & (pix & 1 != 0))[:5]]
+        if len(broken) > 4:
+            raise ValueError("More than 4 broken pixels")
+        if len(outliers) > 4:
+            raise ValueError("More than 4 outlier pixels")
+        if len(broken) + len(outliers) > 4:
+            raise ValueError("More than 4 faulty pixels")
+
+        def adjacent(a, b):
+            return -34 < a - b < -30 or -2 < a - b < 2 or 30 < a - b < 34
+        for group_a, group_b in ((broken, broken), (outliers, outliers), (broken, outliers)):
+            for i, a in enumerate(group_a):
+                for b in (group_b[i + 1:] if group_a is group_b else group_b):
+                    if adjacent(a, b):
+                        raise ValueError("Adjacent deviating pixels")
+        return np.array(sorted(broken + outliers), dtype=np.int64)
+
+    def _neighbours(self, pixel):
+        row, col = divmod(int(pixel), COLS)
+        candidates = [(row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)]
+        return np.array([r * COLS + c for r, c in candidates
+                         if 0 <= r < ROWS and 0 <= c < COLS and r * COLS + c not in self.bad_pixels])
+
+    # --- per subpage ---
+
+    def vdd(self, frame):
+        resolution_ram = (int(frame[832]) & 0x0C00) >> 10
+        correction = math.pow(2, self.resolutionEE) / math.pow(2, resolution_ram)
+        return (correction * _signed(int(frame[810]), 16) - self.vdd25) / self.kVdd + 3.3
+
+    def ta(self, frame, vdd=None):
+        vdd = self.vdd(frame) if vdd is None else vdd
+        ptat = _signed(int(frame[800]), 16)
+        ptat_art = (ptat / (ptat * self.alphaPTAT + _signed(int(frame[768]), 16))) * math.pow(2, 18)
+        ta = ptat_art / (1 + self.KvPTAT * (vdd - 3.3)) - self.vPTAT25
+        return ta / self.KtPTAT + 25
+
+    def calculate_to(self, frame, emissivity, tr, result):
+        """Temperatures (°C) of the pixels in raw subpage `frame`, written into `result` (768 floats).
+
+        Pixels of the other subpage are left as they are; deviating pixels
+        are set to BAD_PIXEL. Returns `result`.
+        """
+        subpage = int(frame[833])
+        control = int(frame[832])
+        vdd = self.vdd(frame)
+        ta = self.ta(frame, vdd)
+
+        ta4 = ta + 273.15
+        ta4 *= ta4
+        ta4 *= ta4
+        tr4 = tr + 273.15
+        tr4 *= tr4
+        tr4 *= tr4
+        ta_tr = tr4 - (tr4 - ta4) / emissivity
+
+        gain = self.gainEE / _signed(int(frame[778]), 16)
+        mode = (control & 0x1000) >> 5
+
+        # Compensation pixel of this subpage, corrected like the pixels below
+        cp_offset = self.cpOffset[subpage]
+        if subpage == 1 and mode != self.calibrationModeEE:
+            cp_offset = self.cpOffset[1] + self.ilChessC[0]
+        ir_cp = _signed(int(frame[776 if subpage == 0 else 808]), 16) * gain
+        ir_cp -= cp_offset * (1 + self.cpKta * (ta - 25)) * (1 + self.cpKv * (vdd - 3.3))
+
+        idx = self.pixels[mode != 0][subpage]
+        ir = np.asarray(frame[:PIXELS]).astype(np.uint16).view(np.int16)[idx] * gain
+        ir -= self.offset[idx] * (1 + self.kta_pixel[idx] * (ta - 25)) * (1 + self.kv_pixel[idx] * (vdd - 3.3))
+        if mode != self.calibrationModeEE:
+            ir += self.il_chess_correction[idx]
+        ir -= self.tgc * ir_cp
+        ir /= emissivity
+
+        # Corrupt reads can go negative under the roots: NaN here, rejected by getFrame()
+        with np.errstate(invalid="ignore"):
+            alpha = self.alpha_pixel[idx] * (1 + self.KsTa * (ta - 25))
+            sx = np.sqrt(np.sqrt(alpha * alpha * alpha * (ir + alpha * ta_tr))) * self.ksTo[1]
+            to = np.sqrt(np.sqrt(ir / (alpha * (1 - self.ksTo[1] * 273.15) + sx) + ta_tr)) - 273.15
+
+            # Temperature range (-40..0..ct2..ct3) of the first estimate
+            ct = self.ct
+            band = (to >= ct[1]).astype(np.intp) + (to >= ct[2]) + (to >= ct[3])
+            corr_r = np.take(self.alphaCorrR, band)
+            ks_to = np.take(self.ksTo, band)
+            ct_band = np.take(ct, band)
+            result[idx] = np.sqrt(np.sqrt(ir / (alpha * corr_r * (1 + ks_to * (to - ct_band))) + ta_tr)) - 273.15
+        result[self.bad_pixels] = BAD_PIXEL
+        return result
+
+    def fix_bad_pixels(self, result):
+        """Replace deviating pixels with the mean of their good 4-neighbours."""
+        for pixel, neighbours in zip(self.bad_pixels, self.neighbours):
+            if len(neighbours):
+                result[pixel] = result[neighbours].mean()
+        return result
+
+
+class RawMLX90640:
+    """The MLX90640 over I2C, read as raw subpages and converted by Calibration.
+
+    Drop-in for adafruit_mlx90640.MLX90640 in the flight software:
+    getFrame(framebuf) fills 768 temperatures (°C) and raises RuntimeError
+    on a bad read.
+    """
+
+    def __init__(self, i2c, refresh_hz=4, address=I2C_ADDRESS, emissivity=EMISSIVITY):
+        from adafruit_bus_device.i2c_device import I2CDevice
+        self.device = I2CDevice(i2c, address)
+        self.emissivity = emissivity
+        self.address_buf = bytearray(2)
+        self.raw = np.zeros(SUBPAGE_WORDS, dtype=np.uint16)
+        self.temps = np.zeros(PIXELS, dtype=np.float64)
+        self.calibration = Calibration(self.read_words(EEPROM_START, EEPROM_WORDS))
+        self.refresh_hz = refresh_hz
+        self.set_refresh_rate(refresh_hz)
+
+    def read_words(self, address, count):
+        """`count` big-endian words from `address`, as uint16."""
+        buf = bytearray(2 * count)
+        self.address_buf[0], self.address_buf[1] = address >> 8, address & 0xFF
+        with self.device as i2c:
+            i2c.write_then_readinto(self.address_buf, buf)
+        return np.frombuffer(buf, dtype=">u2").astype(np.uint16)
+
+    def write_word(self, address, value):
+        with self.device as i2c:
+            i2c.write(bytes((address >> 8, address & 0xFF, value >> 8, value & 0xFF)))
+
+    def set_refresh_rate(self, refresh_hz):
+        control = int(self.read_words(REG_CONTROL, 1)[0])
+        self.write_word(REG_CONTROL, (control & 0xFC7F) | (REFRESH_CODES[refresh_hz] << 7))
+        self.refresh_hz = refresh_hz
+
+    def read_subpage(self, out=None):
+        """Wait for the next subpage and read it raw (834 words; see the module docstring)."""
+        out = self.raw if out is None else out
+        # One subpage takes 1/refresh_hz; allow for the slowest mode
+        deadline = time.monotonic() + max(READY_TIMEOUT, 2.5 / self.refresh_hz)
+        while not int(self.read_words(REG_STATUS, 1)[0]) & STATUS_DATA_READY:
+            if time.monotonic() > deadline:
+                raise RuntimeError("MLX90640 data ready timeout")
+            time.sleep(POLL_INTERVAL)
+        for _ in range(READ_RETRIES):
+            self.write_word(REG_STATUS, 0x0030)  # clear data ready, keep overwrite enabled
+            out[:EEPROM_WORDS] = self.read_words(RAM_START, EEPROM_WORDS)
+            status = int(self.read_words(REG_STATUS, 1)[0])
+            if not status & STATUS_DATA_READY:
+                break  # no new subpage arrived while reading
+        else:
+            raise RuntimeError("Too many retries")
+        out[832] = self.read_words(REG_CONTROL, 1)[0]
+        out[833] = status & 0x0001
+        return out
+
+    def getFrame(self, framebuf):
+        cal = self.calibration
+        for _ in range(2):
+            raw = self.read_subpage()
+            tr = cal.ta(raw) - OPENAIR_TA_SHIFT
+            cal.calculate_to(raw, self.emissivity, tr, self.temps)
+        if not np.isfinite(self.temps).all():
+            raise RuntimeError("Frame data error")
+        cal.fix_bad_pixels(self.temps)
+        framebuf[:] = self.temps
+
+
+# --- RAW DUMPS ---
+
+def load_dump(path):
+    with np.load(path) as dump:
+        return {key: dump[key] for key in dump.files}
+
+
+def decode_subpages(calibration, subpages, emissivity=EMISSIVITY):
+    """Frame buffer after each subpage, as getFrame() builds it: shape (N, 768), float64."""
+    temps = np.zeros(PIXELS, dtype=np.float64)
+    out = np.empty((len(subpages), PIXELS), dtype=np.float64)
+    for i, raw in enumerate(subpages):
+        calibration.calculate_to(raw, emissivity, calibration.ta(raw) - OPENAIR_TA_SHIFT, temps)
+        out[i] = temps
+    return out
+
+
+def decode_dump(path):
+    """Complete frames (one per subpage pair, bad pixels filled) of a raw dump, as float32 (N, 768)."""
+    dump = load_dump(path)
+    calibration = Calibration(dump["eeprom"])
+    buffers = decode_subpages(calibration, dump["subpages"])[1::2]
+    for frame in buffers:
+        calibration.fix_bad_pixels(frame)
+    return buffers.astype(np.float32)
+
+
+def reference_model(eeprom):
+    """adafruit_mlx90640's own calculation, set up from EEPROM words without any I2C."""
+    import adafruit_mlx90640 as ref
+    ref.eeData[:] = [int(w) for w in eeprom]
+    model = ref.MLX90640.__new__(ref.MLX90640)
+    # Per-instance copies of the class-level lists the extraction fills in
+    for name in ("ksTo", "ct", "alpha", "offset", "kta", "kv", "cpAlpha", "cpOffset", "ilChessC",
+                 "brokenPixels", "outlierPixels"):
+        setattr(model, name, list(getattr(ref.MLX90640, name)) if name not in ("brokenPixels", "outlierPixels") else [])
+    model._ExtractParameters()
+    return model
+
+
+def reference_subpages(model, subpages, emissivity=EMISSIVITY):
+    """Like decode_subpages(), computed by a reference_model()."""
+    temps = [0.0] * PIXELS
+    out = np.empty((len(subpages), PIXELS), dtype=np.float64)
+    for i, raw in enumerate(subpages):
+        words = [int(w) for w in raw]
+        model._CalculateTo(words, emissivity, model._GetTa(words) - OPENAIR_TA_SHIFT, temps)
+        out[i] = temps
+    return out
+
+
+def _record(args):
+    import board
+    import busio
+    i2c = busio.I2C(board.SCL, board.SDA, frequency=I2C_FREQUENCY)
+    sensor = RawMLX90640(i2c, args.rate)
+    subpages = np.empty((args.frames * 2, SUBPAGE_WORDS), dtype=np.uint16)
+    for i in range(len(subpages)):
+        sensor.read_subpage(subpages[i])
+    dump = {"eeprom": sensor.calibration.eeprom, "subpages": subpages, "refresh_hz": args.rate}
+    if args.reference:
+        dump["reference"] = reference_subpages(reference_model(dump["eeprom"]), subpages)
+    np.savez_compressed(args.dump, **dump)
+    print(f"{args.dump}: {len(subpages)} subpages at {args.rate} Hz")
+
+
+def _verify(args):
+    dump = load_dump(args.dump)
+    ours = decode_subpages(Calibration(dump["eeprom"]), dump["subpages"])
+    try:
+        reference, source = reference_subpages(reference_model(dump["eeprom"]), dump["subpages"]), "adafruit_mlx90640"
+    except ImportError:
+        if "reference" not in dump:
+            sys.exit("need adafruit_mlx90640 (pip install adafruit-circuitpython-mlx90640) "
+                     "or a dump recorded with --reference")
+        reference, source = dump["reference"], "recorded reference"
+    error = np.abs(ours - reference)
+    worst = np.unravel_index(np.argmax(error), error.shape)
+    print(f"{len(ours)} subpages vs {source}: max |error| {error.max():.3g} °C "
+          f"(subpage {worst[0]}, pixel {worst[1]}), mean {error.mean():.3g} °C")
+    if not error.max() <= args.tolerance:
+        sys.exit(f"FAIL: error above {args.tolerance} °C")
+    print("OK")
+
+
+def _bench(args):
+    dump = load_dump(args.dump)
+    subpages = dump["subpages"]
+    t0 = time.perf_counter()
+    calibration = Calibration(dump["eeprom"])
+    t1 = time.perf_counter()
+    decode_subpages(calibration, subpages)
+    t2 = time.perf_counter()
+    print(f"vectorized: EEPROM {1000 * (t1 - t0):.2f} ms, {1000 * (t2 - t1) / len(subpages):.3f} ms per subpage")
+    try:
+        t0 = time.perf_counter()
+        model = reference_model(dump["eeprom"])
+        t1 = time.perf_counter()
+        count = min(len(subpages), 20)  # pure Python: keep it short on a Pi
+        reference_subpages(model, subpages[:count])
+        t2 = time.perf_counter()
+        print(f"reference:  EEPROM {1000 * (t1 - t0):.2f} ms, {1000 * (t2 - t1) / count:.3f} ms per subpage")
+    except ImportError:
+        print("reference:  adafruit_mlx90640 not installed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MLX90640 raw dumps: record, verify against the reference, benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="record raw subpages from the sensor (needs the hardware)")
+    record.add_argument("dump")
+    record.add_argument("--frames", type=int, default=100)
+    record.add_argument("--rate", type=float, default=4, choices=sorted(REFRESH_CODES))
+    record.add_argument("--reference", action="store_true", help="also store the reference's output (slow on a Pi)")
+    verify = commands.add_parser("verify", help="compare the vectorized calibration with the reference")
+    verify.add_argument("dump")
+    verify.add_argument("--tolerance", type=float, default=1e-6, help="°C")
+    bench = commands.add_parser("bench", help="time the vectorized calibration (and the reference, if installed)")
+    bench.add_argument("dump")
+    args = parser.parse_args()
+    {"record": _record, "verify": _verify, "bench": _bench}[args.command](args)
@@ -0,0 +1,135 @@
+"""Onboard frame processing, set at runtime over the command uplink.
+
+Operators can trade resolution for bandwidth and noise without reflashing:
+
+    proc                      show the current settings
+    proc roi R0 C0 R1 C1      crop to sensor rows R0..R1-1, cols C0..C1-1
+    proc roi off              full frame again
+    proc bin 2                2x2 binning (bin 1 turns it off)
+    proc avg N                send the mean of every N frames
+    proc decimate N           send every Nth frame
+    proc off                  back to raw full frames
+
+Settings are an immutable ProcessingConfig swapped by reference on the
+TelemetryHub; each downlink subscriber runs its own FrameProcessor, which
+notices the swap and starts over. Processed frames carry a TRANSFORM block
+(common/protocol.py) describing the geometry.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from common import protocol
+
+TEMPORAL_MODES = ("none", "avg", "decimate")
+BIN_FACTORS = (1, 2)
+MAX_TEMPORAL = 64
+
+
+class ProcessingConfig(namedtuple("ProcessingConfig", "row0 col0 rows cols binning temporal count")):
+    """Region (sensor pixels), bin factor and temporal mode with its frame count."""
+
+    @property
+    def identity(self):
+        return self == FULL_FRAME
+
+    @property
+    def out_shape(self):
+        return self.rows // self.binning, self.cols // self.binning
+
+    def describe(self):
+        text = f"roi {self.row0},{self.col0} {self.rows}x{self.cols}, bin {self.binning}"
+        if self.temporal != "none":
+            text += f", {self.temporal} {self.count}"
+        return text + f" -> {self.out_shape[0]}x{self.out_shape[1]} px"
+
+
+FULL_FRAME = ProcessingConfig(0, 0, protocol.SENSOR_ROWS, protocol.SENSOR_COLS, 1, "none", 1)
+
+
+def _fit_binning(config):
+    """Trim the region so it divides evenly into bins."""
+    rows = config.rows - config.rows % config.binning
+    cols = config.cols - config.cols % config.binning
+    if not rows or not cols:
+        raise ValueError(f"region {config.rows}x{config.cols} is smaller than one {config.binning}x{config.binning} bin")
+    return config._replace(rows=rows, cols=cols)
+
+
+def parse_command(args, current):
+    """Apply `proc` arguments to the current config. Raises ValueError on bad input."""
+    if not args:
+        return current
+    op, values = args[0], args[1:]
+    try:
+        numbers = [int(v) for v in values if v != "off"]
+    except ValueError:
+        raise ValueError(f"expected integers: {' '.join(values)}")
+
+    if op in ("off", "reset"):
+        return FULL_FRAME
+    if op == "roi":
+        if values == ["off"]:
+            return _fit_binning(current._replace(row0=0, col0=0, rows=protocol.SENSOR_ROWS, cols=protocol.SENSOR_COLS))
+        if len(numbers) != 4:
+            raise ValueError("usage: proc roi R0 C0 R1 C1 | proc roi off")
+        r0, c0, r1, c1 = numbers
+        if not (0 <= r0 < r1 <= protocol.SENSOR_ROWS and 0 <= c0 < c1 <= protocol.SENSOR_COLS):
+            raise ValueError(f"roi must lie within {protocol.SENSOR_ROWS}x{protocol.SENSOR_COLS}")
+        return _fit_binning(current._replace(row0=r0, col0=c0, rows=r1 - r0, cols=c1 - c0))
+    if op == "bin":
+        if len(numbers) != 1 or numbers[0] not in BIN_FACTORS:
+            raise ValueError(f"usage: proc bin {'|'.join(map(str, BIN_FACTORS))}")
+        return _fit_binning(current._replace(binning=numbers[0]))
+    if op in ("avg", "decimate"):
+        if len(numbers) != 1 or not 1 <= numbers[0] <= MAX_TEMPORAL:
+            raise ValueError(f"usage: proc {op} N (1-{MAX_TEMPORAL})")
+        if numbers[0] == 1:
+            return current._replace(temporal="none", count=1)
+        return current._replace(temporal=op, count=numbers[0])
+    raise ValueError(f"unknown processing command '{op}'")
+
+
+class FrameProcessor:
+    """Per-subscriber state: applies a ProcessingConfig to consecutive frames."""
+
+    def __init__(self):
+        self.config = FULL_FRAME
+        self.total = None  # running sum for "avg"
+        self.pending = 0   # frames accumulated or skipped since the last output
+
+    def process(self, frame, config):
+        """Returns (frame, Transform) to send, (frame, None) for raw frames,
+        or (None, None) while averaging/decimating."""
+        if config is not self.config:
+            self.config = config
+            self.total = None
+            self.pending = 0
+        if config.identity:
+            return frame, None
+
+        grid = frame.reshape(protocol.SENSOR_ROWS, protocol.SENSOR_COLS)
+        grid = grid[config.row0:config.row0 + config.rows, config.col0:config.col0 + config.cols]
+        if config.binning > 1:
+            rows, cols = config.out_shape
+            grid = grid.reshape(rows, config.binning, cols, config.binning).mean(axis=(1, 3), dtype=np.float32)
+
+        self.pending += 1
+        if config.temporal == "avg":
+            if self.total is None:
+                self.total = grid.astype(np.float64)
+            else:
+                self.total += grid
+            if self.pending < config.count:
+                return None, None
+            grid = (self.total / config.count).astype(np.float32)
+            self.total = None
+        elif config.temporal == "decimate" and self.pending < config.count:
+            return None, None
+        self.pending = 0
+
+        transform = protocol.Transform(
+            config.row0, config.col0, *config.out_shape, config.binning,
+            config.count if config.temporal == "decimate" else 1,
+            config.count if config.temporal == "avg" else 1)
+        return np.ascontiguousarray(grid, dtype=np.float32), transform
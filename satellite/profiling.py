@@ -0,0 +1,340 @@
+"""Where the flight computer's CPU time goes.
+
+Stage timers are always on. Each pipeline stage is timed with
+perf_counter into a rolling window. The stages are the sensor read, the
+I2C transfer and calibration math inside the sensor's getFrame(), detection,
+encoding and sending. summary() gives mean/p50/p95/max per stage. The
+flight software prints it every few minutes, the `prof` uplink command
+returns it, and every stage also feeds flamesat_stage_seconds on /metrics.
+
+Profile captures are bounded and started by command:
+
+    prof cprofile 30     cProfile of the flight threads for 30 s (.pstats + .txt)
+    prof sample 30 200   stack samples of every thread at 200 Hz (.folded + .txt)
+
+Results go to PROFILE_DIR. Pull them down over the uplink, e.g.
+`cat profiles/<name>.txt`. .pstats loads with `python3 -m pstats`, and
+.folded works with flamegraph.pl or speedscope. cProfile in Python 3.11
+profiles one thread at a time, so the flight loops call checkpoint()
+once per iteration. That lets each loop profile itself for the
+duration of the capture. The sampler needs no cooperation, but it sees
+Python frames only.
+"""
+import collections
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+import numpy as np
+
+from common import metrics
+
+STAGE_WINDOW = 512           # samples per stage kept for the rolling summary
+SUMMARY_INTERVAL = 300       # s between summaries in the log
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+MAX_CAPTURE_SECONDS = 300
+DEFAULT_CAPTURE_SECONDS = 30
+SAMPLE_HZ = 100
+MAX_SAMPLE_HZ = 1000
+CPROFILE_GRACE = 5.0         # s for blocked threads to reach a checkpoint and stop profiling
+REPORT_LINES = 40
+
+STAGE_SECONDS = metrics.histogram("flamesat_stage_seconds", "Time per pipeline stage", ("stage",))
+
+
+class Stage:
+    def __init__(self, name, window):
+        self.name = name
+        self.samples = collections.deque(maxlen=window)  # seconds
+        self.histogram = STAGE_SECONDS.labels(name)
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.histogram.observe(seconds)
+
+    def time(self):
+        return metrics.Timer(self)
+
+
+class StageTimers:
+    """Named stages, created on first use. `with timers.time("send"): ...`"""
+
+    def __init__(self, window=STAGE_WINDOW):
+        self.window = window
+        self.stages = {}
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            with self.lock:
+                stage = self.stages.setdefault(name, Stage(name, self.window))
+        return stage
+
+    def time(self, name):
+        return self.stage(name).time()
+
+    def reset(self):
+        for stage in list(self.stages.values()):
+            stage.samples.clear()
+
+    def summary(self):
+        """{stage: {n, total, mean_ms, p50_ms, p95_ms, max_ms}} over the rolling window; n and total since start."""
+        result = {}
+        for name, stage in list(self.stages.items()):
+            window = np.fromiter(list(stage.samples), dtype=np.float64) * 1000.0
+            if not len(window):
+                continue
+            p50, p95 = np.percentile(window, (50, 95))
+            result[name] = {
+                "n": stage.histogram.count, "total_s": round(stage.histogram.sum, 3),
+                "mean_ms": round(float(window.mean()), 3), "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3), "max_ms": round(float(window.max()), 3),
+            }
+        return result
+
+    def report(self):
+        summary = self.summary()
+        if not summary:
+            return "no stage timings yet"
+        lines = [f"{'stage':<12}{'n':>9}{'mean':>10}{'p50':>10}{'p95':>10}{'max':>10}  (ms, last {self.window})"]
+        for name, s in sorted(summary.items(), key=lambda item: -item[1]["total_s"]):
+            lines.append(f"{name:<12}{s['n']:>9}{s['mean_ms']:>10.2f}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['max_ms']:>10.2f}")
+        return "\n".join(lines)
+
+
+def instrument_mlx(mlx, timers):
+    """Time the I2C transfer and the calibration math inside getFrame().
+
+    Both run once per subpage, i.e. twice per frame; this works for
+    adafruit's driver and for mlx90640.RawMLX90640.
+    """
+    calibration = getattr(mlx, "calibration", None)
+    for target, attr, name in ((mlx, "_GetFrameData", "i2c_read"), (mlx, "_CalculateTo", "calibrate"),
+                               (mlx, "read_subpage", "i2c_read"), (calibration, "calculate_to", "calibrate")):
+        method = getattr(target, attr, None)
+        if method is None:
+            continue
+        stage = timers.stage(name)
+
+        def timed(*args, _method=method, _stage=stage):
+            with _stage.time():
+                return _method(*args)
+        setattr(target, attr, timed)
+    return mlx
+
+
+# --- CAPTURES ---
+
+_thread_profile = threading.local()  # a cProfile that outlived its capture; stopped at the next checkpoint
+
+
+class _CProfileCapture:
+    kind = "cprofile"
+
+    def __init__(self, seconds, path):
+        self.deadline = time.monotonic() + seconds
+        self.path = path
+        self.lock = threading.Lock()
+        self.profiles = {}    # thread ident -> cProfile.Profile (None: covered by another thread's profiler)
+        self.names = {}       # thread ident -> name, for the report
+        self.running = set()  # thread idents still profiling
+
+    def checkpoint(self):
+        ident = threading.get_ident()
+        if time.monotonic() < self.deadline:
+            if ident in self.profiles:
+                return
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                profile = None  # Python 3.12+: one profiler already sees every thread
+            with self.lock:
+                self.profiles[ident] = profile
+                self.names[ident] = threading.current_thread().name
+                if profile is not None:
+                    self.running.add(ident)
+            _thread_profile.profile = profile
+        elif ident in self.running:
+            self.profiles[ident].disable()
+            _thread_profile.profile = None
+            with self.lock:
+                self.running.discard(ident)
+
+    def wait(self):
+        time.sleep(max(0.0, self.deadline - time.monotonic()))
+        end = time.monotonic() + CPROFILE_GRACE
+        while self.running and time.monotonic() < end:
+            time.sleep(0.1)
+
+    def write(self):
+        with self.lock:
+            done = [i for i, p in self.profiles.items() if p is not None and i not in self.running]
+            missing = sorted(self.names[i] for i in self.running)
+        if not done:
+            raise RuntimeError("no flight thread reached a checkpoint during the capture")
+        stats = pstats.Stats(*(self.profiles[i] for i in done))
+        stats.dump_stats(self.path + ".pstats")
+
+        out = io.StringIO()
+        out.write(f"cProfile of threads: {', '.join(sorted(self.names[i] for i in done))}\n")
+        if missing:
+            out.write(f"still blocked, not included: {', '.join(missing)}\n")
+        stats.stream = out
+        stats.sort_stats("tottime").print_stats(REPORT_LINES)
+        stats.sort_stats("cumulative").print_stats(REPORT_LINES)
+        with open(self.path + ".txt", "w") as f:
+            f.write(out.getvalue())
+        return [self.path + ".pstats", self.path + ".txt"]
+
+
+class _SampleCapture:
+    kind = "sample"
+
+    def __init__(self, seconds, path, hz):
+        self.seconds = seconds
+        self.path = path
+        self.interval = 1.0 / hz
+        self.stacks = collections.Counter()  # (thread name, frame, ..., leaf) -> samples
+        self.samples = 0
+
+    def checkpoint(self):
+        pass
+
+    def wait(self):
+        own = threading.get_ident()
+        end = time.monotonic() + self.seconds
+        next_sample = time.monotonic()
+        while next_sample < end:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+            next_sample += self.interval
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+
+    def write(self):
+        with open(self.path + ".folded", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+        own = collections.Counter()
+        inclusive = collections.Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for frame in set(stack[1:]):
+                inclusive[frame] += count
+        lines = [f"{self.samples} samples at {1.0 / self.interval:.0f} Hz (wall clock; waits count too)", "",
+                 "self (leaf) samples:"]
+        lines += [f"{count:>8}  {name}" for name, count in own.most_common(REPORT_LINES)]
+        lines += ["", "inclusive samples:"]
+        lines += [f"{count:>8}  {name}" for name, count in inclusive.most_common(REPORT_LINES)]
+        with open(self.path + ".txt", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return [self.path + ".folded", self.path + ".txt"]
+
+
+class Profiler:
+    """Stage timers plus at most one running capture."""
+
+    def __init__(self, profile_dir=PROFILE_DIR):
+        self.timers = StageTimers()
+        self.profile_dir = profile_dir
+        self.capture = None
+        self.last_files = []
+        self.last_error = None
+
+    def time(self, stage):
+        return self.timers.time(stage)
+
+    def checkpoint(self):
+        """Called once per flight loop iteration; a no-op unless a cProfile capture runs."""
+        capture = self.capture
+        if capture is not None:
+            capture.checkpoint()
+        elif getattr(_thread_profile, "profile", None) is not None:
+            _thread_profile.profile.disable()
+            _thread_profile.profile = None
+
+    def start(self, kind, seconds=DEFAULT_CAPTURE_SECONDS, hz=SAMPLE_HZ):
+        """Start a capture in the background. Returns the base path of the result files."""
+        if self.capture is not None:
+            raise ValueError(f"a {self.capture.kind} capture is already running")
+        if not 0 < seconds <= MAX_CAPTURE_SECONDS:
+            raise ValueError(f"seconds must be 1..{MAX_CAPTURE_SECONDS}")
+        if not 0 < hz <= MAX_SAMPLE_HZ:
+            raise ValueError(f"sample rate must be 1..{MAX_SAMPLE_HZ} Hz")
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}")
+        if kind == "cprofile":
+            self.capture = _CProfileCapture(seconds, path)
+        elif kind == "sample":
+            self.capture = _SampleCapture(seconds, path, hz)
+        else:
+            raise ValueError(f"unknown capture '{kind}' (cprofile, sample)")
+        threading.Thread(target=self._run, args=(self.capture,), daemon=True).start()
+        return path
+
+    def _run(self, capture):
+        try:
+            capture.wait()
+            self.last_files, self.last_error = capture.write(), None
+            print(f"[SAT] Profile written: {', '.join(self.last_files)}")
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"[SAT] ❌ Profile capture failed: {e}")
+        finally:
+            self.capture = None
+
+    def status(self):
+        if self.capture is not None:
+            return f"{self.capture.kind} capture running -> {self.capture.path}.*"
+        if self.last_error:
+            return f"last capture failed: {self.last_error}"
+        if self.last_files:
+            return f"last capture: {', '.join(self.last_files)}"
+        return "no capture yet"
+
+    def command(self, args):
+        """`prof` uplink command. Returns the reply text; raises ValueError on bad input.
+
+            prof                          stage timings
+            prof reset                    clear the rolling windows
+            prof status                   running capture / last result files
+            prof cprofile [SECONDS]
+            prof sample [SECONDS] [HZ]
+        """
+        if not args:
+            return self.timers.report()
+        verb, rest = args[0], args[1:]
+        if verb == "reset":
+            self.timers.reset()
+            return "stage timings cleared"
+        if verb == "status":
+            return self.status()
+        if verb in ("cprofile", "sample"):
+            try:
+                numbers = [float(a) for a in rest[:2]]
+            except ValueError:
+                raise ValueError(f"usage: prof {verb} [SECONDS]{' [HZ]' if verb == 'sample' else ''}")
+            seconds = numbers[0] if numbers else DEFAULT_CAPTURE_SECONDS
+            hz = numbers[1] if len(numbers) > 1 else SAMPLE_HZ
+            path = self.start(verb, seconds, hz)
+            return f"{verb} capture for {seconds:g}s -> {path}.*"
+        raise ValueError(f"unknown prof command '{verb}' (reset, status, cprofile, sample)")
+
+
+PROFILER = Profiler()
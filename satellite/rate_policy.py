@@ -0,0 +1,272 @@
+"""Adaptive sensor refresh rate, driven by how much the scene is doing.
+
+A quiet scene does not need 4 Hz, and a fast-growing hotspot needs more.
+RatePolicy watches every acquired frame and picks the MLX90640 refresh
+rate. The acquisition loop applies the choice: it writes the sensor's
+control register and retimes its own schedule. The downlink resizes its
+queues to match, and ground stations get an ENC_RATE notice for every
+change (common/protocol.py).
+
+Two signals are measured on a smoothed copy of the scene, so sensor noise
+(which grows with the refresh rate) does not feed back into the decision:
+
+  change    °C/s; the CHANGE_CELLS-th largest change of a 2x2 pixel cell
+            over the last CHANGE_WINDOW seconds
+  gradient  °C/px; the steepest difference between neighbouring pixels
+
+Hysteresis keeps the rate from flapping:
+
+  - Speed up by one step when either signal reaches its `up` threshold,
+    at most once per UP_DWELL seconds. Go straight to the maximum while a
+    hotspot is confirmed.
+  - Slow down by one step only after both signals have stayed below
+    their (lower) `down` thresholds for `calm` seconds.
+  - Back off one step when the loop keeps overrunning its frame period.
+    Do not go above that rate again for OVERLOAD_HOLD seconds, hotspot or not.
+
+Limits and thresholds are set at runtime over the uplink:
+
+    rate                      current rate, scene signals and settings
+    rate auto                 adapt between the limits (default)
+    rate fixed HZ             hold one refresh rate
+    rate limits MIN MAX       refresh rate range for auto, Hz
+    rate change UP DOWN       change thresholds, °C/s
+    rate gradient UP DOWN     gradient thresholds, °C/px
+    rate calm SECONDS         calm time before stepping down
+    rate reset                defaults
+"""
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from common import metrics, protocol
+
+RATE_STEPS = (0.5, 1, 2, 4, 8, 16, 32, 64)  # MLX90640 refresh rates, Hz
+SUBPAGES_PER_FRAME = 2  # getFrame() reads both subpages: frames/s = refresh rate / 2
+RATE_MODES = ("auto", "fixed")
+
+MIN_REFRESH_HZ = 1   # 0.5 frames/s keeps well inside the ground's 5 s receive timeout
+MAX_REFRESH_HZ = 8
+CHANGE_UP = 1.0      # °C/s
+CHANGE_DOWN = 0.3
+GRADIENT_UP = 8.0    # °C/px
+GRADIENT_DOWN = 4.0
+CALM_SECONDS = 30.0
+
+SMOOTHING = 1.0      # s; time constant of the smoothed scene
+CHANGE_WINDOW = 2.0  # s between change measurements
+CHANGE_CELLS = 2     # 2x2 cells, about a small hotspot; lone noisy pixels do not count
+UP_DWELL = 2.0       # s at a new rate before the next step up (lets `change` catch up)
+OVERLOAD_LIMIT = 0.5  # fraction of overrunning frames that forces a step down
+OVERLOAD_SMOOTHING = 0.1
+OVERLOAD_HOLD = 60.0  # s the reduced rate stays the ceiling
+
+REFRESH_HZ = metrics.gauge("flamesat_sensor_refresh_hz", "Sensor refresh rate")
+RATE_CHANGES = metrics.counter("flamesat_refresh_rate_changes_total", "Refresh rate changes", ("reason",))
+
+
+class RateConfig(namedtuple("RateConfig", "mode fixed_hz min_hz max_hz change_up change_down "
+                                          "gradient_up gradient_down calm_seconds")):
+    def describe(self):
+        if self.mode == "fixed":
+            return f"fixed {self.fixed_hz:g} Hz" if self.fixed_hz else "fixed at the start rate"
+        return (f"auto {self.min_hz:g}-{self.max_hz:g} Hz, change {self.change_up:g}/{self.change_down:g} °C/s, "
+                f"gradient {self.gradient_up:g}/{self.gradient_down:g} °C/px, calm {self.calm_seconds:g}s")
+
+
+DEFAULT_CONFIG = RateConfig("auto", None, MIN_REFRESH_HZ, MAX_REFRESH_HZ, CHANGE_UP, CHANGE_DOWN,
+                            GRADIENT_UP, GRADIENT_DOWN, CALM_SECONDS)
+
+
+def _refresh_rate(value):
+    try:
+        hz = float(value)
+    except ValueError:
+        hz = None
+    if hz not in RATE_STEPS:
+        raise ValueError(f"refresh rate must be one of {', '.join(f'{s:g}' for s in RATE_STEPS)} Hz")
+    return hz
+
+
+def _thresholds(op, values, unit):
+    try:
+        up, down = (float(v) for v in values)
+    except ValueError:
+        raise ValueError(f"usage: rate {op} UP DOWN ({unit})")
+    if not 0 <= down < up:
+        raise ValueError(f"{op}: need 0 <= DOWN < UP")
+    return up, down
+
+
+def parse_command(args, current):
+    """Apply `rate` arguments to the current config. Raises ValueError on bad input."""
+    if not args:
+        return current
+    op, values = args[0], args[1:]
+    if op == "reset":
+        return DEFAULT_CONFIG
+    if op == "auto":
+        return current._replace(mode="auto")
+    if op == "fixed":
+        if len(values) != 1:
+            raise ValueError("usage: rate fixed HZ")
+        return current._replace(mode="fixed", fixed_hz=_refresh_rate(values[0]))
+    if op == "limits":
+        if len(values) != 2:
+            raise ValueError("usage: rate limits MIN MAX (Hz)")
+        low, high = (_refresh_rate(v) for v in values)
+        if low > high:
+            raise ValueError("limits: MIN must not exceed MAX")
+        return current._replace(min_hz=low, max_hz=high)
+    if op in ("change", "gradient"):
+        if len(values) != 2:
+            raise ValueError(f"usage: rate {op} UP DOWN")
+        up, down = _thresholds(op, values, "°C/s" if op == "change" else "°C/px")
+        return current._replace(**{f"{op}_up": up, f"{op}_down": down})
+    if op == "calm":
+        try:
+            seconds = float(values[0]) if len(values) == 1 else -1
+        except ValueError:
+            seconds = -1
+        if seconds <= 0:
+            raise ValueError("usage: rate calm SECONDS")
+        return current._replace(calm_seconds=seconds)
+    raise ValueError(f"unknown rate command '{op}'")
+
+
+class SceneActivity:
+    """Change rate and steepest gradient of a noise-smoothed copy of the scene."""
+
+    def __init__(self, smoothing=SMOOTHING, window=CHANGE_WINDOW, change_cells=CHANGE_CELLS):
+        self.smoothing = smoothing
+        self.window = window
+        self.change_cells = change_cells
+        self.smoothed = None
+        self.baseline = None
+        self.scratch = None
+        self.last_time = self.baseline_time = 0.0
+        self.change = 0.0    # °C/s
+        self.gradient = 0.0  # °C/px
+
+    def update(self, frame, now):
+        if self.smoothed is None:
+            self.smoothed = frame.astype(np.float32)
+            self.baseline = self.smoothed.copy()
+            self.scratch = np.empty_like(self.smoothed)
+            self.last_time = self.baseline_time = now
+            return
+        # Exponential smoothing with a fixed time constant, whatever the frame rate
+        weight = 1.0 - math.exp(-max(now - self.last_time, 0.0) / self.smoothing)
+        self.last_time = now
+        np.subtract(frame, self.smoothed, out=self.scratch)
+        self.scratch *= weight
+        self.smoothed += self.scratch
+
+        elapsed = now - self.baseline_time
+        if elapsed < self.window:
+            return
+        # Change per 2x2 cell: averaging halves the pixel noise, a hotspot survives it
+        np.subtract(self.smoothed, self.baseline, out=self.scratch)
+        cells = np.abs(self.scratch.reshape(protocol.SENSOR_ROWS // 2, 2, protocol.SENSOR_COLS // 2, 2).mean(axis=(1, 3)))
+        self.change = float(np.partition(cells.ravel(), -self.change_cells)[-self.change_cells]) / elapsed
+        self.baseline[:] = self.smoothed
+        self.baseline_time = now
+        grid = self.smoothed.reshape(protocol.SENSOR_ROWS, protocol.SENSOR_COLS)
+        self.gradient = float(max(np.abs(np.diff(grid, axis=0)).max(), np.abs(np.diff(grid, axis=1)).max()))
+
+
+RateChange = namedtuple("RateChange", "refresh_hz frame_rate reason change gradient time")
+
+
+class RatePolicy:
+    """Chooses the refresh rate; update() runs on the acquisition thread, configure() from anywhere."""
+
+    def __init__(self, config=DEFAULT_CONFIG, refresh_hz=4):
+        self.config = config
+        self.applied_config = config
+        self.activity = SceneActivity()
+        self.refresh_hz = self._clamp(refresh_hz, config) if config.mode == "auto" else config.fixed_hz or refresh_hz
+        self.last_change = -math.inf
+        self.calm_since = None
+        self.overload = 0.0  # smoothed fraction of frames that overran their period
+        self.ceiling = None  # highest rate the loop kept up with, after an overload
+        self.ceiling_until = -math.inf
+        REFRESH_HZ.set(self.refresh_hz)
+
+    @staticmethod
+    def _clamp(refresh_hz, config):
+        """Nearest refresh rate step within the limits."""
+        allowed = [s for s in RATE_STEPS if config.min_hz <= s <= config.max_hz]
+        return min(allowed, key=lambda s: abs(math.log(s / refresh_hz)))
+
+    def configure(self, config):
+        """Swap in a new config; the next update() applies it."""
+        self.config = config
+
+    def notice(self, reason, wall_time=0.0):
+        return RateChange(self.refresh_hz, self.refresh_hz / SUBPAGES_PER_FRAME, reason,
+                          self.activity.change, self.activity.gradient, wall_time)
+
+    def update(self, frame, hotspots, now, overran=False):
+        """Feed one frame. Returns the new refresh rate and its reason, or None to stay."""
+        self.activity.update(frame, now)
+        self.overload += OVERLOAD_SMOOTHING * ((1.0 if overran else 0.0) - self.overload)
+        config = self.config
+        if config is not self.applied_config:
+            self.applied_config = config
+            self.calm_since = None
+            self.ceiling_until = -math.inf
+            if config.mode == "fixed":
+                target = config.fixed_hz or self.refresh_hz
+            else:
+                target = self._clamp(self.refresh_hz, config)
+            return self._change(target, "command", now)
+        if config.mode == "fixed":
+            return None
+
+        activity = self.activity
+        steps = [s for s in RATE_STEPS if config.min_hz <= s <= config.max_hz]
+        # The rate can sit off the steps (a fixed start between them, or a revert()); step from the nearest
+        index = steps.index(self._clamp(self.refresh_hz, config))
+        busy = activity.change >= config.change_up or activity.gradient >= config.gradient_up
+        calm = (not hotspots and activity.change <= config.change_down
+                and activity.gradient <= config.gradient_down)
+        self.calm_since = (self.calm_since or now) if calm else None
+
+        if self.overload >= OVERLOAD_LIMIT:
+            if index > 0 and now - self.last_change >= UP_DWELL:
+                self.overload = 0.0
+                self.ceiling, self.ceiling_until = steps[index - 1], now + OVERLOAD_HOLD
+                return self._change(steps[index - 1], "overload", now)
+            return None
+        top = min(self.ceiling, steps[-1]) if now < self.ceiling_until else steps[-1]
+        if self.overload < OVERLOAD_SMOOTHING:  # not overrunning: room to speed up
+            if hotspots and self.refresh_hz < top:
+                return self._change(top, "hotspot", now)
+            if busy and self.refresh_hz < top and now - self.last_change >= UP_DWELL:
+                return self._change(steps[index + 1], "activity", now)
+        if calm and index > 0 and now - self.calm_since >= config.calm_seconds:
+            self.calm_since = now  # another full calm period before the next step down
+            return self._change(steps[index - 1], "calm", now)
+        return None
+
+    def _change(self, refresh_hz, reason, now):
+        if refresh_hz == self.refresh_hz:
+            return None
+        self.refresh_hz = refresh_hz
+        self.last_change = now
+        REFRESH_HZ.set(refresh_hz)
+        RATE_CHANGES.labels(reason).inc()
+        return refresh_hz, reason
+
+    def revert(self, refresh_hz):
+        """The sensor refused the last change: back to `refresh_hz`."""
+        self.refresh_hz = refresh_hz
+        REFRESH_HZ.set(refresh_hz)
+
+    def status(self):
+        activity = self.activity
+        return (f"{self.refresh_hz:g} Hz ({self.refresh_hz / SUBPAGES_PER_FRAME:g} frames/s), "
+                f"change {activity.change:.2f} °C/s, gradient {activity.gradient:.2f} °C/px, "
+                f"overruns {100 * self.overload:.0f}%\n{self.config.describe()}")
@@ -0,0 +1,170 @@
+"""Thermal sensor backends.
+
+All backends share the adafruit_mlx90640 interface the flight software
+uses: getFrame(framebuf) fills 768 temperatures (°C, row-major 24x32) into
+any mutable sequence and may raise RuntimeError on a bad read.
+
+  mlx        the real MLX90640 over I2C (hardware libraries imported lazily)
+  mlx-fast   the same sensor read raw, calibrated with NumPy (mlx90640.py);
+             identical temperatures at a fraction of the CPU time
+  synthetic  generated scenes: ambient drift, noise, moving/growing hotspots
+  replay     recorded frames, looped: a .npy array of shape (N, 768), a raw
+             sensor dump (.npz, see mlx90640.py), or a stream of downlink
+             frames such as the output of
+             curl "<ground>/api/history?format=i16" > capture.fsf
+
+The simulated backends return immediately; the acquisition loop paces
+them, so they can run far beyond the sensor's own refresh rates.
+"""
+import math
+
+import numpy as np
+
+from common import codec, protocol
+import mlx90640
+import profiling
+
+BACKENDS = ("mlx", "mlx-fast", "synthetic", "replay")
+
+# MLX90640 refresh rates (Hz) -> adafruit_mlx90640.RefreshRate member names
+MLX_REFRESH_RATES = {
+    0.5: "REFRESH_0_5_HZ", 1: "REFRESH_1_HZ", 2: "REFRESH_2_HZ", 4: "REFRESH_4_HZ",
+    8: "REFRESH_8_HZ", 16: "REFRESH_16_HZ", 32: "REFRESH_32_HZ", 64: "REFRESH_64_HZ",
+}
+
+
+def open_mlx(refresh_hz=4, fast=False):
+    """The real sensor. Returns None if the hardware is not available."""
+    try:
+        import board
+        import busio
+        i2c = busio.I2C(board.SCL, board.SDA, frequency=mlx90640.I2C_FREQUENCY)
+        if fast:
+            mlx = mlx90640.RawMLX90640(i2c, refresh_hz)
+        else:
+            import adafruit_mlx90640
+            mlx = adafruit_mlx90640.MLX90640(i2c)
+            mlx.refresh_rate = getattr(adafruit_mlx90640.RefreshRate, MLX_REFRESH_RATES[refresh_hz])
+        return profiling.instrument_mlx(mlx, profiling.PROFILER.timers)
+    except Exception as e:
+        print(f"[SAT] ❌ Sensor Error: {e}")
+        return None
+
+
+def set_refresh_rate(sensor, refresh_hz):
+    """Retime the real sensor. Simulated backends are paced by the acquisition loop alone."""
+    if isinstance(sensor, mlx90640.RawMLX90640):
+        sensor.set_refresh_rate(refresh_hz)
+    elif type(sensor).__module__ == "adafruit_mlx90640":
+        import adafruit_mlx90640
+        sensor.refresh_rate = getattr(adafruit_mlx90640.RefreshRate, MLX_REFRESH_RATES[refresh_hz])
+
+
+class Hotspot:
+    def __init__(self, rng, rows, cols):
+        self.y = rng.uniform(0, rows)
+        self.x = rng.uniform(0, cols)
+        self.vy = rng.uniform(-0.3, 0.3)
+        self.vx = rng.uniform(-0.3, 0.3)
+        self.peak = rng.uniform(15.0, 60.0)    # °C above ambient
+        self.growth = rng.uniform(0.0, 0.05)   # °C per frame
+        self.radius = rng.uniform(1.0, 3.0)    # pixels (gaussian sigma)
+
+
+class SyntheticSensor:
+    """Parameterized synthetic scenes for load tests and CI."""
+
+    def __init__(self, hotspots=2, ambient=22.0, drift=1.5, drift_period=600,
+                 noise=0.15, error_rate=0.0, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.ambient = ambient
+        self.drift = drift
+        self.drift_period = drift_period  # frames per ambient cycle
+        self.noise = noise
+        self.error_rate = error_rate
+        self.frame_index = 0
+        rows, cols = protocol.SENSOR_ROWS, protocol.SENSOR_COLS
+        self.hotspots = [Hotspot(self.rng, rows, cols) for _ in range(hotspots)]
+        self.yy, self.xx = np.mgrid[0:rows, 0:cols].astype(np.float32)
+        # Fixed lens falloff, like the real sensor's warmer centre
+        self.vignette = 0.8 * np.exp(-((self.yy - rows / 2) ** 2 + (self.xx - cols / 2) ** 2) / 300.0)
+        self.scene = np.empty((rows, cols), dtype=np.float32)
+
+    def step(self):
+        """Advance the scene one frame; returns the 24x32 array (reused buffer)."""
+        rows, cols = self.scene.shape
+        phase = 2 * math.pi * self.frame_index / self.drift_period
+        scene = self.scene
+        scene[:] = self.ambient + self.drift * math.sin(phase)
+        scene += self.vignette
+        for spot in self.hotspots:
+            spot.y += spot.vy
+            spot.x += spot.vx
+            if not 0 <= spot.y < rows: spot.vy = -spot.vy
+            if not 0 <= spot.x < cols: spot.vx = -spot.vx
+            spot.peak += spot.growth
+            dist2 = (self.yy - spot.y) ** 2 + (self.xx - spot.x) ** 2
+            scene += spot.peak * np.exp(-dist2 / (2 * spot.radius ** 2))
+        if self.noise:
+            scene += self.rng.normal(0.0, self.noise, scene.shape).astype(np.float32)
+        self.frame_index += 1
+        return scene
+
+    def getFrame(self, framebuf):
+        if self.error_rate and self.rng.random() < self.error_rate:
+            raise RuntimeError("Simulated I2C read failure")
+        framebuf[:] = self.step().ravel()
+
+
+class _FileSource:
+    """Lets protocol.FrameReader read from a file instead of a socket."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def recv_into(self, buf):
+        return self.f.readinto(buf)
+
+
+def load_recording(path):
+    """Load a recording as a float32 array of shape (N, 768)."""
+    if path.endswith(".npy"):
+        frames = np.load(path).astype(np.float32).reshape(-1, protocol.PIXELS)
+    elif path.endswith(".npz"):
+        frames = mlx90640.decode_dump(path)
+    else:
+        decoder = codec.FrameDecoder()
+        frames = []
+        with open(path, "rb") as f:
+            reader = protocol.FrameReader(_FileSource(f))
+            while True:
+                frame = reader.read_frame()
+                if frame is None:
+                    break
+                pixels = decoder.decode(*frame)
+                if pixels is not None:
+                    frames.append(np.array(pixels, dtype=np.float32))
+        frames = np.array(frames, dtype=np.float32).reshape(-1, protocol.PIXELS)
+    if not len(frames):
+        raise ValueError(f"{path}: no frames found")
+    return frames
+
+
+class ReplaySensor:
+    """Plays back a recording in a loop."""
+
+    def __init__(self, path):
+        self.frames = load_recording(path)
+        self.index = 0
+
+    def getFrame(self, framebuf):
+        framebuf[:] = self.frames[self.index]
+        self.index = (self.index + 1) % len(self.frames)
+
+
+def open_sensor(backend="mlx", refresh_hz=4, replay_path=None, seed=None, hotspots=2):
+    if backend == "synthetic":
+        return SyntheticSensor(hotspots=hotspots, seed=seed)
+    if backend == "replay":
+        return ReplaySensor(replay_path)
+    return open_mlx(refresh_hz, fast=backend == "mlx-fast")
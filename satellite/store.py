@@ -0,0 +1,279 @@
+"""Onboard store-and-forward: frames outlive a lost downlink.
+
+While no ground station that takes backfill is connected (it lists
+ENC_STORED in its HELLO, see common/protocol.py), a Recorder thread
+follows the FrameRing and appends every frame to a FrameStore on the SD
+card. After a station reconnects, its downlink subscriber forwards the
+backlog oldest first in the idle time between live frames (downlink.py).
+Live frames always go first.
+
+The store is one preallocated file used as a ring of BLOCK_SIZE blocks,
+laid out to be easy on flash:
+
+  - Frames are buffered in RAM and written one whole, aligned block at a
+    time, so the card never has to read-modify-write a partial page.
+  - Blocks are written strictly in order around the ring, each exactly
+    once per lap, which spreads wear evenly over the file. A block
+    flushed before it is full (the link came back, or FLUSH_INTERVAL
+    passed) is padded and never appended to.
+  - There is no index to keep rewriting. Every block header carries a
+    block sequence number and a CRC, and opening the store rebuilds its
+    state from them. The only other write is a tiny .sent file that
+    marks how far the backlog has been forwarded. It is replaced at most
+    every STATE_INTERVAL.
+
+An outage longer than the store overwrites the oldest blocks. After a
+reboot, blocks past the .sent mark are forwarded again; the ground drops
+frames it already has.
+"""
+import os
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from common import codec, metrics, protocol
+from profiling import PROFILER
+
+STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "store.fss")
+STORE_MB = 64            # ~50k frames, about 7 hours at 2 frames/s
+BLOCK_SIZE = 64 * 1024   # write unit; a multiple of SD card pages, ~45 frames
+FLUSH_INTERVAL = 60.0    # s; longest a recorded frame waits in RAM
+STATE_INTERVAL = 60.0    # s between .sent updates while forwarding
+STORED_ENCODING = protocol.ENC_INT16_DELTA_ZLIB  # every record a keyframe, see ENC_STORED
+
+BLOCK_MAGIC = b"FSSTORE1"
+BLOCK_HEADER = struct.Struct("<8sQIII")  # magic, block seq, records, bytes used, CRC32 of the records
+RECORD = struct.Struct("<IdH")           # frame seq, capture time, payload length; payload follows
+
+STORED_FRAMES = metrics.counter("flamesat_store_frames_total", "Frames written to the onboard store")
+STORE_BYTES = metrics.counter("flamesat_store_bytes_written_total", "Bytes written to the onboard store (whole blocks)")
+STORE_OVERWRITTEN = metrics.counter("flamesat_store_overwritten_frames_total",
+                                    "Stored frames overwritten before they were forwarded")
+STORE_PENDING = metrics.gauge("flamesat_store_pending_frames", "Stored frames not yet forwarded")
+
+
+class FrameStore:
+    """Ring of fixed-size blocks in one preallocated file. Thread-safe."""
+
+    def __init__(self, path=STORE_FILE, size_mb=STORE_MB):
+        self.path = path
+        self.state_path = path + ".sent"
+        self.blocks = max(2, int(size_mb * 1024 * 1024) // BLOCK_SIZE)
+        size = self.blocks * BLOCK_SIZE
+        fresh = not os.path.exists(path) or os.path.getsize(path) != size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if fresh:
+            # A new or resized store starts empty: block positions depend on the size
+            os.ftruncate(self.fd, 0)
+            os.ftruncate(self.fd, size)
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(self.fd, 0, size)
+
+        # Recover which block sequence sits where from the block headers
+        self.block_seqs = np.full(self.blocks, -1, dtype=np.int64)
+        self.counts = np.zeros(self.blocks, dtype=np.int64)
+        for index in range(self.blocks):
+            magic, seq, count, _, _ = BLOCK_HEADER.unpack(os.pread(self.fd, BLOCK_HEADER.size, index * BLOCK_SIZE))
+            if magic == BLOCK_MAGIC and seq % self.blocks == index:
+                self.block_seqs[index], self.counts[index] = seq, count
+        self.head = int(self.block_seqs.max()) + 1  # sequence of the next block to write
+        self.sent = -1  # every block up to this sequence has reached the ground
+        if not fresh:
+            try:
+                with open(self.state_path) as f:
+                    self.sent = int(f.read())
+            except (OSError, ValueError):
+                pass
+        self.sent_saved = self.sent
+        self.state_time = 0.0
+
+        self.buffer = bytearray(BLOCK_SIZE)
+        self.used = BLOCK_HEADER.size
+        self.buffered = 0  # records in the buffer
+        self.buffer_time = 0.0
+        self.owner = None  # subscriber currently forwarding the backlog
+        self.overwritten = 0
+        self.lock = threading.Lock()
+        STORE_PENDING.set(self.pending())
+
+    def append(self, seq, timestamp, payload):
+        """Buffer one frame; a full buffer is written out as the next block."""
+        size = RECORD.size + len(payload)
+        with self.lock:
+            if self.used + size > BLOCK_SIZE:
+                self._write_block()
+            if not self.buffered:
+                self.buffer_time = time.monotonic()
+            RECORD.pack_into(self.buffer, self.used, seq & 0xFFFFFFFF, timestamp, len(payload))
+            self.buffer[self.used + RECORD.size:self.used + size] = payload
+            self.used += size
+            self.buffered += 1
+        STORED_FRAMES.inc()
+
+    def flush(self, older_than=0.0):
+        """Write out the buffered frames, if the oldest has waited `older_than` seconds."""
+        with self.lock:
+            if self.buffered and time.monotonic() - self.buffer_time >= older_than:
+                self._write_block()
+
+    def _write_block(self):
+        """Write the buffer as the next block in the ring (caller holds the lock)."""
+        seq, count = self.head, self.buffered
+        index = seq % self.blocks
+        if self.block_seqs[index] > self.sent:
+            self.overwritten += int(self.counts[index])
+            STORE_OVERWRITTEN.inc(int(self.counts[index]))
+        crc = zlib.crc32(memoryview(self.buffer)[BLOCK_HEADER.size:self.used])
+        BLOCK_HEADER.pack_into(self.buffer, 0, BLOCK_MAGIC, seq, count, self.used, crc)
+        self.buffer[self.used:] = bytes(BLOCK_SIZE - self.used)
+        # Whatever happens, this block's turn is used up: never write the same spot twice per lap
+        self.head += 1
+        self.block_seqs[index], self.counts[index] = -1, 0
+        self.used, self.buffered = BLOCK_HEADER.size, 0
+        os.pwrite(self.fd, self.buffer, index * BLOCK_SIZE)
+        os.fdatasync(self.fd)
+        self.block_seqs[index], self.counts[index] = seq, count
+        STORE_BYTES.inc(BLOCK_SIZE)
+        STORE_PENDING.set(self.pending())
+
+    def pending(self, after=-1):
+        """Frames on disk not yet forwarded, in blocks after block sequence `after`."""
+        return int(self.counts[self.block_seqs > max(after, self.sent)].sum())
+
+    def next_block(self, owner, after=-1):
+        """Oldest unforwarded block after sequence `after`, for `owner` only.
+
+        Returns (block seq, [(frame seq, capture time, payload)], frames in later
+        blocks), or None when there is nothing to send or another subscriber
+        is forwarding.
+        """
+        with self.lock:
+            if self.owner is not None and self.owner is not owner:
+                return None
+            while True:
+                candidates = self.block_seqs[self.block_seqs > max(after, self.sent)]
+                if not len(candidates):
+                    return None
+                self.owner = owner
+                seq = int(candidates.min())
+                records = self._read_block(seq)
+                if records is not None:
+                    return seq, records, self.pending(seq)
+                self.block_seqs[seq % self.blocks] = -1
+
+    def _read_block(self, seq):
+        """Records of block `seq`, or None if it does not check out (caller holds the lock)."""
+        data = os.pread(self.fd, BLOCK_SIZE, (seq % self.blocks) * BLOCK_SIZE)
+        magic, block_seq, count, used, crc = BLOCK_HEADER.unpack_from(data)
+        if (magic != BLOCK_MAGIC or block_seq != seq or used > BLOCK_SIZE
+                or zlib.crc32(memoryview(data)[BLOCK_HEADER.size:used]) != crc):
+            print(f"[SAT] ⚠️ Store block {seq} is corrupt, skipping it")
+            return None
+        records, offset = [], BLOCK_HEADER.size
+        for _ in range(count):
+            frame_seq, timestamp, length = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            records.append((frame_seq, timestamp, data[offset:offset + length]))
+            offset += length
+        return records
+
+    def confirm(self, owner, seq):
+        """Blocks up to `seq` reached the ground; they will not be forwarded again."""
+        with self.lock:
+            if owner is not self.owner or seq <= self.sent:
+                return
+            self.sent = seq
+            if time.monotonic() - self.state_time >= STATE_INTERVAL or not self.pending():
+                self._save_state()
+        STORE_PENDING.set(self.pending())
+
+    def release(self, owner):
+        """The forwarding subscriber left; unconfirmed blocks go out again next time."""
+        with self.lock:
+            if owner is not self.owner:
+                return
+            self.owner = None
+            self._save_state()
+
+    def _save_state(self):
+        if self.sent == self.sent_saved:
+            return
+        self.state_time = time.monotonic()
+        tmp = self.state_path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(f"{self.sent}\n")
+            os.replace(tmp, self.state_path)
+            self.sent_saved = self.sent
+        except OSError as e:
+            print(f"[SAT] ⚠️ Could not save store state: {e}")
+
+    def summary(self):
+        return (f"{self.path}, {self.blocks * BLOCK_SIZE / (1024 * 1024):g} MB, "
+                f"{self.pending() + self.buffered} frames to forward")
+
+
+class Recorder:
+    """Follows the FrameRing on its own thread and stores every frame while recording."""
+
+    def __init__(self, ring, store):
+        self.ring = ring
+        self.store = store
+        self.encoder = codec.FrameEncoder(STORED_ENCODING, keyframe_interval=0)
+        self.frame = np.zeros(protocol.PIXELS, dtype=np.float32)
+        self.recording = True  # nobody is connected at boot
+        self.cursor = 0
+        self.missed = 0  # frames the ring overwrote before they were stored
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def start_recording(self, since):
+        """Record from the oldest frame in the ring captured at or after `since`."""
+        with self.lock:
+            if not self.recording:
+                self.cursor = self.ring.first_since(since)
+                self.recording = True
+
+    def stop_recording(self):
+        """Stop, and write out what is buffered so it can be forwarded now."""
+        with self.lock:
+            self.recording = False
+            try:
+                self.store.flush()
+            except OSError as e:
+                print(f"[SAT] ❌ Store Write Failed: {e}")
+
+    def run(self):
+        while True:
+            latest = self.ring.wait_for(self.cursor, timeout=1.0)
+            try:
+                with self.lock:
+                    if self.recording:
+                        self._record(latest)
+                    else:
+                        self.cursor = max(self.cursor, latest + 1)
+                    self.store.flush(FLUSH_INTERVAL)
+            except OSError as e:
+                print(f"[SAT] ❌ Store Write Failed: {e}")
+                time.sleep(1)
+
+    def _record(self, latest):
+        if latest - self.cursor >= self.ring.size:
+            skip = latest - self.ring.size + 1
+            self.missed += skip - self.cursor
+            self.cursor = skip
+        while self.cursor <= latest:
+            seq = self.cursor
+            self.cursor += 1
+            capture_time = self.ring.read(seq, self.frame)
+            if capture_time is None:
+                self.missed += 1
+                continue
+            with PROFILER.time("store"):
+                payload, _ = self.encoder.encode(self.frame)
+                self.store.append(seq, capture_time, payload)
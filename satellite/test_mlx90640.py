@@ -0,0 +1,111 @@
+"""Vectorized calibration vs adafruit_mlx90640, on fixed synthetic EEPROM and subpage dumps.
+
+    cd satellite && python3 -m unittest test_mlx90640
+
+Skipped unless the reference is installed (pip install adafruit-circuitpython-mlx90640).
+"""
+import unittest
+
+import numpy as np
+
+import mlx90640
+
+try:
+    import adafruit_mlx90640  # noqa: F401  (used through mlx90640.reference_model)
+    HAVE_REFERENCE = True
+except ImportError:
+    HAVE_REFERENCE = False
+
+TOLERANCE = 1e-6  # °C, as `mlx90640.py verify`
+SCALARS = ("kVdd", "vdd25", "KvPTAT", "KtPTAT", "vPTAT25", "alphaPTAT", "gainEE", "tgc", "resolutionEE",
+           "KsTa", "ksTo", "cpAlpha", "cpOffset", "cpKta", "cpKv", "alphaScale", "ktaScale", "kvScale",
+           "calibrationModeEE", "ilChessC")
+PER_PIXEL = ("alpha", "offset", "kta", "kv")
+
+
+def synthetic_eeprom(seed, interleaved=False, deviating=()):
+    """EEPROM words in the ranges a real sensor has; `deviating` is [(pixel, "broken" | "outlier")]."""
+    rng = np.random.default_rng(seed)
+    draw = lambda low, high: int(rng.integers(low, high))
+    ee = np.zeros(mlx90640.EEPROM_WORDS, dtype=np.int64)
+    ee[10] = 0x0800 if interleaved else 0
+    ee[16] = (4 << 12) | (4 << 8) | (3 << 4) | 2
+    ee[17] = (-60 - draw(0, 30)) & 0xFFFF
+    ee[18:32] = rng.integers(0, 65536, 14)
+    ee[32] = (draw(0, 3) << 12) | (draw(1, 4) << 8) | (draw(1, 4) << 4) | draw(0, 3)
+    ee[33] = draw(9000, 16000)
+    ee[34:48] = rng.integers(0, 65536, 14)
+    ee[48] = draw(6000, 6800)
+    ee[49] = draw(22000, 22400)
+    ee[50] = (22 << 10) | 338
+    ee[51] = (0x9D << 8) | 0x68
+    ee[52:56] = rng.integers(0, 65536, 4)
+    ee[56] = (2 << 12) | (draw(0, 8) << 8) | (draw(0, 8) << 4) | draw(0, 4)
+    ee[57] = (draw(0, 64) << 10) | draw(20, 100)
+    ee[58] = (draw(0, 64) << 10) | (-70 & 0x3FF)
+    ee[59] = draw(0, 65536)
+    ee[60] = (draw(0, 256) << 8) | draw(0, 32)
+    ee[61:63] = rng.integers(0, 65536, 2)
+    ee[63] = (1 << 12) | (draw(3, 8) << 8) | (draw(1, 6) << 4) | 9
+    pix = rng.integers(1, 32768, mlx90640.PIXELS) * 2  # even and non-zero: no deviating pixels
+    for pixel, kind in deviating:
+        pix[pixel] = 0 if kind == "broken" else pix[pixel] | 1
+    ee[64:] = pix
+    return ee.astype(np.uint16)
+
+
+def synthetic_subpages(seed, count, chess=True):
+    """Raw subpages (RAM, control register, subpage number) of a scene with one hot patch."""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(-200, 200, mlx90640.PIXELS)
+    out = np.empty((count, mlx90640.SUBPAGE_WORDS), dtype=np.uint16)
+    for i in range(count):
+        words = np.zeros(mlx90640.SUBPAGE_WORDS, dtype=np.int64)
+        words[:mlx90640.PIXELS] = base + rng.integers(-20, 20, mlx90640.PIXELS)
+        words[600:610] += 3000
+        words[768] = 4700 + rng.integers(-50, 50)     # VBE
+        words[776] = -20 + rng.integers(-5, 5)        # compensation pixel, subpage 0
+        words[778] = 6380 + rng.integers(-30, 30)     # gain
+        words[800] = 1700 + rng.integers(-30, 30)     # PTAT
+        words[808] = -22 + rng.integers(-5, 5)        # compensation pixel, subpage 1
+        words[810] = -13056 + rng.integers(-100, 100)  # VDD
+        words[832] = 0x0901 | (0x1000 if chess else 0)
+        words[833] = i % 2
+        out[i] = words & 0xFFFF
+    return out
+
+
+@unittest.skipUnless(HAVE_REFERENCE, "adafruit_mlx90640 (the reference) is not installed")
+class CalibrationTest(unittest.TestCase):
+    CASES = [  # seed, calibrated interleaved, read in chess mode, deviating pixels
+        (1, False, True, ()),
+        (2, True, False, ()),
+        (3, False, False, [(100, "broken"), (400, "outlier")]),
+        (4, True, True, [(37, "outlier"), (700, "broken")]),
+    ]
+
+    def test_parameters_match_reference(self):
+        for seed, interleaved, _, deviating in self.CASES:
+            with self.subTest(seed=seed):
+                eeprom = synthetic_eeprom(seed, interleaved, deviating)
+                ours, reference = mlx90640.Calibration(eeprom), mlx90640.reference_model(eeprom)
+                for name in SCALARS:
+                    self.assertEqual(getattr(ours, name), getattr(reference, name), name)
+                self.assertEqual(ours.ct, reference.ct[:4])
+                for name in PER_PIXEL:
+                    np.testing.assert_array_equal(getattr(ours, name), getattr(reference, name), name)
+                self.assertEqual(list(ours.bad_pixels), sorted(reference.brokenPixels + reference.outlierPixels))
+
+    def test_temperatures_match_reference(self):
+        for seed, interleaved, chess, deviating in self.CASES:
+            with self.subTest(seed=seed):
+                eeprom = synthetic_eeprom(seed, interleaved, deviating)
+                subpages = synthetic_subpages(seed, 6, chess)
+                ours = mlx90640.decode_subpages(mlx90640.Calibration(eeprom), subpages)
+                reference = mlx90640.reference_subpages(mlx90640.reference_model(eeprom), subpages)
+                self.assertTrue(np.isfinite(ours).all())
+                np.testing.assert_allclose(ours, reference, rtol=0, atol=TOLERANCE)
+
+
+if __name__ == "__main__":
+    unittest.main()
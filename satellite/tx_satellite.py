@@ -1,17 +1,29 @@
+import argparse
 import socket
 import time
-import struct
-import board
-import busio
-import adafruit_mlx90640
 import threading
-import subprocess
 import os
+import sys
 import json
 
+# Shared code (wire protocol, detection) lives in ../common
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import detection, metrics
+import acquisition
+import downlink
+import processing
+import profiling
+import rate_policy
+import sensors
+import store
+import uplink
+
 # --- CONFIGURATION ---
 TELEM_PORT = 5000
 CMD_PORT = 5001
+STATS_PORT = 5002  # Prometheus /metrics (HTTP); 0 disables
+SENSOR_REFRESH_HZ = 4  # MLX90640 subpage rate; getFrame() reads two subpages
+FIRE_THRESHOLD = 40.0  # °C, for onboard hotspot detection
 SECRETS_FILE = "secrets.json"
 
 # Load Secret Password
@@ -26,101 +38,131 @@ except Exception:
 if not COMMAND_PASSWORD:
     print("[SAT] ❌ NO PASSWORD SET. COMMAND LINK DISABLED FOR SECURITY.")
 
-def init_sensor():
-    print("[SAT] Initializing Sensors...")
+telemetry_hub = None  # set once the downlink is up
+refresh_policy = None  # rate_policy.RatePolicy
+
+def init_sensor(backend="mlx", replay_path=None, seed=None, refresh_hz=SENSOR_REFRESH_HZ):
+    print(f"[SAT] Initializing Sensors ({backend})...")
     try:
-        i2c = busio.I2C(board.SCL, board.SDA, frequency=800000)
-        mlx = adafruit_mlx90640.MLX90640(i2c)
-        mlx.refresh_rate = adafruit_mlx90640.RefreshRate.REFRESH_4_HZ
-        return mlx
+        return sensors.open_sensor(backend, refresh_hz, replay_path=replay_path, seed=seed)
     except Exception as e:
         print(f"[SAT] ❌ Sensor Error: {e}")
         return None
 
+def run_onboard_command(command_str):
+    """Commands handled by the flight software itself. Returns the reply, or None for shell commands."""
+    words = command_str.split()
+    if words and words[0] == "prof":
+        try:
+            return profiling.PROFILER.command(words[1:])
+        except ValueError as e:
+            return f"❌ {e}"
+    if words and words[0] == "rate":
+        try:
+            config = rate_policy.parse_command(words[1:], refresh_policy.config)
+        except ValueError as e:
+            return f"❌ {e}"
+        if config != refresh_policy.config:
+            refresh_policy.configure(config)
+            return f"✅ Refresh rate: {config.describe()}"
+        return f"Refresh rate: {refresh_policy.status()}"
+    if not words or words[0] != "proc":
+        return None
+    if telemetry_hub is None:
+        return "❌ Downlink not running"
+    try:
+        config = processing.parse_command(words[1:], telemetry_hub.processing)
+    except ValueError as e:
+        return f"❌ {e}"
+    if config != telemetry_hub.processing:
+        telemetry_hub.set_processing(config)
+    return f"✅ Processing: {config.describe()}"
+
 def command_listener():
     if not COMMAND_PASSWORD:
         return
+    # Concurrent sessions with streamed output; "PASSWORD|COMMAND" clients still work
+    uplink.CommandService(COMMAND_PASSWORD, CMD_PORT, onboard=run_onboard_command).serve_forever()
 
-    cmd_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    cmd_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    cmd_socket.bind(('0.0.0.0', CMD_PORT))
-    cmd_socket.listen(1)
-    print(f"[SAT] Secure Command Uplink Active on Port {CMD_PORT}")
+def telemetry_sender(mlx, policy, mode="continuous", frame_store=None):
+    global telemetry_hub
+    ring = acquisition.FrameRing()
+    # While no ground station is connected, frames go to the SD card for backfill later
+    recorder = store.Recorder(ring, frame_store) if frame_store else None
+    if recorder:
+        recorder.start()
+    # Every connected ground station streams from the ring independently
+    hub = telemetry_hub = downlink.TelemetryHub(ring, TELEM_PORT, mode=mode, recorder=recorder)
+    hub.set_rate(policy.notice("initial", time.time()))
 
-    while True:
-        try:
-            conn, addr = cmd_socket.accept()
-            # Receive packet
-            raw_data = conn.recv(4096).strip().decode('utf-8')
-            
-            # AUTHENTICATION CHECK
-            # Format must be: "PASSWORD|COMMAND"
-            if "|" in raw_data:
-                password, command_str = raw_data.split("|", 1)
-                
-                if password == COMMAND_PASSWORD:
-                    # --- AUTH SUCCESS ---
-                    print(f"[SAT] ⚠️ Executing: {command_str}")
-                    try:
-                        result = subprocess.run(
-                            command_str, 
-                            shell=True, 
-                            capture_output=True, 
-                            text=True, 
-                            timeout=10
-                        )
-                        output = result.stdout + result.stderr
-                        if not output: output = "✅ Executed (No Output)"
-                        conn.sendall(output.encode('utf-8'))
-                    except Exception as e:
-                        conn.sendall(f"❌ Error: {str(e)}".encode('utf-8'))
-                else:
-                    # --- AUTH FAIL ---
-                    print(f"[SAT] 🛑 Auth Failed from {addr}")
-                    conn.sendall(b"ERR: ACCESS DENIED")
-            else:
-                conn.sendall(b"ERR: INVALID FORMAT")
-            
-            conn.close()
-        except Exception as e:
-            print(f"[SAT] Command Listener Error: {e}")
-
-def telemetry_sender(mlx):
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    server_socket.bind(('0.0.0.0', TELEM_PORT))
-    server_socket.listen(1)
-    print(f"[SAT] Telemetry Downlink Active on Port {TELEM_PORT}")
-
-    frame = [0.0] * 768
+    # Acquisition runs on its own thread, paced to the sensor, into a shared ring;
+    # the policy retimes it (and the downlink queues) as the scene changes
+    detector = detection.HotspotDetector(threshold=FIRE_THRESHOLD)
+    acq = acquisition.Acquisition(mlx, ring, policy.refresh_hz / rate_policy.SUBPAGES_PER_FRAME, detector=detector,
+                                  policy=policy, on_rate_change=hub.set_rate)
+    acq.start()
+    hub.start()
 
     while True:
-        print("[SAT] Waiting for Telemetry Link...")
-        client_socket, addr = server_socket.accept()
-        print(f"[SAT] Telemetry Connected: {addr}")
+        time.sleep(profiling.SUMMARY_INTERVAL)
+        print(f"[SAT] Stage timings:\n{profiling.PROFILER.timers.report()}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="FLAMESAT flight software")
+    parser.add_argument("--sensor", choices=sensors.BACKENDS, default="mlx",
+                        help="sensor backend (synthetic/replay need no hardware)")
+    parser.add_argument("--replay", metavar="FILE", help="recording for --sensor replay (.npy, raw .npz dump or frame stream)")
+    parser.add_argument("--rate", type=float,
+                        help=f"frames per second (default {SENSOR_REFRESH_HZ / 2:g}; the start rate for auto)")
+    parser.add_argument("--refresh-policy", choices=rate_policy.RATE_MODES,
+                        help="auto: adapt the sensor refresh rate to scene activity; fixed: keep --rate "
+                             "(default: fixed with --rate or a simulated sensor, else auto)")
+    parser.add_argument("--min-refresh", type=float, default=rate_policy.MIN_REFRESH_HZ, choices=rate_policy.RATE_STEPS,
+                        help="lowest sensor refresh rate for auto, Hz")
+    parser.add_argument("--max-refresh", type=float, default=rate_policy.MAX_REFRESH_HZ, choices=rate_policy.RATE_STEPS,
+                        help="highest sensor refresh rate for auto, Hz")
+    parser.add_argument("--seed", type=int, help="random seed for --sensor synthetic")
+    parser.add_argument("--downlink", choices=downlink.DOWNLINK_MODES, default="continuous",
+                        help="event: full frames only on change/hotspot, stats packets in between")
+    parser.add_argument("--store", default=store.STORE_FILE, metavar="FILE",
+                        help="onboard store-and-forward log, backfilled to the ground after link loss")
+    parser.add_argument("--store-mb", type=float, default=store.STORE_MB, help="size of the store (0 = off)")
+    parser.add_argument("--telem-port", type=int, default=TELEM_PORT)
+    parser.add_argument("--cmd-port", type=int, default=CMD_PORT)
+    parser.add_argument("--stats-port", type=int, default=STATS_PORT, help="HTTP port for /metrics (0 = off)")
+    args = parser.parse_args()
+    if args.sensor == "replay" and not args.replay:
+        parser.error("--sensor replay needs --replay FILE")
+    TELEM_PORT, CMD_PORT, STATS_PORT = args.telem_port, args.cmd_port, args.stats_port
+
+    if STATS_PORT:
+        metrics.serve(STATS_PORT)
+        print(f"[SAT] Metrics on http://0.0.0.0:{STATS_PORT}/metrics")
 
+    if args.min_refresh > args.max_refresh:
+        parser.error("--min-refresh must not exceed --max-refresh")
+    # An explicit --rate, or a sensor that is not real, means that rate is wanted as is
+    mode = args.refresh_policy or ("fixed" if args.rate or args.sensor in ("synthetic", "replay") else "auto")
+    rate = args.rate or SENSOR_REFRESH_HZ / 2
+    rate_config = rate_policy.DEFAULT_CONFIG._replace(mode=mode, min_hz=args.min_refresh, max_hz=args.max_refresh)
+    refresh_policy = rate_policy.RatePolicy(rate_config, rate * rate_policy.SUBPAGES_PER_FRAME)
+    if refresh_policy.refresh_hz != rate * rate_policy.SUBPAGES_PER_FRAME:
+        print(f"[SAT] ⚠️ --rate {rate:g} snapped to {refresh_policy.refresh_hz / rate_policy.SUBPAGES_PER_FRAME:g} "
+              f"frames/s (auto refresh steps {args.min_refresh:g}-{args.max_refresh:g} Hz)")
+    print(f"[SAT] Refresh rate: {refresh_policy.status()}")
+
+    # A fixed --rate between the sensor's steps leaves the sensor at its default
+    sensor_hz = refresh_policy.refresh_hz if refresh_policy.refresh_hz in rate_policy.RATE_STEPS else SENSOR_REFRESH_HZ
+    sensor = init_sensor(args.sensor, args.replay, args.seed, sensor_hz)
+
+    frame_store = None
+    if args.store_mb > 0:
         try:
-            while True:
-                if mlx:
-                    try: mlx.getFrame(frame)
-                    except RuntimeError: continue
-                else:
-                    frame = [20.0] * 768
-
-                binary_data = struct.pack('768f', *frame)
-                client_socket.sendall(binary_data)
-                time.sleep(0.20)
-
-        except (BrokenPipeError, ConnectionResetError):
-            print("[SAT] Telemetry Link Lost.")
-            client_socket.close()
-        except Exception as e:
-            print(f"[SAT] Critical Error: {e}")
-            client_socket.close()
-            time.sleep(1)
+            frame_store = store.FrameStore(args.store, args.store_mb)
+            print(f"[SAT] Onboard store: {frame_store.summary()}")
+        except OSError as e:
+            print(f"[SAT] ❌ Onboard store unavailable, frames will be lost while the link is down: {e}")
 
-if __name__ == '__main__':
-    sensor = init_sensor()
     t_cmd = threading.Thread(target=command_listener, daemon=True)
     t_cmd.start()
-    telemetry_sender(sensor)
\ No newline at end of file
+    telemetry_sender(sensor, refresh_policy, args.downlink, frame_store)
\ No newline at end of file
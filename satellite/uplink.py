@@ -0,0 +1,286 @@
+"""Command uplink service (see common/command.py for the wire format).
+
+Each connection gets a session thread that authenticates once and then
+reads requests; commands run on a bounded worker pool, so several
+operators can work at once and a slow command never blocks a quick one.
+Output is streamed back in chunks while the command runs.
+
+Commands the flight software handles itself (`onboard`, e.g. the `proc`
+processing commands) answer immediately without a shell or a worker.
+"""
+import concurrent.futures
+import hmac
+import os
+import selectors
+import signal
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+from common import command, metrics
+
+COMMAND_WORKERS = 4     # commands running at once
+MAX_QUEUED = 16         # commands waiting for a worker before new ones are refused
+MAX_SESSIONS = 8
+MAX_TIMEOUT = 600       # s; upper bound for a client-requested timeout
+AUTH_TIMEOUT = 5        # s to send MAGIC + MSG_AUTH after connecting
+SEND_TIMEOUT = 30       # s a client may leave output unread before its session is dropped
+CHUNK = 4096
+LEGACY_MAX = 64 * 1024  # largest "PASSWORD|COMMAND" request accepted
+LEGACY_QUIET = 0.2      # s of silence that ends a legacy request
+
+COMMANDS = metrics.counter("flamesat_uplink_commands_total", "Uplink commands by outcome", ("result",))
+COMMAND_SECONDS = metrics.histogram("flamesat_uplink_command_seconds", "Shell command run time",
+                                    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0, 600.0))
+AUTH_FAILURES = metrics.counter("flamesat_uplink_auth_failures_total", "Rejected uplink passwords")
+SESSIONS = metrics.gauge("flamesat_uplink_sessions", "Open uplink sessions")
+
+
+class Session:
+    def __init__(self, service, sock, addr):
+        self.service = service
+        self.sock = sock
+        self.addr = addr
+        self.send_lock = threading.Lock()
+        self.alive = True
+
+    def send(self, msg_type, request_id, payload=b""):
+        """Send one message; False once the client has gone (the command keeps running to its end).
+
+        A client that stops reading fails the send after SEND_TIMEOUT. A
+        message may then be cut short, so the session is dropped, not
+        just the message: later output is discarded and the session
+        thread sees the socket close.
+        """
+        if not self.alive:
+            return False
+        try:
+            with self.send_lock:
+                if self.alive:
+                    self.sock.sendall(command.pack(msg_type, request_id, payload))
+                    return True
+        except OSError:
+            self.alive = False
+            try: self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
+        return False
+
+    def run(self):
+        try:
+            self.sock.settimeout(AUTH_TIMEOUT)
+            head = command.recv_exact(self.sock, len(command.MAGIC))
+            if head is None:
+                return
+            if head != command.MAGIC:
+                self.service.legacy(self.sock, self.addr, head)
+                return
+
+            message = command.read_message(self.sock)
+            if message is None or message[0] != command.MSG_AUTH or not self.service.check_password(message[2]):
+                print(f"[SAT] 🛑 Auth Failed from {self.addr}")
+                AUTH_FAILURES.inc()
+                self.send(command.MSG_ERROR, 0, b"ERR: ACCESS DENIED")
+                return
+            self.send(command.MSG_AUTH_OK, 0)
+            # Wait for requests indefinitely, but never let a worker block on a client that stopped reading
+            self.sock.settimeout(None)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack("ll", SEND_TIMEOUT, 0))
+
+            while True:
+                message = command.read_message(self.sock)
+                if message is None:
+                    break
+                msg_type, request_id, payload = message
+                if msg_type != command.MSG_EXEC or len(payload) < command.EXEC.size:
+                    self.send(command.MSG_ERROR, request_id, b"ERR: INVALID FORMAT")
+                    continue
+                timeout = command.EXEC.unpack_from(payload)[0] or command.DEFAULT_TIMEOUT
+                command_str = payload[command.EXEC.size:].decode("utf-8", "replace")
+                self.service.submit(self, request_id, command_str, min(timeout, MAX_TIMEOUT))
+        except (OSError, command.CommandError) as e:
+            print(f"[SAT] Command Session Error ({self.addr}): {e}")
+        finally:
+            self.alive = False
+            self.service.end_session(self)
+            try: self.sock.close()
+            except OSError: pass
+
+
+class CommandService:
+    def __init__(self, password, port, onboard=None, workers=COMMAND_WORKERS):
+        self.password = password.encode("utf-8")
+        self.port = port
+        self.onboard = onboard
+        self.pool = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix="uplink")
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.queued = 0
+        self.executed = 0
+
+    def check_password(self, candidate):
+        return hmac.compare_digest(candidate, self.password)
+
+    def serve_forever(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(('0.0.0.0', self.port))
+        server.listen(MAX_SESSIONS)
+        print(f"[SAT] Secure Command Uplink Active on Port {self.port}")
+        while True:
+            try:
+                conn, addr = server.accept()
+            except OSError as e:
+                print(f"[SAT] Command Listener Error: {e}")
+                continue
+            with self.lock:
+                full = len(self.sessions) >= MAX_SESSIONS
+                session = None if full else Session(self, conn, addr)
+                if session:
+                    self.sessions.add(session)
+                    SESSIONS.inc()
+            if full:
+                print(f"[SAT] 🛑 Uplink full, rejecting {addr}")
+                conn.close()
+                continue
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=session.run, daemon=True).start()
+
+    def end_session(self, session):
+        with self.lock:
+            if session not in self.sessions:
+                return
+            self.sessions.discard(session)
+        SESSIONS.dec()
+
+    def submit(self, session, request_id, command_str, timeout):
+        reply = self.onboard(command_str) if self.onboard else None
+        if reply is not None:
+            session.send(command.MSG_STDOUT, request_id, (reply + "\n").encode("utf-8"))
+            session.send(command.MSG_EXIT, request_id, command.EXIT.pack(0))
+            COMMANDS.labels("onboard").inc()
+            return
+        with self.lock:
+            busy = self.queued >= COMMAND_WORKERS + MAX_QUEUED
+            if not busy:
+                self.queued += 1
+        if busy:
+            session.send(command.MSG_ERROR, request_id, b"ERR: SATELLITE BUSY, try again")
+            COMMANDS.labels("busy").inc()
+            return
+        self.pool.submit(self._execute, session, request_id, command_str, timeout)
+
+    def _execute(self, session, request_id, command_str, timeout):
+        """Run one command, streaming its output as it appears (worker thread)."""
+        print(f"[SAT] ⚠️ Executing: {command_str}")
+        try:
+            with COMMAND_SECONDS.time():
+                code = run_streaming(command_str, timeout, lambda msg_type, data: session.send(msg_type, request_id, data))
+            session.send(command.MSG_EXIT, request_id, command.EXIT.pack(code))
+            COMMANDS.labels(outcome(code)).inc()
+        except Exception as e:
+            session.send(command.MSG_ERROR, request_id, f"❌ Error: {e}".encode("utf-8"))
+            COMMANDS.labels("error").inc()
+        finally:
+            with self.lock:
+                self.queued -= 1
+                self.executed += 1
+
+    def legacy(self, sock, addr, head):
+        """The original one-shot "PASSWORD|COMMAND" request; the reply is all output, then EOF."""
+        data = bytearray(head)
+        # Old clients send the request in one write and then wait for the reply,
+        # so the request is complete once the line goes quiet
+        sock.settimeout(LEGACY_QUIET)
+        try:
+            while len(data) < LEGACY_MAX:
+                chunk = sock.recv(CHUNK)
+                if not chunk:
+                    break
+                data += chunk
+        except socket.timeout:
+            pass
+        raw_data = data.strip().decode("utf-8", "replace")
+        if "|" not in raw_data:
+            sock.sendall(b"ERR: INVALID FORMAT")
+            return
+        password, command_str = raw_data.split("|", 1)
+        if not self.check_password(password.encode("utf-8")):
+            print(f"[SAT] 🛑 Auth Failed from {addr}")
+            AUTH_FAILURES.inc()
+            sock.sendall(b"ERR: ACCESS DENIED")
+            return
+        reply = self.onboard(command_str) if self.onboard else None
+        if reply is not None:
+            COMMANDS.labels("onboard").inc()
+        else:
+            with self.lock:
+                busy = self.queued >= COMMAND_WORKERS + MAX_QUEUED
+                if not busy:
+                    self.queued += 1
+            if busy:
+                COMMANDS.labels("busy").inc()
+                sock.sendall(b"ERR: SATELLITE BUSY, try again")
+                return
+            # On the worker pool like every other command; this session thread just waits
+            try:
+                output = self.pool.submit(self._execute_legacy, command_str).result()
+                reply = b"".join(output).decode("utf-8", "replace") or "✅ Executed (No Output)"
+            except Exception as e:
+                COMMANDS.labels("error").inc()
+                reply = f"❌ Error: {e}"
+        sock.settimeout(command.DEFAULT_TIMEOUT)
+        sock.sendall(reply.encode("utf-8"))
+
+    def _execute_legacy(self, command_str):
+        """Run one legacy command to completion and return its output chunks (worker thread)."""
+        output = []
+        print(f"[SAT] ⚠️ Executing: {command_str}")
+        try:
+            with COMMAND_SECONDS.time():
+                code = run_streaming(command_str, command.DEFAULT_TIMEOUT, lambda msg_type, chunk: output.append(chunk))
+            COMMANDS.labels(outcome(code)).inc()
+        finally:
+            with self.lock:
+                self.queued -= 1
+                self.executed += 1
+        return output
+
+
+def outcome(code):
+    return "ok" if code == 0 else "killed" if code < 0 else "failed"
+
+
+def run_streaming(command_str, timeout, emit):
+    """Run a shell command, calling emit(MSG_STDOUT|MSG_STDERR, bytes) as output arrives.
+
+    Returns the exit code; the whole process group is killed at the timeout.
+    """
+    proc = subprocess.Popen(command_str, shell=True, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+    streams = {proc.stdout.fileno(): command.MSG_STDOUT, proc.stderr.fileno(): command.MSG_STDERR}
+    deadline = time.monotonic() + timeout
+    with selectors.DefaultSelector() as sel:
+        for fd in streams:
+            sel.register(fd, selectors.EVENT_READ)
+        while streams:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                os.killpg(proc.pid, signal.SIGKILL)
+                emit(command.MSG_STDERR, f"\n❌ Timed out after {timeout}s\n".encode("utf-8"))
+                break
+            for key, _ in sel.select(remaining):
+                data = os.read(key.fd, CHUNK)
+                if data:
+                    emit(streams[key.fd], data)
+                else:
+                    sel.unregister(key.fd)
+                    del streams[key.fd]
+    proc.stdout.close()
+    proc.stderr.close()
+    try:
+        return proc.wait(max(0.0, deadline - time.monotonic()) + 1)
+    except subprocess.TimeoutExpired:
+        os.killpg(proc.pid, signal.SIGKILL)
+        return proc.wait()